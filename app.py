@@ -5,19 +5,27 @@ import pika
 from dotenv import load_dotenv
 # from modules.llm_call_new_v2 import AgentBabe
 from modules.llm_v3_review import AgentBabe
+from modules.llm_backend import LocalBackend
 import google.generativeai as genai
 pd.options.mode.chained_assignment = None  
 import threading
 import time
+import asyncio
 import requests
 
 load_dotenv()
 genai_api_key = os.getenv("GOOGLE_GENAI_API_KEY")
 gmap_api_key = os.getenv("GMAP_API_KEY")
 genai.configure(api_key=genai_api_key)
+# Set AGENT_ASYNC_PIPELINE=1 untuk memakai handle_order_async
+use_async_pipeline = os.getenv("AGENT_ASYNC_PIPELINE", "0") == "1"
+# Set AGENT_LLM_BACKEND=local untuk load test tanpa Gemini (latency tiruan dalam detik)
+llm_backend = None
+if os.getenv("AGENT_LLM_BACKEND", "gemini") == "local":
+    llm_backend = LocalBackend(latency=float(os.getenv("LOCAL_LLM_LATENCY", "0")))
 
 
-agent = AgentBabe(df_combo_dir='./product_combos_v2.csv', df_product_dir='./product_items.csv', top_k_retrieve=100, gmap_api_key=gmap_api_key)
+agent = AgentBabe(df_combo_dir='./product_combos_v2.csv', df_product_dir='./product_items.csv', top_k_retrieve=100, gmap_api_key=gmap_api_key, llm_backend=llm_backend)
 credentials = pika.PlainCredentials('guest', 'guest')
 parameters = pika.ConnectionParameters(
     host='31.97.106.30',
@@ -39,7 +47,10 @@ def send_reply(from_number, to_number, order_body, mode="launch"):
 
     def run_agent():
         try:
-            result = agent.handle_order(order_body, access_token_dir="./storage/app/token_cache.json")
+            if use_async_pipeline:
+                result = asyncio.run(agent.handle_order_async(order_body, access_token_dir="./storage/app/token_cache.json"))
+            else:
+                result = agent.handle_order(order_body, access_token_dir="./storage/app/token_cache.json")
             response_message_container["result"] = result
         except Exception as e:
             response_message_container["result"] = f"❌ Terjadi kesalahan saat memproses pesanan. Error {e}"
@@ -0,0 +1,359 @@
+"""
+Benchmark end-to-end handle_order / handle_order_async.
+
+Pesan reconfirm dari corpus (jsonl, satu {"id", "message"} per baris) diputar ulang
+ke AgentBabe dengan semua layanan luar diganti tiruan lokal:
+- Olsera dan Google Maps: fake_olsera_server.py (dijalankan otomatis kalau belum ada)
+- Gemini: LocalBackend dengan latency tiruan
+
+Hasilnya p50/p95/p99 latency per order, order per menit, dan rincian waktu per
+tahap (reconfirm, address_prefetch, address, notes, customer, order_create, lines,
+merch, cart_move, discount, order_detail, payment, invoice), disimpan sebagai JSON
+supaya bisa dibandingkan antar commit. "address" adalah waktu menunggu alamat
+setelah reconfirm selesai; kerja resolve-nya sendiri tercatat di address_prefetch.
+
+Panggilan LLM juga dihitung per order. --max-selection-calls membuat benchmark
+gagal (exit 1) kalau ada order yang memilih id dengan lebih dari N panggilan.
+
+Contoh:
+    python benchmark_orders.py --pipeline both --repeat 3 --concurrency 4
+    python benchmark_orders.py --llm-latency 1.5 --fast-parse-threshold none
+    python benchmark_orders.py --max-selection-calls 1
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+SHORTLINK_PREFIX = "https://maps.app.goo.gl/"
+
+# Produk ongkir dari distance_cost_rule. Di produksi ada di katalog Olsera, tapi tidak
+# ada di product_combos_v2.json, jadi ditambahkan dengan id tetap
+ONGKIR_PRODUCTS = ["Subsidi Ongkir 10K"] + [f"Ongkir {k}K" for k in range(10, 50, 5)]
+ONGKIR_FIRST_ID = 990001
+
+SELECTION_CALLS = ("select_id", "select_ids")
+
+
+def percentile(values: list, q: float) -> float:
+    """Persentil dengan interpolasi linear, q dalam 0..100."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q / 100
+    low = int(pos)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+
+def load_corpus(path: str, base_url: str) -> list:
+    """Shortlink Google Maps di corpus diarahkan ke shortlink tiruan di server lokal."""
+    corpus = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                row["message"] = row["message"].replace(SHORTLINK_PREFIX, f"{base_url}/maps/s/")
+                corpus.append(row)
+    return corpus
+
+
+def build_catalog(combos_json: str, out_dir: str):
+    """
+    Susun product_items.csv dan product_combos_v2.csv dari product_combos_v2.json,
+    ditambah produk ongkir. product_items.csv juga dipakai fake_olsera_server.
+    """
+    with open(combos_json, "r") as f:
+        combos = json.load(f)
+
+    products = {}
+    for combo in combos:
+        for item in combo.get("items") or []:
+            products.setdefault(
+                int(item["product_id"]),
+                {
+                    "id": int(item["product_id"]),
+                    "name": item.get("product_name"),
+                    "pos_hidden": 0,
+                    "sell_price_pos": item.get("sell_price_pos") or "0.00",
+                },
+            )
+    for i, name in enumerate(ONGKIR_PRODUCTS):
+        products[ONGKIR_FIRST_ID + i] = {
+            "id": ONGKIR_FIRST_ID + i,
+            "name": name,
+            "pos_hidden": 0,
+            "sell_price_pos": f"{int(name.split()[-1][:-1]) * 1000}.00",
+        }
+
+    combo_df = pd.DataFrame(combos)
+    combo_df["items"] = combo_df["items"].apply(lambda items: str(items or []))
+    product_path = os.path.join(out_dir, "product_items.csv")
+    combo_path = os.path.join(out_dir, "product_combos_v2.csv")
+    pd.DataFrame(list(products.values())).to_csv(product_path, index=False)
+    combo_df.to_csv(combo_path, index=False)
+    return product_path, combo_path
+
+
+def server_alive(base_url: str) -> bool:
+    try:
+        with urllib.request.urlopen(f"{base_url}/_fake/stats", timeout=1) as resp:
+            return resp.status == 200
+    except OSError:
+        return False
+
+
+def start_fake_server(base_url: str, args, product_path: str):
+    if server_alive(base_url):
+        return None
+    port = base_url.rsplit(":", 1)[-1]
+    env = {
+        **os.environ,
+        "FAKE_OLSERA_PORT": port,
+        "FAKE_OLSERA_PRODUCTS": product_path,
+        "FAKE_OLSERA_LATENCY": str(args.olsera_latency),
+        "FAKE_OLSERA_429_RATE": str(args.olsera_429_rate),
+        "FAKE_MAPS_LATENCY": str(args.maps_latency),
+    }
+    proc = subprocess.Popen([sys.executable, "fake_olsera_server.py"], env=env)
+    deadline = time.time() + 30
+    while not server_alive(base_url):
+        if proc.poll() is not None or time.time() > deadline:
+            proc.kill()
+            raise RuntimeError("Fake Olsera server gagal dijalankan")
+        time.sleep(0.2)
+    return proc
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def summarize(records: list, wall_seconds: float) -> dict:
+    ok = [r for r in records if r["ok"]]
+    latencies = [r["seconds"] for r in ok]
+    stages = {}
+    for record in ok:
+        for name, seconds in record["stages"].items():
+            stages.setdefault(name, []).append(seconds)
+    selection_calls = [r["selection_calls"] for r in records]
+    return {
+        "orders": len(records),
+        "errors": len(records) - len(ok),
+        "wall_seconds": round(wall_seconds, 3),
+        "orders_per_min": round(len(ok) / wall_seconds * 60, 2) if wall_seconds else 0.0,
+        "latency": {
+            "mean": round(sum(latencies) / len(latencies), 4) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50), 4),
+            "p95": round(percentile(latencies, 95), 4),
+            "p99": round(percentile(latencies, 99), 4),
+            "max": round(max(latencies), 4) if latencies else 0.0,
+        },
+        # Tahap yang berjalan paralel dihitung masing-masing, jadi jumlahnya bisa
+        # melebihi latency order
+        "stages": {
+            name: {
+                "mean": round(sum(values) / len(values), 4),
+                "p95": round(percentile(values, 95), 4),
+            }
+            for name, values in sorted(stages.items())
+        },
+        # Panggilan pemilihan id (select_id + select_ids) per order, termasuk order gagal
+        "selection_calls_per_order": {
+            "mean": round(sum(selection_calls) / len(selection_calls), 3) if selection_calls else 0.0,
+            "max": max(selection_calls, default=0),
+        },
+    }
+
+
+def order_record(row, seconds: float, timer, result) -> dict:
+    return {
+        "id": row["id"],
+        "seconds": round(seconds, 4),
+        "ok": "invoice" in timer.timings,
+        "stages": timer.timings,
+        "llm_calls": timer.counts,
+        "selection_calls": sum(timer.counts.get(kind, 0) for kind in SELECTION_CALLS),
+        "result": result if "invoice" not in timer.timings else None,
+    }
+
+
+def run_sync(agent, corpus, token_path, concurrency, StageTimer):
+    def one(row):
+        with StageTimer() as timer:
+            start = time.perf_counter()
+            result = agent.handle_order(row["message"], token_path)
+            seconds = time.perf_counter() - start
+        return order_record(row, seconds, timer, result)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(one, corpus))
+
+
+def run_async(agent, corpus, token_path, concurrency, StageTimer):
+    async def one(row, semaphore):
+        async with semaphore:
+            with StageTimer() as timer:
+                start = time.perf_counter()
+                result = await agent.handle_order_async(row["message"], token_path)
+                seconds = time.perf_counter() - start
+        return order_record(row, seconds, timer, result)
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*(one(row, semaphore) for row in corpus))
+
+    return asyncio.run(main())
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default="./benchmark_corpus.jsonl")
+    parser.add_argument("--combos-json", default="./product_combos_v2.json")
+    parser.add_argument("--pipeline", choices=["sync", "async", "both"], default="both")
+    parser.add_argument("--repeat", type=int, default=1, help="Berapa kali corpus diputar ulang")
+    parser.add_argument("--concurrency", type=int, default=1, help="Order yang diproses bersamaan")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8765", help="Alamat fake_olsera_server")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="Latency tiruan tiap panggilan LLM (detik)")
+    parser.add_argument("--llm-jitter", type=float, default=0.4)
+    parser.add_argument("--olsera-latency", type=float, default=0.05)
+    parser.add_argument("--olsera-429-rate", type=float, default=0.0)
+    parser.add_argument("--maps-latency", type=float, default=0.15)
+    parser.add_argument(
+        "--olsera-rate",
+        type=float,
+        default=None,
+        help="Override OLSERA_RATE_PER_SEC/BURST client; default pakai batas produksi",
+    )
+    parser.add_argument(
+        "--fast-parse-threshold",
+        default="0.8",
+        help="Threshold reconfirm_parser; 'none' = reconfirm selalu lewat LLM",
+    )
+    parser.add_argument(
+        "--max-selection-calls",
+        type=int,
+        default=None,
+        help="Gagal kalau ada order dengan panggilan pemilihan id lebih dari ini",
+    )
+    parser.add_argument("--output", default=None, help="Default ./storage/benchmark/orders_<waktu>.json")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    base_url = args.base_url.rstrip("/")
+    # Harus di-set sebelum modules diimport, karena base URL dibaca saat import
+    os.environ["OLSERA_BASE_URL"] = base_url
+    os.environ["GMAPS_BASE_URL"] = base_url
+    if args.olsera_rate:
+        os.environ["OLSERA_RATE_PER_SEC"] = str(args.olsera_rate)
+        os.environ["OLSERA_RATE_BURST"] = str(args.olsera_rate)
+
+    from modules.llm_backend import LocalBackend
+    from modules.llm_v3_review import AgentBabe
+    from modules.stage_timer import StageTimer
+
+    workdir = tempfile.mkdtemp(prefix="bench_orders_")
+    product_path, combo_path = build_catalog(args.combos_json, workdir)
+    server = start_fake_server(base_url, args, product_path)
+    too_many_calls = []
+    try:
+        token_path = os.path.join(workdir, "token_cache.json")
+        with open(token_path, "w") as f:
+            json.dump({"access_token": "fake-access-token"}, f)
+
+        corpus = load_corpus(args.corpus, base_url) * args.repeat
+        threshold = None if args.fast_parse_threshold.lower() == "none" else float(args.fast_parse_threshold)
+        pipelines = ["sync", "async"] if args.pipeline == "both" else [args.pipeline]
+
+        results = {}
+        for pipeline in pipelines:
+            # Agent baru per pipeline supaya cache reconfirm/pilihan tidak terbawa
+            backend = LocalBackend(latency=args.llm_latency, jitter=args.llm_jitter)
+            agent = AgentBabe(
+                df_product_dir=product_path,
+                df_combo_dir=combo_path,
+                top_k_retrieve=100,
+                gmap_api_key="fake",
+                selection_cache_path=None,
+                geo_cache_path=os.path.join(workdir, f"geo_cache_{pipeline}.sqlite3"),
+                fast_parse_threshold=threshold,
+                llm_backend=backend,
+                # order.log di repo dipakai void_order.py untuk void order di Olsera asli
+                order_log_dir=workdir,
+            )
+            runner = run_sync if pipeline == "sync" else run_async
+            start = time.perf_counter()
+            # Print dari pipeline dibuang supaya output benchmark tetap terbaca
+            with contextlib.redirect_stdout(io.StringIO()):
+                records = runner(agent, corpus, token_path, args.concurrency, StageTimer)
+            summary = summarize(records, time.perf_counter() - start)
+            summary["llm_calls"] = dict(backend.calls)
+            summary["geo_cache"] = agent.geo_cache.report()
+            summary["distance_source"] = dict(agent.distance_stats)
+            summary["failures"] = [
+                {"id": r["id"], "result": (r["result"] or "")[:300]} for r in records if not r["ok"]
+            ]
+            results[pipeline] = summary
+            if args.max_selection_calls is not None:
+                too_many_calls += [
+                    (pipeline, r["id"], r["llm_calls"])
+                    for r in records
+                    if r["selection_calls"] > args.max_selection_calls
+                ]
+
+            latency = summary["latency"]
+            print(
+                f"[{pipeline}] {summary['orders']} order, {summary['errors']} error, "
+                f"p50 {latency['p50']:.2f}s p95 {latency['p95']:.2f}s p99 {latency['p99']:.2f}s, "
+                f"{summary['orders_per_min']:.1f} order/menit, "
+                f"pemilihan id per order maks {summary['selection_calls_per_order']['max']}"
+            )
+            for name, stat in summary["stages"].items():
+                print(f"    {name:<13} mean {stat['mean']:.3f}s  p95 {stat['p95']:.3f}s")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    output = args.output or os.path.join(
+        "./storage/benchmark", f"orders_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": vars(args),
+        "corpus_size": len(corpus),
+        "results": results,
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Hasil disimpan di {output}")
+
+    for pipeline, order_id, calls in too_many_calls:
+        print(
+            f"[{pipeline}] order {order_id} memilih id dengan lebih dari "
+            f"{args.max_selection_calls} panggilan LLM: {calls}"
+        )
+    if too_many_calls:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
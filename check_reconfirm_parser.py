@@ -0,0 +1,262 @@
+"""
+Cek parse_reconfirm dan build_notes_text (modules/reconfirm_parser.py) dengan tabel
+kasus dari aturan reconfirm_translator_prompt.txt dan notes_prompt.txt: jenis
+pengiriman FD/I/EX, tukar voucher (termasuk free instant), diskon persen/nominal/
+100%, tambahan waktu dari notes, dan normalisasi nomor telepon.
+
+Kasus dengan "fast": True harus lolos fast path AgentBabe (confidence minimal
+FAST_PARSE_THRESHOLD), kasus dengan "fast": False harus tetap diserahkan ke LLM.
+
+Contoh:
+    python check_reconfirm_parser.py
+"""
+import sys
+
+from modules.reconfirm_parser import build_notes_text, normalize_phone, parse_reconfirm
+
+# Sama dengan default fast_parse_threshold di AgentBabe
+FAST_PARSE_THRESHOLD = 0.8
+
+TEMPLATE = """RECONFIRM JAJAN
+Nama : Aldi
+Nomor Telepon : {telepon}
+Produk : {produk}
+Alamat : https://maps.app.goo.gl/YfNFSH4dsgHyGAXe6
+Payment : {payment}
+Tukar Voucher : {voucher}
+Notes : {notes}
+Disc : {disc}
+Pengiriman : {pengiriman}
+CC : HQ
+{penutup}"""
+
+DEFAULT_FIELDS = {
+    "telepon": "08123456789",
+    "produk": "Atlas Lychee (1 item), Paket 2 Anggur Hijau MCD + Kawa (1 Paket)",
+    "payment": "Cash",
+    "voucher": "-",
+    "notes": "-",
+    "disc": "-",
+    "pengiriman": "FD",
+    "penutup": "",
+}
+ORDERED = [("Atlas Lychee", 1), ("Paket 2 Anggur Hijau MCD + Kawa", 1)]
+
+
+def reconfirm(**fields) -> str:
+    return TEMPLATE.format(**{**DEFAULT_FIELDS, **fields})
+
+
+# (nama kasus, pesan, hasil yang diharapkan). "products" = [(produk, quantity)] urut
+PARSE_CASES = [
+    (
+        "FD menambah garansi",
+        reconfirm(),
+        {
+            "fast": True,
+            "jenis_pengiriman": "FD",
+            "products": ORDERED + [("Babe Garansi-in!!!", 1)],
+            "cc": "HQ",
+            "status": "Lunas",
+        },
+    ),
+    (
+        "I menambah Instant Delivery tanpa garansi",
+        reconfirm(pengiriman="I"),
+        {"fast": True, "jenis_pengiriman": "I", "products": ORDERED + [("Instant Delivery", 1)]},
+    ),
+    (
+        "EX menambah Express Delivery tanpa garansi",
+        reconfirm(pengiriman="EX"),
+        {"fast": True, "jenis_pengiriman": "EX", "products": ORDERED + [("Express Delivery!!", 1)]},
+    ),
+    (
+        "pengiriman dari baris penutup",
+        reconfirm(pengiriman="-", penutup="\nEX, lunas"),
+        {"fast": True, "jenis_pengiriman": "EX", "products": ORDERED + [("Express Delivery!!", 1)]},
+    ),
+    (
+        "free instant mengganti item delivery dan jadi I",
+        reconfirm(voucher="Free Instant", pengiriman="EX"),
+        {
+            "fast": True,
+            "jenis_pengiriman": "I",
+            "products": ORDERED + [("Tukar Voc Instant dari Babe!", 1)],
+            "notes": "Tukar Voucher Free Instant (Item)",
+            "disc": 0.0,
+        },
+    ),
+    (
+        "tukar voucher biasa jadi paket dan masuk notes",
+        reconfirm(voucher="Tumblr"),
+        {
+            "fast": True,
+            "products": ORDERED + [("Tukar Voucher Tumblr", 1), ("Babe Garansi-in!!!", 1)],
+            "notes": "Tukar Voucher Tumblr (Item)",
+        },
+    ),
+    (
+        "tanpa diskon",
+        reconfirm(),
+        {"fast": True, "mode_diskon": "percentage", "disc": 0.0},
+    ),
+    (
+        "diskon persen",
+        reconfirm(disc="10%"),
+        {"fast": True, "mode_diskon": "percentage", "disc": 0.1},
+    ),
+    (
+        "diskon nominal dengan k",
+        reconfirm(disc="15k"),
+        {"fast": True, "mode_diskon": "number", "disc": 15000.0},
+    ),
+    (
+        "diskon nominal rupiah bertitik",
+        reconfirm(disc="Rp 20.000"),
+        {"fast": True, "mode_diskon": "number", "disc": 20000.0},
+    ),
+    (
+        "diskon komplimen 100%",
+        reconfirm(disc="Diskon Komplimen"),
+        {"fast": True, "mode_diskon": "percentage", "disc": 1.0},
+    ),
+    (
+        "komplimen tanpa kata diskon diserahkan ke LLM",
+        reconfirm(disc="Komplimen"),
+        {"fast": False},
+    ),
+    (
+        "hujan menambah 5 menit",
+        reconfirm(notes="hujan"),
+        {"fast": True, "tambahan_waktu": 5, "notes": "hujan"},
+    ),
+    (
+        "macet menambah 5 menit, es batu jadi item",
+        reconfirm(notes="macet, es batu 2"),
+        {
+            "fast": True,
+            "tambahan_waktu": 5,
+            "products": ORDERED + [("Es Batu", 2), ("Babe Garansi-in!!!", 1)],
+        },
+    ),
+    (
+        "etj dan numpuk",
+        reconfirm(notes="etj, numpuk"),
+        {"fast": True, "tambahan_waktu": 25},
+    ),
+    (
+        "kondisi lapangan dalam kalimat tetap dihitung",
+        reconfirm(notes="lagi hujan deras"),
+        {"fast": True, "tambahan_waktu": 5},
+    ),
+    (
+        "telepon +62 berspasi dan strip",
+        reconfirm(telepon="+62 813-9288-5302"),
+        {"fast": True, "phone_num": "081392885302"},
+    ),
+    (
+        "telepon 62 tanpa plus",
+        reconfirm(telepon="6281392885302"),
+        {"fast": True, "phone_num": "081392885302"},
+    ),
+    (
+        "telepon 08 dengan strip",
+        reconfirm(telepon="0813-9288-5302"),
+        {"fast": True, "phone_num": "081392885302"},
+    ),
+    (
+        "telepon tidak valid diserahkan ke LLM",
+        reconfirm(telepon="12345"),
+        {"fast": False},
+    ),
+    (
+        "produk tanpa tag item/paket diserahkan ke LLM",
+        reconfirm(produk="Atlas Lychee 2 Botol Promo"),
+        {"fast": False},
+    ),
+    (
+        "pembatalan diserahkan ke LLM",
+        "batalkan struk 12345",
+        {"fast": False},
+    ),
+]
+
+# (input, hasil normalize_phone)
+PHONE_CASES = [
+    ("+62 813-9288-5302", "081392885302"),
+    ("6281392885302", "081392885302"),
+    ("0813-9288-5302", "081392885302"),
+    ("813 9288 5302", "081392885302"),
+    ("(0812) 3456 789", "08123456789"),
+    ("12345", None),
+    ("", None),
+]
+
+# (nama kasus, pesan, teks build_notes_text yang diharapkan)
+NOTES_CASES = [
+    (
+        "paket promo, notes dan CC",
+        reconfirm(notes="Es Batu 3"),
+        "Makasih yaa Aldi niii Jajan mu langsung ta proses duluu. "
+        "Paket nyaa Paket 2 Anggur Hijau MCD + Kawa yah. Buat notes, Es Batu 3. - HQ",
+    ),
+    (
+        "free instant ditulis di notes, item delivery tidak disebut",
+        reconfirm(voucher="Free Instant"),
+        "Makasih yaa Aldi niii Jajan mu langsung ta proses duluu. "
+        "Paket nyaa Paket 2 Anggur Hijau MCD + Kawa yah. "
+        "Buat notes, Tukar Voucher Free Instant (Item). - HQ",
+    ),
+    (
+        "tanpa paket, item yang disebut",
+        reconfirm(produk="Atlas Lychee (2 item)", pengiriman="I"),
+        "Makasih yaa Aldi niii Jajan mu langsung ta proses duluu. "
+        "Paket nyaa Atlas Lychee yah. Buat notes, -. - HQ",
+    ),
+]
+
+
+def check_parse(name: str, message: str, expected: dict) -> list:
+    parsed, confidence, issues = parse_reconfirm(message)
+    fast = parsed is not None and confidence >= FAST_PARSE_THRESHOLD
+    errors = []
+    if fast != expected["fast"]:
+        errors.append(f"fast path {fast}, seharusnya {expected['fast']} (confidence {confidence}, {issues})")
+    if not fast:
+        return errors
+
+    for key, value in expected.items():
+        if key == "fast":
+            continue
+        if key == "products":
+            actual = [(p["produk"], p["quantity"]) for p in parsed["ordered_products"]]
+        else:
+            actual = parsed[key]
+        if actual != value:
+            errors.append(f"{key} = {actual!r}, seharusnya {value!r}")
+    return errors
+
+
+def main() -> int:
+    failures = []
+    for name, message, expected in PARSE_CASES:
+        failures += [f"[parse] {name}: {e}" for e in check_parse(name, message, expected)]
+    for raw, expected in PHONE_CASES:
+        actual = normalize_phone(raw)
+        if actual != expected:
+            failures.append(f"[phone] {raw!r}: {actual!r}, seharusnya {expected!r}")
+    for name, message, expected in NOTES_CASES:
+        parsed, _, _ = parse_reconfirm(message)
+        actual = build_notes_text(parsed)
+        if actual != expected:
+            failures.append(f"[notes] {name}:\n    {actual!r}\n    seharusnya {expected!r}")
+
+    total = len(PARSE_CASES) + len(PHONE_CASES) + len(NOTES_CASES)
+    for failure in failures:
+        print(failure)
+    print(f"{total - len(failures)}/{total} kasus lolos")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,576 @@
+"""
+Server tiruan Olsera Open API untuk benchmark dan tes end-to-end lokal.
+
+Hanya endpoint yang dipakai modules/crud_utility(_async) yang disediakan. Katalog
+di-seed dari product_combos_v2.json (paket beserta produk di dalamnya), ditambah
+product_items.csv kalau ada. Stok di-hold saat item masuk order dan dilepas lagi
+saat order di-void (status "X").
+
+Server yang sama juga meniru Google Maps (shortlink, Geocoding, Distance Matrix)
+dengan data kelurahan sekitar toko, untuk resolve alamat tanpa API key.
+
+Jalankan:
+    python fake_olsera_server.py
+lalu arahkan client ke server ini:
+    OLSERA_BASE_URL=http://127.0.0.1:8765 GMAPS_BASE_URL=http://127.0.0.1:8765 python app.py
+
+Shortlink tiruan: http://127.0.0.1:8765/maps/s/<kode> (kode apa saja, lokasinya
+ditentukan dari hash kode).
+
+Pengaturan lewat env:
+- FAKE_OLSERA_LATENCY: latency tiap request dalam detik (default 0)
+- FAKE_OLSERA_JITTER: tambahan latency acak maksimal dalam detik (default 0)
+- FAKE_OLSERA_429_RATE: peluang request dibalas 429 secara acak (default 0)
+- FAKE_OLSERA_RATE_LIMIT: batas request per detik sebelum dibalas 429 (default 0 = tanpa batas)
+- FAKE_OLSERA_STOCK: stok awal setiap produk (default 1000)
+- FAKE_OLSERA_SEED: seed random untuk jitter dan 429 (default 0)
+- FAKE_MAPS_LATENCY: latency tiap request Maps tiruan dalam detik (default 0)
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from urllib.parse import parse_qsl
+
+import pandas as pd
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, RedirectResponse
+
+API_PREFIX = "/api/open-api/v1/en"
+
+# Urutan sama dengan payment_dict di llm_v3_review
+PAYMENT_MODES = [
+    {"id": 1, "name": "Cash"},
+    {"id": 2, "name": "BRI"},
+    {"id": 3, "name": "Hutang"},
+    {"id": 4, "name": "BCA"},
+    {"id": 5, "name": "QRIS"},
+]
+
+
+# (kelurahan, kecamatan, kota, lat, lng) untuk Maps tiruan
+FAKE_KELURAHAN = [
+    ("Gentan", "Baki", "Kabupaten Sukoharjo", -7.5886, 110.7862),
+    ("Kadilangu", "Baki", "Kabupaten Sukoharjo", -7.6052, 110.7951),
+    ("Madegondo", "Grogol", "Kabupaten Sukoharjo", -7.5941, 110.8102),
+    ("Langenharjo", "Grogol", "Kabupaten Sukoharjo", -7.6003, 110.8297),
+    ("Pabelan", "Kartasura", "Kabupaten Sukoharjo", -7.5571, 110.7683),
+    ("Gonilan", "Kartasura", "Kabupaten Sukoharjo", -7.5530, 110.7751),
+    ("Baturan", "Colomadu", "Kabupaten Karanganyar", -7.5352, 110.7904),
+    ("Laweyan", "Laweyan", "Kota Surakarta", -7.5702, 110.8003),
+    ("Banjarsari", "Banjarsari", "Kota Surakarta", -7.5498, 110.8152),
+    ("Jebres", "Jebres", "Kota Surakarta", -7.5612, 110.8551),
+    ("Palur", "Mojolaban", "Kabupaten Sukoharjo", -7.5651, 110.8853),
+    ("Bekonang", "Mojolaban", "Kabupaten Sukoharjo", -7.6098, 110.8971),
+]
+
+
+def haversine_m(lat1, lng1, lat2, lng2) -> float:
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * 6371000 * math.asin(math.sqrt(a))
+
+
+def format_rupiah(amount: float) -> str:
+    return f"{int(round(amount)):,}".replace(",", ".")
+
+
+def error_response(status_code: int, message: str, headers: dict = None):
+    return JSONResponse(
+        {"error": {"status_code": status_code, "message": message}},
+        status_code=status_code,
+        headers=headers,
+    )
+
+
+class FakeOlseraStore:
+    """State server tiruan: katalog, stok, pelanggan, dan order."""
+
+    def __init__(self, combos_path: str, products_path: str = None, initial_stock: int = 1000):
+        self.lock = threading.Lock()
+        self.products = {}
+        self.combos = {}
+        self.customers = {}
+        self.orders = {}
+        self._next_id = 1
+        self._seed_combos(combos_path, initial_stock)
+        if products_path and os.path.exists(products_path):
+            self._seed_products(products_path, initial_stock)
+
+    def _new_id(self) -> int:
+        self._next_id += 1
+        return self._next_id
+
+    def _seed_combos(self, path: str, initial_stock: int):
+        with open(path, "r") as file:
+            combos = json.load(file)
+
+        for combo in combos:
+            items = combo.get("items") or []
+            self.combos[int(combo["id"])] = {**combo, "items": items}
+            for item in items:
+                product = self.products.setdefault(
+                    int(item["product_id"]),
+                    {
+                        "id": int(item["product_id"]),
+                        "name": item.get("product_name"),
+                        "sell_price_pos": item.get("sell_price_pos") or "0.00",
+                        "stock_qty": initial_stock,
+                        "hold_qty": 0,
+                        "variant": [],
+                    },
+                )
+                variant_id = item.get("product_variant_id")
+                if variant_id and not any(v["id"] == variant_id for v in product["variant"]):
+                    product["variant"].append(
+                        {
+                            "id": variant_id,
+                            "name": item.get("product_variant_name") or str(variant_id),
+                            "sell_price_pos": item.get("sell_price_pos") or "0.00",
+                            "stock_qty": initial_stock,
+                            "hold_qty": 0,
+                        }
+                    )
+
+    def _seed_products(self, path: str, initial_stock: int):
+        df = pd.read_csv(path)
+        for row in df.to_dict(orient="records"):
+            self.products.setdefault(
+                int(row["id"]),
+                {
+                    "id": int(row["id"]),
+                    "name": row.get("name"),
+                    "sell_price_pos": str(row.get("sell_price_pos", "0.00")),
+                    "stock_qty": initial_stock,
+                    "hold_qty": 0,
+                    "variant": [],
+                },
+            )
+
+    def _stock_entry(self, product_id: int, variant_id=None):
+        product = self.products.get(product_id)
+        if product is None or variant_id is None:
+            return product
+        return next((v for v in product["variant"] if str(v["id"]) == str(variant_id)), None)
+
+    def customer(self, phone: str) -> dict:
+        # Pelanggan baru langsung terdaftar, supaya replay pesan tidak gagal di cek_kastamer
+        with self.lock:
+            if phone not in self.customers:
+                self.customers[phone] = {"id": self._new_id(), "name": f"Pelanggan {phone[-4:]}", "phone": phone}
+            return self.customers[phone]
+
+    def create_order(self, params: dict) -> dict:
+        with self.lock:
+            order_id = self._new_id()
+            order = {
+                "id": order_id,
+                "order_no": f"FAKE{order_id:06d}",
+                "order_date": params.get("order_date"),
+                "customer_id": params.get("customer_id"),
+                "customer_name": params.get("customer_name"),
+                "notes": params.get("notes", ""),
+                "status": "A",
+                "payments": [],
+                "attrs": {},
+                "orderitems": [],
+                "created_at": datetime.now().isoformat(),
+            }
+            self.orders[order_id] = order
+            return order
+
+    def add_item(self, order: dict, product_id: int, variant_id, qty: int, name: str = None, price: float = None):
+        """Tambah baris order dan hold stoknya. Returns baris order, atau None kalau stok kurang."""
+        with self.lock:
+            entry = self._stock_entry(product_id, variant_id)
+            if entry is None:
+                return None
+            if entry["stock_qty"] - entry["hold_qty"] < qty:
+                return None
+            entry["hold_qty"] += qty
+
+            product = self.products[product_id]
+            price = float(entry.get("sell_price_pos") or 0) if price is None else price
+            line = {
+                "id": self._new_id(),
+                "product_id": product_id,
+                "product_variant_id": variant_id,
+                "product_name": name or product["name"],
+                "qty": qty,
+                "price": price,
+                "discount": "0",
+            }
+            order["orderitems"].append(line)
+            return line
+
+    def release(self, order: dict):
+        """Lepas hold stok semua item di order (saat void)."""
+        with self.lock:
+            for line in order["orderitems"]:
+                entry = self._stock_entry(line["product_id"], line.get("product_variant_id"))
+                if entry is not None and line.get("held", True):
+                    entry["hold_qty"] = max(0, entry["hold_qty"] - line["qty"])
+                    line["held"] = False
+
+    def order_detail(self, order: dict) -> dict:
+        items = []
+        total = 0.0
+        for line in order["orderitems"]:
+            amount = line["price"] * float(line["qty"])
+            total += amount - float(line["discount"])
+            items.append(
+                {
+                    "id": line["id"],
+                    "product_id": line["product_id"],
+                    "product_name": line["product_name"],
+                    "qty": line["qty"],
+                    "amount": f"{amount:.2f}",
+                    "discount": line["discount"],
+                    "fprice": format_rupiah(line["price"]),
+                }
+            )
+        return {
+            **{k: v for k, v in order.items() if k != "orderitems"},
+            "total_amount": f"{total:.2f}",
+            "ftotal_amount": f"Rp {format_rupiah(total)}",
+            "orderitems": items,
+        }
+
+
+class FaultInjector:
+    """Latency tiruan dan balasan 429 (acak dan/atau melebihi batas request per detik)."""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self._random = random.Random(seed)
+        self._recent = deque()
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    def delay(self) -> float:
+        with self._lock:
+            return self.latency + self._random.uniform(0, self.jitter)
+
+    def throttled(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            self.stats["requests"] += 1
+            if self.rate_limit:
+                while self._recent and now - self._recent[0] >= 1.0:
+                    self._recent.popleft()
+                if len(self._recent) >= self.rate_limit:
+                    self.stats["429_rate_limit"] += 1
+                    return True
+                self._recent.append(now)
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.stats["429_random"] += 1
+                return True
+            return False
+
+
+def paginate(rows: list, params) -> dict:
+    per_page = int(params.get("per_page", 100))
+    page = int(params.get("page", 1))
+    start = (page - 1) * per_page
+    last_page = max(1, -(-len(rows) // per_page))
+    return {
+        "data": rows[start:start + per_page],
+        "meta": {"current_page": page, "per_page": per_page, "total": len(rows), "last_page": last_page},
+    }
+
+
+def search(rows: list, params) -> list:
+    column, text = params.get("search_column[]"), params.get("search_text[]")
+    if not column or text is None:
+        return rows
+    return [row for row in rows if str(text).lower() in str(row.get(column, "")).lower()]
+
+
+async def read_params(request: Request) -> dict:
+    """Body JSON atau form-data (additemcombo memakai form-data)."""
+    body = await request.body()
+    if request.headers.get("content-type", "").startswith("application/json"):
+        return json.loads(body or b"{}")
+    # Form urlencoded diparse manual supaya tidak butuh python-multipart
+    return dict(parse_qsl(body.decode("utf-8")))
+
+
+def create_app(store: FakeOlseraStore, faults: FaultInjector, maps_latency: float = 0.0) -> FastAPI:
+    app = FastAPI(title="Fake Olsera Open API")
+
+    @app.middleware("http")
+    async def inject_faults(request: Request, call_next):
+        if request.url.path.startswith("/_fake"):
+            return await call_next(request)
+        if request.url.path.startswith("/maps"):
+            # Maps tiruan hanya diberi latency, tanpa 429
+            await asyncio.sleep(maps_latency)
+            faults.stats["maps"] += 1
+            return await call_next(request)
+        await asyncio.sleep(faults.delay())
+        if faults.throttled():
+            return error_response(429, "Too Many Requests", headers={"Retry-After": "1"})
+        faults.stats[request.url.path] += 1
+        return await call_next(request)
+
+    def get_order(order_id):
+        try:
+            return store.orders.get(int(order_id))
+        except (TypeError, ValueError):
+            return None
+
+    @app.post("/api/open-api/v1/id/token")
+    async def token():
+        return {"access_token": "fake-access-token", "refresh_token": "fake-refresh-token", "expires_in": 86400}
+
+    @app.get(f"{API_PREFIX}/product")
+    async def list_products(request: Request):
+        rows = [
+            {k: v for k, v in p.items() if k != "variant"} for p in store.products.values()
+        ]
+        return paginate(search(rows, request.query_params), request.query_params)
+
+    @app.get(f"{API_PREFIX}/product/detail")
+    async def product_detail(id: int):
+        product = store.products.get(id)
+        if product is None:
+            return error_response(404, f"Product {id} not found")
+        return {"data": product}
+
+    @app.get(f"{API_PREFIX}/productcombo")
+    @app.get(f"{API_PREFIX}/productcombo-with-product")
+    async def list_combos(request: Request):
+        return paginate(search(list(store.combos.values()), request.query_params), request.query_params)
+
+    @app.get(f"{API_PREFIX}/productcombo/detail")
+    async def combo_detail(id: int):
+        combo = store.combos.get(id)
+        if combo is None:
+            return error_response(404, f"Product combo {id} not found")
+        return {"data": {**combo, "items": {"data": combo["items"]}}}
+
+    @app.get(f"{API_PREFIX}/customersupplier/customer")
+    async def customer(request: Request):
+        phone = request.query_params.get("search_text[]", "")
+        return {"data": [store.customer(phone)] if phone else []}
+
+    @app.get(f"{API_PREFIX}/order/openorder")
+    async def list_open_orders(request: Request):
+        rows = [store.order_detail(o) for o in store.orders.values() if o["status"] == "A"]
+        return {"data": search(rows, request.query_params)}
+
+    @app.get(f"{API_PREFIX}/order/closeorder")
+    async def list_close_orders(request: Request):
+        rows = [store.order_detail(o) for o in store.orders.values() if o["status"] != "A"]
+        return {"data": search(rows, request.query_params)}
+
+    @app.post(f"{API_PREFIX}/order/openorder")
+    async def create_order(request: Request):
+        order = store.create_order(await read_params(request))
+        return {"data": {"id": order["id"], "order_no": order["order_no"]}}
+
+    @app.get(f"{API_PREFIX}/order/openorder/detail")
+    async def order_detail(id: int):
+        order = get_order(id)
+        if order is None:
+            return error_response(404, f"Order {id} not found")
+        return {"data": store.order_detail(order)}
+
+    @app.post(f"{API_PREFIX}/order/openorder/additem")
+    async def add_item(request: Request):
+        params = await read_params(request)
+        order = get_order(params.get("order_id"))
+        if order is None:
+            return error_response(404, "Order not found")
+        product_id, _, variant_id = str(params.get("item_products", "")).partition("|")
+        try:
+            product_id = int(product_id)
+        except ValueError:
+            return error_response(422, "Invalid item_products")
+        line = store.add_item(order, product_id, variant_id or None, int(params.get("item_qty", 1)))
+        if line is None:
+            return error_response(422, "Product not found or out of stock")
+        return {"data": store.order_detail(order)}
+
+    @app.post(f"{API_PREFIX}/order/openorder/additemcombo")
+    async def add_item_combo(request: Request):
+        params = await read_params(request)
+        order = get_order(params.get("order_id"))
+        combo = store.combos.get(int(params.get("item_combo_id", 0)))
+        if order is None or combo is None:
+            return error_response(404, "Order or product combo not found")
+
+        qty = int(params.get("item_combo_qty", 1))
+        # Harga paket dibagi rata ke item di dalamnya
+        combo_price = float(combo.get("sell_price_pos") or 0)
+        total_units = sum(int(item.get("qty", 1)) for item in combo["items"]) or 1
+        for item in combo["items"]:
+            unit_qty = int(item.get("qty", 1))
+            line = store.add_item(
+                order,
+                int(item["product_id"]),
+                item.get("product_variant_id"),
+                unit_qty * qty,
+                name=item.get("product_name"),
+                price=combo_price / total_units,
+            )
+            if line is None:
+                return error_response(422, f"Out of stock: {item.get('product_name')}")
+        return {"data": store.order_detail(order)}
+
+    @app.post(f"{API_PREFIX}/order/openorder/updatedetail")
+    async def update_detail(request: Request):
+        params = await read_params(request)
+        order = get_order(params.get("order_id"))
+        if order is None:
+            return error_response(404, "Order not found")
+        line = next((l for l in order["orderitems"] if str(l["id"]) == str(params.get("id"))), None)
+        if line is None:
+            return error_response(404, "Order item not found")
+        line["discount"] = str(params.get("discount", line["discount"]))
+        if params.get("price"):
+            line["price"] = float(params["price"])
+        if params.get("qty"):
+            line["qty"] = int(float(params["qty"]))
+        line["note"] = params.get("note", "")
+        return {"data": store.order_detail(order)}
+
+    @app.post(f"{API_PREFIX}/order/openorder/updateattr")
+    async def update_attr(request: Request):
+        params = await read_params(request)
+        order = get_order(params.get("order_id"))
+        if order is None:
+            return error_response(404, "Order not found")
+        order["attrs"][params.get("name")] = params.get("value")
+        return {"data": store.order_detail(order)}
+
+    @app.get(f"{API_PREFIX}/order/openorder/editpayment")
+    async def edit_payment(order_id: int):
+        if get_order(order_id) is None:
+            return error_response(404, "Order not found")
+        return {"data": {"payment_modes": PAYMENT_MODES}}
+
+    @app.post(f"{API_PREFIX}/order/openorder/updatepayment")
+    async def update_payment(request: Request):
+        params = await read_params(request)
+        order = get_order(params.get("order_id"))
+        if order is None:
+            return error_response(404, "Order not found")
+        order["payments"].append(params)
+        return {"data": store.order_detail(order)}
+
+    @app.post(f"{API_PREFIX}/order/openorder/updatestatus")
+    async def update_status(request: Request):
+        params = await read_params(request)
+        order = get_order(params.get("order_id"))
+        if order is None:
+            return error_response(404, "Order not found")
+        order["status"] = params.get("status", order["status"])
+        if order["status"] == "X":
+            store.release(order)
+        return {"data": store.order_detail(order)}
+
+    @app.get("/maps/s/{code}")
+    async def maps_shortlink(code: str):
+        digest = hashlib.md5(code.encode("utf-8")).digest()
+        name, _, _, lat, lng = FAKE_KELURAHAN[digest[0] % len(FAKE_KELURAHAN)]
+        # Geser sedikit supaya tiap kode punya titik sendiri
+        lat += (digest[1] - 128) / 128 * 0.004
+        lng += (digest[2] - 128) / 128 * 0.004
+        return RedirectResponse(f"/maps/place/{name}/@{lat:.6f},{lng:.6f},17z", status_code=302)
+
+    @app.get("/maps/place/{path:path}")
+    async def maps_place(path: str):
+        return PlainTextResponse("ok")
+
+    @app.get("/maps/api/geocode/json")
+    async def maps_geocode(request: Request):
+        params = request.query_params
+        if params.get("latlng"):
+            lat, lng = map(float, params["latlng"].split(","))
+            row = min(FAKE_KELURAHAN, key=lambda r: haversine_m(lat, lng, r[3], r[4]))
+        else:
+            text = str(params.get("address", "")).lower()
+            row = next((r for r in FAKE_KELURAHAN if r[0].lower() in text), None)
+            if row is None:
+                return {"status": "ZERO_RESULTS", "results": []}
+            lat, lng = row[3], row[4]
+        kelurahan, kecamatan, kota = row[0], row[1], row[2]
+        return {
+            "status": "OK",
+            "results": [
+                {
+                    "formatted_address": f"{kelurahan}, Kec. {kecamatan}, {kota}, Jawa Tengah, Indonesia",
+                    "geometry": {"location": {"lat": lat, "lng": lng}},
+                    "address_components": [
+                        {"long_name": kelurahan, "types": ["administrative_area_level_4", "political"]},
+                        {"long_name": f"Kecamatan {kecamatan}", "types": ["administrative_area_level_3", "political"]},
+                        {"long_name": kota, "types": ["administrative_area_level_2", "political"]},
+                        {"long_name": "Jawa Tengah", "types": ["administrative_area_level_1", "political"]},
+                    ],
+                }
+            ],
+        }
+
+    @app.get("/maps/api/distancematrix/json")
+    async def maps_distance(request: Request):
+        params = request.query_params
+        lat1, lng1 = map(float, params["origins"].split(","))
+        lat2, lng2 = map(float, params["destinations"].split(","))
+        # Jarak jalan ~1.3x garis lurus, kecepatan rata-rata 25 km/jam
+        meters = int(haversine_m(lat1, lng1, lat2, lng2) * 1.3)
+        seconds = int(meters / (25000 / 3600))
+        element = {
+            "status": "OK",
+            "distance": {"text": f"{meters / 1000:.1f} km", "value": meters},
+            "duration": {"text": f"{max(1, seconds // 60)} mins", "value": seconds},
+        }
+        return {"status": "OK", "rows": [{"elements": [element]}]}
+
+    @app.get("/_fake/stats")
+    async def stats():
+        return {
+            "requests": dict(faults.stats),
+            "orders": len(store.orders),
+            "voided": sum(1 for o in store.orders.values() if o["status"] == "X"),
+        }
+
+    return app
+
+
+def app_from_env() -> FastAPI:
+    store = FakeOlseraStore(
+        os.getenv("FAKE_OLSERA_COMBOS", "./product_combos_v2.json"),
+        os.getenv("FAKE_OLSERA_PRODUCTS", "./product_items.csv"),
+        initial_stock=int(os.getenv("FAKE_OLSERA_STOCK", "1000")),
+    )
+    faults = FaultInjector(
+        latency=float(os.getenv("FAKE_OLSERA_LATENCY", "0")),
+        jitter=float(os.getenv("FAKE_OLSERA_JITTER", "0")),
+        error_rate=float(os.getenv("FAKE_OLSERA_429_RATE", "0")),
+        rate_limit=float(os.getenv("FAKE_OLSERA_RATE_LIMIT", "0")),
+        seed=int(os.getenv("FAKE_OLSERA_SEED", "0")),
+    )
+    return create_app(store, faults, maps_latency=float(os.getenv("FAKE_MAPS_LATENCY", "0")))
+
+
+app = app_from_env()
+
+
+if __name__ == "__main__":
+    uvicorn.run(
+        app,
+        host=os.getenv("FAKE_OLSERA_HOST", "127.0.0.1"),
+        port=int(os.getenv("FAKE_OLSERA_PORT", "8765")),
+        log_level="warning",
+    )
@@ -0,0 +1,125 @@
+import logging
+import os
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+logger = logging.getLogger(__name__)
+
+CATALOG_DIR = "catalog"
+
+# Kolom harga/stok dari Olsera datang sebagai string ("12000.00"), disimpan sebagai float
+NUMERIC_COLUMNS = [
+    "buy_price",
+    "sell_price",
+    "sell_price_pos",
+    "market_price",
+    "additional_price",
+    "stock_qty",
+    "hold_qty",
+    "weight",
+]
+
+# Tabel anak: (nama tabel, tabel induk, kolom nested di induk, nama kolom foreign key)
+CHILD_TABLES = {
+    "combo_items": ("combos", "items", "combo_id"),
+    "product_variants": ("items", "variants", "product_id"),
+}
+
+
+def _typed_frame(records: list) -> pd.DataFrame:
+    df = pd.DataFrame(records)
+    for col in df.columns:
+        if col in NUMERIC_COLUMNS:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+        elif (col == "id" or col.endswith("_id")) and pd.api.types.is_numeric_dtype(df[col]):
+            # id yang kadang null (misal product_variant_id) tetap integer, bukan float
+            df[col] = df[col].astype("Int64")
+        elif df[col].dtype == object:
+            values = df[col].dropna()
+            if not values.map(lambda v: isinstance(v, str)).all():
+                df[col] = df[col].map(lambda v: v if v is None else str(v))
+    return df
+
+
+def _split_nested(records: list, nested_col: str, fk_col: str):
+    parents, children = [], []
+    for record in records:
+        record = dict(record)
+        nested = record.pop(nested_col, None) or []
+        parents.append(record)
+        for child in nested if isinstance(nested, list) else []:
+            children.append({fk_col: record.get("id"), **child})
+    return _typed_frame(parents), _typed_frame(children)
+
+
+def _write_table(df: pd.DataFrame, path: str):
+    # Tanpa kompresi supaya file bisa di-memory-map langsung saat dibaca
+    feather.write_feather(df, path, compression="uncompressed")
+
+
+def write_columnar_catalog(items: list, combos: list, directory: str, version: str) -> str:
+    """
+    Tulis snapshot katalog dalam format Arrow IPC (Feather v2) ke directory/<version>/.
+
+    Kolom nested dinormalisasi jadi tabel anak: items paket -> combo_items,
+    varian produk -> product_variants. Versi lama selain yang terbaru dihapus.
+
+    Returns:
+    - str, path folder snapshot yang baru ditulis
+    """
+    snapshot_dir = os.path.join(directory, version)
+    tmp_dir = f"{snapshot_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    raw = {"combos": combos, "items": items}
+    for child, (parent, nested_col, fk_col) in CHILD_TABLES.items():
+        parent_df, child_df = _split_nested(raw[parent], nested_col, fk_col)
+        _write_table(parent_df, os.path.join(tmp_dir, f"{parent}.arrow"))
+        _write_table(child_df, os.path.join(tmp_dir, f"{child}.arrow"))
+
+    os.replace(tmp_dir, snapshot_dir)
+    _prune_old_snapshots(directory, keep=(version,))
+    return snapshot_dir
+
+
+def _prune_old_snapshots(directory: str, keep: tuple, retain: int = 2):
+    versions = sorted(
+        (v for v in os.listdir(directory) if not v.endswith(".tmp")), reverse=True
+    )
+    # Sisakan beberapa versi terakhir, pembaca yang masih memegang versi lama tetap aman
+    for version in versions[retain:]:
+        if version not in keep:
+            shutil.rmtree(os.path.join(directory, version), ignore_errors=True)
+
+
+def read_table(snapshot_dir: str, name: str) -> pd.DataFrame:
+    table = feather.read_table(os.path.join(snapshot_dir, f"{name}.arrow"), memory_map=True)
+    return table.to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+
+
+def group_children(child_df: pd.DataFrame, fk_col: str) -> dict:
+    """Kelompokkan tabel anak per foreign key jadi {id induk: [dict, ...]}."""
+    grouped = {}
+    if child_df.empty:
+        return grouped
+    clean = child_df.astype(object).where(child_df.notna(), None)
+    for record in clean.to_dict(orient="records"):
+        grouped.setdefault(record.pop(fk_col), []).append(record)
+    return grouped
+
+
+def read_columnar_catalog(snapshot_dir: str):
+    """
+    Baca snapshot kolumnar.
+
+    Returns:
+    - (product_df, combo_df, combo_items), combo_items berupa {combo_id: [item, ...]}
+    """
+    product_df = read_table(snapshot_dir, "items")
+    combo_df = read_table(snapshot_dir, "combos")
+    combo_items = group_children(read_table(snapshot_dir, "combo_items"), "combo_id")
+    return product_df, combo_df, combo_items
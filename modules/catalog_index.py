@@ -0,0 +1,192 @@
+import re
+
+from rank_bm25 import BM25Okapi
+from nltk.tokenize import word_tokenize
+import numpy as np
+import pandas as pd
+
+# Skor BM25 teratas harus minimal sekian kali skor kedua supaya dianggap tidak ambigu
+FAST_MATCH_MARGIN = 2.0
+# Skor minimal hasil teratas; di bawah ini query dianggap tidak cukup mirip dan tetap
+# dipilih LLM (yang bisa menjawab -99999 kalau memang tidak ada yang cocok)
+FAST_MATCH_MIN_SCORE = 3.0
+
+# Urutan aturan routing paket, sama persis dengan filtering lama di _process_combo.
+# (nama subset, fungsi cek query, fungsi mask katalog, key prompt di task_instructions)
+COMBO_SUBSETS = [
+    (
+        "merch",
+        lambda q: q.startswith(("merch", "mer")),
+        lambda names: names.str.contains("merch|merh"),
+        "merch_selection_prompt",
+    ),
+    (
+        "garansi",
+        lambda q: q.startswith(("babe garansiin", "garansi", "garan")),
+        lambda names: names == "babe garansi-in !!!",
+        "garansi_selection_prompt",
+    ),
+    (
+        "kupon",
+        lambda q: "kupon" in q,
+        lambda names: names.str.contains("kupon"),
+        "kupon_selection_prompt",
+    ),
+    (
+        "voucher",
+        lambda q: "voucher" in q,
+        lambda names: names.str.contains("voucher"),
+        "voucher_selection_prompt",
+    ),
+    (
+        "komplimen",
+        lambda q: q.startswith(("komplimen", "komp")),
+        lambda names: names.str.startswith(("komplimen", "komp")),
+        "komplimen_selection_prompt",
+    ),
+    (
+        "delivery",
+        lambda q: "delivery" in q,
+        lambda names: names.str.contains("delivery"),
+        "delivery_selection_prompt",
+    ),
+    (
+        "hadiah",
+        lambda q: q.startswith("hadiah"),
+        lambda names: names.str.startswith("hadiah"),
+        "hadiah_selection_prompt",
+    ),
+]
+
+
+def normalize_name(text: str) -> str:
+    """Normalisasi nama untuk exact match: huruf kecil, tanda baca jadi spasi."""
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", str(text).lower()).split())
+
+
+class BM25Index:
+    """
+    Index BM25 yang korpusnya sudah di-tokenisasi sekali di awal.
+
+    Skor tiap (term, dokumen) dihitung saat build dan disimpan sebagai posting list,
+    jadi query cukup menjumlahkan array bobot untuk token-token query-nya saja.
+    Hasil skornya identik dengan BM25Okapi.get_scores.
+    """
+
+    def __init__(self, df: pd.DataFrame, id_col: str = "id", evaluation_col: str = "name"):
+        self.ids = df[id_col].tolist()
+        self.names = df[evaluation_col].astype(str).tolist()
+        self._postings = {}
+
+        # Nama ternormalisasi -> id, None kalau ada beberapa produk dengan nama yang sama
+        self._exact = {}
+        for idx, name in zip(self.ids, self.names):
+            key = normalize_name(name)
+            self._exact[key] = None if key in self._exact else idx
+
+        tokenized_corpus = [word_tokenize(name.lower()) for name in self.names]
+        self._doc_tokens = [set(tokens) for tokens in tokenized_corpus]
+        if not tokenized_corpus:
+            return
+
+        bm25 = BM25Okapi(tokenized_corpus)
+        doc_len = np.asarray(bm25.doc_len, dtype=float)
+        norm = bm25.k1 * (1 - bm25.b + bm25.b * doc_len / bm25.avgdl)
+
+        postings = {}
+        for doc_idx, freqs in enumerate(bm25.doc_freqs):
+            for term, tf in freqs.items():
+                weight = bm25.idf.get(term, 0) * tf * (bm25.k1 + 1) / (tf + norm[doc_idx])
+                docs, weights = postings.setdefault(term, ([], []))
+                docs.append(doc_idx)
+                weights.append(weight)
+
+        self._postings = {
+            term: (np.asarray(docs, dtype=np.int64), np.asarray(weights, dtype=float))
+            for term, (docs, weights) in postings.items()
+        }
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get_scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(len(self.ids))
+        for token in word_tokenize(query.lower()):
+            posting = self._postings.get(token)
+            if posting is not None:
+                scores[posting[0]] += posting[1]
+        return scores
+
+    def top_k(self, query: str, k: int) -> list:
+        """Kembalikan k kandidat teratas dalam format [{"id": ..., "name": ...}]."""
+        scores = self.get_scores(query)
+        order = np.argsort(-scores, kind="stable")[:k]
+        return [{"id": self.ids[i], "name": self.names[i]} for i in order]
+
+    def fast_match(
+        self,
+        query: str,
+        margin: float = FAST_MATCH_MARGIN,
+        min_score: float = FAST_MATCH_MIN_SCORE,
+    ):
+        """
+        Cari id tanpa LLM kalau hasilnya tidak ambigu:
+        1. nama ternormalisasi sama persis dengan satu entri katalog ("exact")
+        2. semua token query ada di nama hasil teratas BM25, skornya minimal min_score,
+           dan minimal margin kali skor kedua ("bm25")
+
+        Returns:
+        - (id, cara match) atau (None, None) kalau query perlu dipilih LLM
+        """
+        key = normalize_name(query)
+        if self._exact.get(key) is not None:
+            return self._exact[key], "exact"
+
+        scores = self.get_scores(query)
+        if len(scores) == 0:
+            return None, None
+        top = np.argsort(-scores, kind="stable")[:2]
+        best = scores[top[0]]
+        runner_up = scores[top[1]] if len(top) > 1 else 0.0
+        tokens = set(word_tokenize(query.lower()))
+        if (
+            best >= min_score
+            and tokens <= self._doc_tokens[top[0]]
+            and best >= margin * runner_up
+        ):
+            return self.ids[top[0]], "bm25"
+        return None, None
+
+
+def route_combo_query(nama_combo: str):
+    """
+    Tentukan subset katalog paket dan prompt seleksi yang dipakai untuk sebuah query.
+
+    Returns:
+    - (nama subset, key prompt). Default ("combo", "combo_selection_prompt").
+    """
+    lower = nama_combo.strip().lower()
+    for name, match_query, _, prompt_key in COMBO_SUBSETS:
+        if match_query(lower):
+            return name, prompt_key
+    return "combo", "combo_selection_prompt"
+
+
+def build_catalog_indexes(product_df: pd.DataFrame, combo_df: pd.DataFrame) -> dict:
+    """
+    Bangun semua index retrieval dari katalog: "item", "combo", dan tiap subset paket
+    (merch, garansi, kupon, voucher, komplimen, delivery, hadiah).
+    Hanya produk dengan pos_hidden == 0 yang diindeks.
+    """
+    items = product_df[product_df["pos_hidden"] == 0]
+    combos = combo_df[combo_df["pos_hidden"] == 0]
+    combo_names = combos["name"].astype(str).str.lower()
+
+    indexes = {
+        "item": BM25Index(items),
+        "combo": BM25Index(combos),
+    }
+    for name, _, mask_names, _ in COMBO_SUBSETS:
+        indexes[name] = BM25Index(combos[mask_names(combo_names)])
+
+    return indexes
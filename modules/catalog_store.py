@@ -0,0 +1,188 @@
+import ast
+import json
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+
+from modules.catalog_index import build_catalog_indexes
+from modules.catalog_columnar import read_columnar_catalog
+
+logger = logging.getLogger(__name__)
+
+CATALOG_VERSION_FILE = "catalog_version.json"
+
+
+def new_catalog_version() -> str:
+    return f"{time.time_ns()}"
+
+
+def write_catalog_version(directory: str = ".", version: str = None, **info) -> str:
+    """
+    Tulis penanda versi katalog. Dipanggil worker_db.py setelah semua file katalog
+    selesai ditulis, supaya CatalogStore tahu kapan harus swap ke snapshot baru.
+    Kalau info berisi snapshot_dir, CatalogStore membaca snapshot kolumnar dari sana.
+    """
+    version = version or new_catalog_version()
+    path = os.path.join(directory, CATALOG_VERSION_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": version, **info}, f)
+    os.replace(tmp_path, path)
+    return version
+
+
+def _parse_items(items_raw):
+    if isinstance(items_raw, str):
+        try:
+            return ast.literal_eval(items_raw)
+        except (ValueError, SyntaxError) as e:
+            logger.error("Gagal parse items paket: %s", e)
+            return []
+    return items_raw if isinstance(items_raw, list) else []
+
+
+class CatalogSnapshot:
+    """Satu versi katalog yang immutable: DataFrame, lookup per id, dan index retrieval."""
+
+    def __init__(
+        self,
+        version: str,
+        product_df: pd.DataFrame,
+        combo_df: pd.DataFrame,
+        combo_items: dict = None,
+    ):
+        self.version = version
+        self.product_df = product_df
+        self.combo_df = combo_df
+
+        # Sama seperti _process_item/_process_combo lama: produk/paket tersembunyi
+        # (pos_hidden) tidak boleh terpilih, baik lewat LLM, fast path, maupun memo
+        visible_products = product_df[product_df["pos_hidden"] == 0]
+        visible_combos = combo_df[combo_df["pos_hidden"] == 0]
+        self.products = {
+            row["id"]: row for row in visible_products.to_dict(orient="records")
+        }
+        self.combos = {}
+        for row in visible_combos.to_dict(orient="records"):
+            if combo_items is not None:
+                # Snapshot kolumnar: items paket sudah dinormalisasi jadi tabel anak
+                row["items"] = combo_items.get(row["id"], [])
+            else:
+                row["items"] = _parse_items(row.get("items"))
+            self.combos[row["id"]] = row
+
+        self.indexes = build_catalog_indexes(visible_products, visible_combos)
+
+
+class CatalogStore:
+    """
+    Pemilik snapshot katalog untuk AgentBabe.
+
+    Snapshot dibaca sekali lalu disimpan di memori, dari snapshot kolumnar yang ditunjuk
+    catalog_version.json atau dari CSV lama. Setiap current() hanya mengecek
+    penanda versi (catalog_version.json, atau mtime CSV kalau penandanya belum ada);
+    kalau berubah, snapshot baru dibangun di thread terpisah dan di-swap secara atomik.
+    Selama proses itu order tetap dilayani dengan snapshot lama.
+    """
+
+    def __init__(
+        self,
+        df_product_dir: str = "./product_items.csv",
+        df_combo_dir: str = "./product_combos_v2.csv",
+        version_path: str = None,
+        check_interval: float = 5.0,
+    ):
+        self.df_product_dir = df_product_dir
+        self.df_combo_dir = df_combo_dir
+        self.version_path = version_path or os.path.join(
+            os.path.dirname(df_combo_dir) or ".", CATALOG_VERSION_FILE
+        )
+        self.check_interval = check_interval
+
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._reloading = False
+        self._last_check = 0.0
+
+    def _read_version_info(self) -> dict:
+        try:
+            with open(self.version_path, "r", encoding="utf-8") as f:
+                info = json.load(f)
+            info["version"] = str(info["version"])
+            return info
+        except (OSError, ValueError, KeyError):
+            return {
+                "version": "mtime:{}:{}".format(
+                    os.path.getmtime(self.df_product_dir),
+                    os.path.getmtime(self.df_combo_dir),
+                )
+            }
+
+    def _load(self, info: dict) -> CatalogSnapshot:
+        started = time.perf_counter()
+        version = info["version"]
+        if info.get("snapshot_dir"):
+            snapshot_dir = os.path.join(
+                os.path.dirname(self.version_path), info["snapshot_dir"]
+            )
+            snapshot = CatalogSnapshot(version, *read_columnar_catalog(snapshot_dir))
+        else:
+            # Format lama: CSV dengan kolom items berupa string list Python
+            snapshot = CatalogSnapshot(
+                version,
+                pd.read_csv(self.df_product_dir),
+                pd.read_csv(self.df_combo_dir),
+            )
+        logger.info(
+            "Snapshot katalog %s dimuat dalam %.2fs", version, time.perf_counter() - started
+        )
+        return snapshot
+
+    def reload(self) -> CatalogSnapshot:
+        """Muat ulang katalog secara sinkron dan swap snapshot-nya."""
+        snapshot = self._load(self._read_version_info())
+        with self._lock:
+            self._snapshot = snapshot
+        return snapshot
+
+    def _reload_in_background(self, info: dict):
+        try:
+            snapshot = self._load(info)
+            with self._lock:
+                self._snapshot = snapshot
+        except Exception as e:
+            logger.error("Gagal memuat snapshot katalog %s: %s", info["version"], e)
+        finally:
+            self._reloading = False
+
+    def current(self) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = self._load(self._read_version_info())
+                return self._snapshot
+
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return snapshot
+        self._last_check = now
+
+        try:
+            info = self._read_version_info()
+        except OSError as e:
+            logger.warning("Gagal cek versi katalog: %s", e)
+            return snapshot
+
+        with self._lock:
+            if info["version"] == self._snapshot.version or self._reloading:
+                return self._snapshot
+            self._reloading = True
+
+        threading.Thread(
+            target=self._reload_in_background, args=(info,), daemon=True
+        ).start()
+        return snapshot
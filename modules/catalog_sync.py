@@ -0,0 +1,157 @@
+import hashlib
+import json
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Kolom waktu update yang dikenali dari record Olsera, dicek berurutan
+UPDATED_FIELDS = ("updated_time", "updated_at", "modified_time")
+
+
+def record_hash(record: dict) -> str:
+    payload = json.dumps(record, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class DeltaCatalogSync:
+    """
+    Sinkronisasi inkremental satu katalog Olsera (produk atau paket).
+
+    Snapshot sebelumnya disimpan di memori worker sebagai {id: record} beserta hash
+    isi tiap record. Pada mode inkremental:
+    - Kalau record punya kolom waktu update (UPDATED_FIELDS), halaman diminta urut
+      dari yang terbaru dan paging berhenti di halaman pertama yang berisi record
+      lebih lama dari watermark sinkronisasi sebelumnya.
+    - Kalau tidak ada kolom waktu (atau API tidak menghormati urutannya, misal
+      katalog paket), semua halaman tetap diambil lalu dibandingkan hash-nya. Tanpa
+      urutan waktu, halaman yang tidak berubah tidak menjamin halaman berikutnya juga
+      tidak berubah, jadi paging tidak boleh berhenti lebih awal.
+    Hanya record yang hash-nya berubah yang di-patch ke snapshot. Record yang dihapus
+    di Olsera baru terdeteksi saat full sync, yang dijalankan tiap full_sync_every run.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        get_page,
+        fetch_all,
+        full_sync_every: int = 12,
+        sort_params: dict = None,
+    ):
+        self.name = name
+        self.get_page = get_page
+        self.fetch_all = fetch_all
+        self.full_sync_every = full_sync_every
+        self.sort_params = sort_params
+
+        self.records = None
+        self.hashes = {}
+        self.updated_field = None
+        self.watermark = None
+        self.ordered_paging = True
+        self.runs_since_full = 0
+
+    def _detect_updated_field(self, records: list):
+        for field in UPDATED_FIELDS:
+            if records and all(r.get(field) for r in records):
+                return field
+        return None
+
+    def _full_sync(self, access_token: str) -> int:
+        records = self.fetch_all(access_token)
+        fresh = {r["id"]: r for r in records}
+        hashes = {rid: record_hash(r) for rid, r in fresh.items()}
+
+        if self.records is None:
+            changed = len(fresh)
+        else:
+            changed = sum(1 for rid, h in hashes.items() if self.hashes.get(rid) != h)
+            changed += len(self.hashes.keys() - hashes.keys())
+
+        self.records, self.hashes = fresh, hashes
+        self.updated_field = self._detect_updated_field(records)
+        self.watermark = max(
+            (r[self.updated_field] for r in records), default=None
+        ) if self.updated_field else None
+        self.runs_since_full = 0
+        return changed
+
+    def _fetch_changed_pages(self, access_token: str):
+        """Ambil halaman terurut dari yang terbaru sampai melewati watermark."""
+        fetched = []
+        page = 1
+        while True:
+            sort_params = self.sort_params or {
+                "sort_column": self.updated_field,
+                "sort_type": "desc",
+            }
+            sample = self.get_page(access_token, page=page, extra_params=sort_params)
+            if not sample or "data" not in sample:
+                raise RuntimeError(f"Gagal mengambil halaman {page} katalog {self.name}.")
+            data = sample["data"]
+            if not data:
+                return fetched
+
+            stamps = [r.get(self.updated_field) or "" for r in data]
+            if stamps != sorted(stamps, reverse=True):
+                # Parameter sort tidak dihormati, paging berdasarkan watermark tidak aman
+                return None
+
+            # >= supaya update di detik yang sama dengan watermark tidak terlewat,
+            # record yang sebenarnya tidak berubah tersaring lagi oleh hash
+            fetched.extend(r for r in data if (r.get(self.updated_field) or "") >= self.watermark)
+            if stamps[-1] < self.watermark:
+                return fetched
+            page += 1
+
+    def _patch(self, records: list) -> int:
+        changed = 0
+        for record in records:
+            h = record_hash(record)
+            if self.hashes.get(record["id"]) != h:
+                self.records[record["id"]] = record
+                self.hashes[record["id"]] = h
+                changed += 1
+        if self.updated_field and records:
+            self.watermark = max(
+                [self.watermark] + [r[self.updated_field] for r in records if r.get(self.updated_field)]
+            )
+        return changed
+
+    def sync(self, access_token: str):
+        """
+        Jalankan satu putaran sinkronisasi.
+
+        Returns:
+        - (list record katalog terbaru, jumlah record yang berubah, mode: "full" | "delta" | "hash")
+        """
+        if self.records is None or self.runs_since_full + 1 >= self.full_sync_every:
+            changed = self._full_sync(access_token)
+            mode = "full"
+        else:
+            changed_records = None
+            if self.updated_field and self.ordered_paging:
+                changed_records = self._fetch_changed_pages(access_token)
+                if changed_records is None:
+                    logger.warning(
+                        "Katalog %s: urutan %s tidak dihormati API, pakai diff hash.",
+                        self.name,
+                        self.updated_field,
+                    )
+                    self.ordered_paging = False
+
+            if changed_records is None:
+                # Semua halaman, tapi hanya record yang hash-nya berubah yang di-patch
+                changed_records = self.fetch_all(access_token)
+                mode = "hash"
+            else:
+                mode = "delta"
+            self.runs_since_full += 1
+            changed = self._patch(changed_records)
+
+        print(
+            f"[{datetime.now()}] {self.name}: {mode} sync, "
+            f"{changed} changed of {len(self.records)} records."
+        )
+        return list(self.records.values()), changed, mode
@@ -1,8 +1,110 @@
+import os
 import requests
+import threading
+import time
+from math import ceil
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from modules.rate_limiter import TokenBucket, limiter_from_env
+
+OLSERA_BASE_URL = os.getenv("OLSERA_BASE_URL", "https://api-open.olsera.co.id")
+
+# (connect timeout, read timeout) dalam detik
+DEFAULT_TIMEOUT = (5, 30)
+ENDPOINT_TIMEOUTS = {
+    "/api/open-api/v1/id/token": (5, 15),
+    "/api/open-api/v1/en/product": (5, 60),
+    "/api/open-api/v1/en/productcombo": (5, 60),
+    "/api/open-api/v1/en/productcombo-with-product": (5, 90),
+    "/api/open-api/v1/en/product/detail": (5, 15),
+    "/api/open-api/v1/en/customersupplier/customer": (5, 15),
+}
+
+
+def _retry_after_seconds(response: requests.Response):
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class OlseraClient:
+    """
+    HTTP client bersama untuk Open API Olsera.
+
+    Memakai satu requests.Session dengan connection pool keep-alive, jadi handshake
+    TCP+TLS ke Olsera cukup sekali per koneksi, bukan sekali per request. Timeout
+    diatur per endpoint lewat ENDPOINT_TIMEOUTS.
+
+    Semua request melewati token bucket (lihat modules/rate_limiter.py), jadi tidak
+    perlu lagi time.sleep manual di pemanggil. Balasan 429 diulang sampai
+    max_429_retries kali setelah limiter menunggu Retry-After.
+    """
+
+    def __init__(
+        self,
+        base_url: str = OLSERA_BASE_URL,
+        pool_maxsize: int = 10,
+        timeouts: dict = None,
+        default_timeout: tuple = DEFAULT_TIMEOUT,
+        limiter: TokenBucket = None,
+        max_429_retries: int = 2,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeouts = {**ENDPOINT_TIMEOUTS, **(timeouts or {})}
+        self.default_timeout = default_timeout
+        self.limiter = limiter or limiter_from_env("OLSERA")
+        self.max_429_retries = max_429_retries
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeouts.get(path, self.default_timeout))
+        for attempt in range(self.max_429_retries + 1):
+            self.limiter.acquire()
+            response = self.session.request(method, self.base_url + path, **kwargs)
+            if response.status_code != 429:
+                self.limiter.succeeded()
+                return response
+            self.limiter.throttled(_retry_after_seconds(response))
+        return response
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request("POST", path, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> OlseraClient:
+    """Client Olsera bersama untuk seluruh proses, dibuat saat pertama kali dipakai."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OlseraClient()
+    return _client
+
+
+def set_client(client: OlseraClient):
+    """Ganti client bersama, misal untuk base URL lain saat testing."""
+    global _client
+    with _client_lock:
+        _client = client
 
 
 def get_access_token(app_id: str, secret_key: str) -> str:
-    url = "https://api-open.olsera.co.id/api/open-api/v1/id/token"
+    path = "/api/open-api/v1/id/token"
 
     params = {
         "app_id": app_id,
@@ -11,7 +113,7 @@ def get_access_token(app_id: str, secret_key: str) -> str:
     }
 
     try:
-        response = requests.post(url, params=params)
+        response = get_client().post(path, params=params)
         response.raise_for_status()  # Akan memunculkan exception jika status bukan 2xx
         response_data = response.json()
         return response_data["access_token"]
@@ -24,7 +126,7 @@ def get_access_token(app_id: str, secret_key: str) -> str:
 
 
 def refresh_access_token(refresh_token: str) -> None:
-    url = "https://api-open.olsera.co.id/api/open-api/v1/id/token"
+    path = "/api/open-api/v1/id/token"
 
     params = {
         "refresh_token": refresh_token,
@@ -32,7 +134,7 @@ def refresh_access_token(refresh_token: str) -> None:
     }
 
     try:
-        response = requests.post(url, params=params)
+        response = get_client().post(path, params=params)
         response.raise_for_status()  # Akan memunculkan exception jika status bukan 2xx
         response_data = response.json()
         return response_data["access_token"]
@@ -45,7 +147,7 @@ def refresh_access_token(refresh_token: str) -> None:
 
 
 def cek_kastamer(nomor_telepon: str, access_token: str) -> tuple:
-    url = "https://api-open.olsera.co.id/api/open-api/v1/en/customersupplier/customer"
+    path = "/api/open-api/v1/en/customersupplier/customer"
     params = {
         "search_column[]": "phone",
         "search_text[]": (
@@ -58,7 +160,7 @@ def cek_kastamer(nomor_telepon: str, access_token: str) -> tuple:
     headers = {"Authorization": f"Bearer {access_token}"}
 
     try:
-        response = requests.get(url, params=params, headers=headers)
+        response = get_client().get(path, params=params, headers=headers)
         response.raise_for_status()  # Akan memunculkan exception jika status bukan 2xx
         data = response.json()
 
@@ -80,7 +182,7 @@ def create_order(
     notes: str = "",
 ) -> tuple:
 
-    url = "https://api-open.olsera.co.id/api/open-api/v1/en/order/openorder"
+    path = "/api/open-api/v1/en/order/openorder"
 
     if customer_id is not None:
         params = {
@@ -105,7 +207,7 @@ def create_order(
     }
 
     try:
-        response = requests.post(url, json=params, headers=headers)
+        response = get_client().post(path, json=params, headers=headers)
         response.raise_for_status()
         json_response = response.json()
         order_id = json_response["data"]["id"]
@@ -122,7 +224,7 @@ def create_order(
 def add_prod_to_order(
     order_id: str, product_id: str, quantity: int, access_token: str
 ) -> None:
-    url = "https://api-open.olsera.co.id/api/open-api/v1/en/order/openorder/additem"
+    path = "/api/open-api/v1/en/order/openorder/additem"
     params = {"order_id": order_id, "item_products": product_id, "item_qty": quantity}
 
     headers = {
@@ -131,7 +233,7 @@ def add_prod_to_order(
     }
 
     try:
-        response = requests.post(url, json=params, headers=headers)
+        response = get_client().post(path, json=params, headers=headers)
         response.raise_for_status()  # Akan memunculkan exception jika status bukan 2xx
         return response.json()
     except requests.exceptions.HTTPError as http_err:
@@ -164,7 +266,7 @@ def add_combo_to_order(
     :param access_token: Bearer token
     :return: dict hasil response jika sukses, None jika gagal
     """
-    url = "https://api-open.olsera.co.id/api/open-api/v1/en/order/openorder/additemcombo"
+    path = "/api/open-api/v1/en/order/openorder/additemcombo"
 
     # Build form-data payload
     payload = {
@@ -185,7 +287,7 @@ def add_combo_to_order(
     }
 
     try:
-        response = requests.post(url, data=payload, headers=headers)  # gunakan data=payload agar jadi form-data
+        response = get_client().post(path, data=payload, headers=headers)  # gunakan data=payload agar jadi form-data
         response.raise_for_status()
         return True, response.json()
     except requests.exceptions.HTTPError as http_err:
@@ -195,18 +297,19 @@ def add_combo_to_order(
         print(f"Other error occurred on combo inputting: {err}")
         return False, None
 
-def get_product_item_df(access_token, page=1):
-    url = "https://api-open.olsera.co.id/api/open-api/v1/en/product"
+def get_product_item_df(access_token, page=1, client=None, extra_params=None):
+    path = "/api/open-api/v1/en/product"
 
     params = {
         "per_page": 100,
         "page": page,
+        **(extra_params or {}),
     }
 
     headers = {"Authorization": f"Bearer {access_token}"}
 
     try:
-        response = requests.get(url, params=params, headers=headers)
+        response = (client or get_client()).get(path, params=params, headers=headers)
         response.raise_for_status()  # Raise error kalau bukan status 200-an
         return response.json()
     except requests.exceptions.HTTPError as http_err:
@@ -215,18 +318,19 @@ def get_product_item_df(access_token, page=1):
         print(f"Other error occurred: {err}")
 
 
-def get_product_combo_df(access_token, page=1):
-    url = "https://api-open.olsera.co.id/api/open-api/v1/en/productcombo"
+def get_product_combo_df(access_token, page=1, client=None, extra_params=None):
+    path = "/api/open-api/v1/en/productcombo"
 
     params = {
         "per_page": 100,
         "page": page,
+        **(extra_params or {}),
     }
 
     headers = {"Authorization": f"Bearer {access_token}"}
 
     try:
-        response = requests.get(url, params=params, headers=headers)
+        response = (client or get_client()).get(path, params=params, headers=headers)
         response.raise_for_status()  # Raise error kalau bukan status 200-an
         return response.json()
     except requests.exceptions.HTTPError as http_err:
@@ -234,18 +338,19 @@ def get_product_combo_df(access_token, page=1):
     except Exception as err:
         print(f"Other error occurred: {err}")
 
-def get_product_combo_df_v2(access_token, page=1):
-    url = "https://api-open.olsera.co.id/api/open-api/v1/en/productcombo-with-product"
+def get_product_combo_df_v2(access_token, page=1, client=None, extra_params=None):
+    path = "/api/open-api/v1/en/productcombo-with-product"
 
     params = {
         "per_page": 100,
         "page": page,
+        **(extra_params or {}),
     }
 
     headers = {"Authorization": f"Bearer {access_token}"}
 
     try:
-        response = requests.get(url, params=params, headers=headers)
+        response = (client or get_client()).get(path, params=params, headers=headers)
         response.raise_for_status()  # Raise error kalau bukan status 200-an
         return response.json()
     except requests.exceptions.HTTPError as http_err:
@@ -253,62 +358,98 @@ def get_product_combo_df_v2(access_token, page=1):
     except Exception as err:
         print(f"Other error occurred: {err}")
 
-def fetch_all_product_item(access_token):
-    all_items = []
-    page = 1
+def _last_page_from_meta(sample: dict):
+    meta = sample.get("meta") or {}
+    if meta.get("last_page"):
+        return int(meta["last_page"])
+    if meta.get("total") and meta.get("per_page"):
+        return ceil(int(meta["total"]) / int(meta["per_page"]))
+    return None
 
-    while True:
-        sample = get_product_item_df(access_token, page=page)
-        if not sample or "data" not in sample or not sample["data"]:
-            print("No more data to fetch.")
-            break
-        all_items.extend(sample["data"])
-        print(f"Fetched page {page} with {len(sample['data'])} items.")
-        page += 1
 
-    return all_items
-
-
-def fetch_all_product_combos(access_token):
-    all_combos = []
-    page = 1
-
-    while True:
-        sample = get_product_combo_df(access_token, page=page)
-        if not sample or "data" not in sample or not sample["data"]:
-            print("No more data to fetch.")
-            break
-        all_combos.extend(sample["data"])
-        print(f"Fetched page {page} with {len(sample['data'])} items.")
-        page += 1
-
-    return all_combos
-
-def fetch_all_product_combos_v2(access_token):
-    all_combos = []
-    page = 1
+def fetch_all_pages(
+    get_page,
+    access_token: str,
+    max_workers: int = 4,
+    max_requests_per_second: float = 4.0,
+    max_retries: int = 3,
+) -> list:
+    """
+    Ambil semua halaman dari endpoint list Olsera.
 
-    while True:
-        sample = get_product_combo_df_v2(access_token, page=page)
-        if not sample or "data" not in sample or not sample["data"]:
-            print("No more data to fetch.")
-            break
+    Halaman pertama dipakai untuk membaca jumlah halaman dari meta (last_page / total),
+    lalu sisa halaman diambil paralel lewat OlseraClient bersama dengan batas
+    max_requests_per_second. Kalau meta tidak ada, fallback ke jalan per halaman
+    sampai halaman kosong seperti sebelumnya.
 
-        all_combos.extend(sample["data"])
-        print(f"Fetched page {page} with {len(sample['data'])} items.")
-        page += 1
+    Params:
+    - get_page: fungsi get_*_df(access_token, page, client)
 
-    return all_combos
+    Returns:
+    - list, gabungan "data" semua halaman sesuai urutan halaman
+    """
+    # Limit tambahan khusus paginasi di atas limiter global client
+    limiter = TokenBucket(max_requests_per_second, capacity=1)
+    client = get_client()
+
+    def fetch_page(page):
+        for attempt in range(max_retries):
+            limiter.acquire()
+            sample = get_page(access_token, page=page, client=client)
+            if sample and "data" in sample:
+                return sample
+            time.sleep(2 ** attempt)
+        raise RuntimeError(f"Gagal mengambil halaman {page} setelah {max_retries} percobaan.")
+
+    first = fetch_page(1)
+    if not first["data"]:
+        print("No more data to fetch.")
+        return []
+
+    last_page = _last_page_from_meta(first)
+    if last_page is None:
+        all_data = list(first["data"])
+        page = 2
+        while True:
+            sample = get_page(access_token, page=page, client=client)
+            if not sample or "data" not in sample or not sample["data"]:
+                print("No more data to fetch.")
+                break
+            all_data.extend(sample["data"])
+            print(f"Fetched page {page} with {len(sample['data'])} items.")
+            page += 1
+        return all_data
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        rest = list(executor.map(fetch_page, range(2, last_page + 1)))
+
+    all_data = list(first["data"])
+    for sample in rest:
+        all_data.extend(sample["data"])
+    print(f"Fetched {last_page} pages with {len(all_data)} items.")
+    return all_data
+
+
+def fetch_all_product_item(access_token, **kwargs):
+    return fetch_all_pages(get_product_item_df, access_token, **kwargs)
+
+
+def fetch_all_product_combos(access_token, **kwargs):
+    return fetch_all_pages(get_product_combo_df, access_token, **kwargs)
+
+
+def fetch_all_product_combos_v2(access_token, **kwargs):
+    return fetch_all_pages(get_product_combo_df_v2, access_token, **kwargs)
 
 def fetch_product_item_details(item_id: str, access_token: str):
-    url = "https://api-open.olsera.co.id/api/open-api/v1/en/product/detail"
+    path = "/api/open-api/v1/en/product/detail"
     params = {
         "id": item_id,
     }
 
     headers = {"Authorization": f"Bearer {access_token}"}
     try:
-        response = requests.get(url, params=params, headers=headers)
+        response = get_client().get(path, params=params, headers=headers)
         response.raise_for_status()  # Raise error kalau bukan status 200-an
         return response.json()
     except requests.exceptions.HTTPError as http_err:
@@ -320,7 +461,7 @@ def fetch_product_item_details(item_id: str, access_token: str):
 
 
 def fetch_product_combo_details(combo_id: str, access_token: str):
-    url = "https://api-open.olsera.co.id/api/open-api/v1/en/productcombo/detail"
+    path = "/api/open-api/v1/en/productcombo/detail"
     params = {
         "id": combo_id,
     }
@@ -328,7 +469,7 @@ def fetch_product_combo_details(combo_id: str, access_token: str):
     headers = {"Authorization": f"Bearer {access_token}"}
 
     try:
-        response = requests.get(url, params=params, headers=headers)
+        response = get_client().get(path, params=params, headers=headers)
         response.raise_for_status()  # Raise error kalau bukan status 200-an
         return response.json()
     except requests.exceptions.HTTPError as http_err:
@@ -338,7 +479,7 @@ def fetch_product_combo_details(combo_id: str, access_token: str):
 
 
 def fetch_open_ord_id_via_resi(resi: str, access_token: str):
-    url = "https://api-open.olsera.co.id/api/open-api/v1/en/order/openorder"
+    path = "/api/open-api/v1/en/order/openorder"
 
     params = {
         "search_column[]": "order_no",
@@ -348,7 +489,7 @@ def fetch_open_ord_id_via_resi(resi: str, access_token: str):
     headers = {"Authorization": f"Bearer {access_token}"}
 
     try:
-        response = requests.get(url, params=params, headers=headers)
+        response = get_client().get(path, params=params, headers=headers)
         response.raise_for_status()  # Raise error kalau bukan status 200-an
         data = response.json()
         if data and "data" in data:
@@ -361,7 +502,7 @@ def fetch_open_ord_id_via_resi(resi: str, access_token: str):
 
 
 def fetch_close_ord_id_via_resi(resi: str, access_token: str):
-    url = "	https://api-open.olsera.co.id/api/open-api/v1/en/order/closeorder"
+    path = "/api/open-api/v1/en/order/closeorder"
 
     params = {
         "search_column[]": "order_no",
@@ -371,7 +512,7 @@ def fetch_close_ord_id_via_resi(resi: str, access_token: str):
     headers = {"Authorization": f"Bearer {access_token}"}
 
     try:
-        response = requests.get(url, params=params, headers=headers)
+        response = get_client().get(path, params=params, headers=headers)
         response.raise_for_status()  # Raise error kalau bukan status 200-an
         data = response.json()
         if data and "data" in data:
@@ -385,7 +526,7 @@ def fetch_close_ord_id_via_resi(resi: str, access_token: str):
 
 
 def fetch_order_details(order_id: str, access_token: str):
-    url = "https://api-open.olsera.co.id/api/open-api/v1/en/order/openorder/detail"
+    path = "/api/open-api/v1/en/order/openorder/detail"
     params = {
         "id": order_id,
     }
@@ -393,7 +534,7 @@ def fetch_order_details(order_id: str, access_token: str):
     headers = {"Authorization": f"Bearer {access_token}"}
 
     try:
-        response = requests.get(url, params=params, headers=headers)
+        response = get_client().get(path, params=params, headers=headers)
         response.raise_for_status()  # Raise error kalau bukan status 200-an
         return response.json()
     except requests.exceptions.HTTPError as http_err:
@@ -402,7 +543,7 @@ def fetch_order_details(order_id: str, access_token: str):
         print(f"Other error occurred: {err}")
 
 def fetch_open_order_table(start_date: str, end_date: str, access_token: str):
-    url = "https://api-open.olsera.co.id/api/open-api/v1/en/order/openorder"
+    path = "/api/open-api/v1/en/order/openorder"
 
     params = {
         "start_date": start_date,
@@ -412,7 +553,7 @@ def fetch_open_order_table(start_date: str, end_date: str, access_token: str):
     headers = {"Authorization": f"Bearer {access_token}"}
 
     try:
-        response = requests.get(url, params=params, headers=headers)
+        response = get_client().get(path, params=params, headers=headers)
         response.raise_for_status()  # Raise error kalau bukan status 200-an
         data = response.json()
         if data and "data" in data:
@@ -432,9 +573,7 @@ def update_order_detail(
     qty: int,
     access_token: str,
 ) -> None:
-    url = (
-        "https://api-open.olsera.co.id/api/open-api/v1/en/order/openorder/updatedetail"
-    )
+    path = "/api/open-api/v1/en/order/openorder/updatedetail"
     params = {
         "order_id": order_id,
         "id": id,
@@ -450,7 +589,7 @@ def update_order_detail(
     }
 
     try:
-        response = requests.post(url, json=params, headers=headers)
+        response = get_client().post(path, json=params, headers=headers)
         response.raise_for_status()  # Akan memunculkan exception jika status bukan 2xx
         return response.json()
     except requests.exceptions.HTTPError as http_err:
@@ -462,7 +601,7 @@ def update_order_detail(
 
 
 def update_order_attr(order_id: str, name: str, value: str, access_token: str) -> None:
-    url = "https://api-open.olsera.co.id/api/open-api/v1/en/order/openorder/updateattr"
+    path = "/api/open-api/v1/en/order/openorder/updateattr"
     params = {"order_id": order_id, "name": name, "value": value}
 
     headers = {
@@ -471,7 +610,7 @@ def update_order_attr(order_id: str, name: str, value: str, access_token: str) -
     }
 
     try:
-        response = requests.post(url, json=params, headers=headers)
+        response = get_client().post(path, json=params, headers=headers)
         response.raise_for_status()  # Akan memunculkan exception jika status bukan 2xx
         return response.json()
     except requests.exceptions.HTTPError as http_err:
@@ -483,14 +622,14 @@ def update_order_attr(order_id: str, name: str, value: str, access_token: str) -
 
 
 def list_payment_modes(order_id: str, access_token: str) -> list:
-    url = "https://api-open.olsera.co.id/api/open-api/v1/en/order/openorder/editpayment"
+    path = "/api/open-api/v1/en/order/openorder/editpayment"
 
     params = {"order_id": order_id}
 
     headers = {"Authorization": f"Bearer {access_token}"}
 
     try:
-        response = requests.get(url, params=params, headers=headers)
+        response = get_client().get(path, params=params, headers=headers)
         response.raise_for_status()  # Akan memunculkan exception jika status bukan 2xx
         data = response.json()
         payment_modes = data["data"]["payment_modes"]
@@ -513,9 +652,7 @@ def update_payment(
     payment_seq: str = "0",
     payment_currency_id: str = "IDR",
 ):
-    url = (
-        "https://api-open.olsera.co.id/api/open-api/v1/en/order/openorder/updatepayment"
-    )
+    path = "/api/open-api/v1/en/order/openorder/updatepayment"
     params = {
         "order_id": order_id,
         "payment_amount": payment_amount,
@@ -532,7 +669,7 @@ def update_payment(
     }
 
     try:
-        response = requests.post(url, json=params, headers=headers)
+        response = get_client().post(path, json=params, headers=headers)
         response.raise_for_status()  # Akan memunculkan exception jika status bukan 2xx
         return response.json()
     except requests.exceptions.HTTPError as http_err:
@@ -544,9 +681,7 @@ def update_payment(
 
 
 def update_status(order_id: str, status: str, access_token: str) -> None:
-    url = (
-        "https://api-open.olsera.co.id/api/open-api/v1/en/order/openorder/updatestatus"
-    )
+    path = "/api/open-api/v1/en/order/openorder/updatestatus"
     params = {"order_id": order_id, "status": status}
 
     headers = {
@@ -555,7 +690,7 @@ def update_status(order_id: str, status: str, access_token: str) -> None:
     }
 
     try:
-        response = requests.post(url, json=params, headers=headers)
+        response = get_client().post(path, json=params, headers=headers)
         response.raise_for_status()  # Akan memunculkan exception jika status bukan 2xx
         return response.json()
     except requests.exceptions.HTTPError as http_err:
@@ -567,7 +702,7 @@ def update_status(order_id: str, status: str, access_token: str) -> None:
 
 
 def search_ongkir_related_product(keywords: str, access_token: str) -> tuple:
-    url = "https://api-open.olsera.co.id/api/open-api/v1/en/product"
+    path = "/api/open-api/v1/en/product"
     params = {
         "search_column[]": "name",
         "search_text[]": keywords,
@@ -576,7 +711,7 @@ def search_ongkir_related_product(keywords: str, access_token: str) -> tuple:
     headers = {"Authorization": f"Bearer {access_token}"}
 
     try:
-        response = requests.get(url, params=params, headers=headers)
+        response = get_client().get(path, params=params, headers=headers)
         response.raise_for_status()  # Akan memunculkan exception jika status bukan 2xx
         data = response.json()
 
@@ -609,7 +744,7 @@ def cetak_struk(order_no: str, phone: str) -> str:
     return url
 
 def _add_combo_to_order(order_id:str, combo_id:str,quantity:int, combo_items:list,access_token:str) : 
-    url = "https://api-open.olsera.co.id/api/open-api/v1/en/order/openorder/additemcombo"
+    path = "/api/open-api/v1/en/order/openorder/additemcombo"
 
     params = {
         "order_id" : order_id,
@@ -623,7 +758,7 @@ def _add_combo_to_order(order_id:str, combo_id:str,quantity:int, combo_items:lis
         "Content-Type" : "application/json"
     }
     try : 
-        response = requests.post(url,json=params,headers=headers)
+        response = get_client().post(path,json=params,headers=headers)
         response.raise_for_status()
         return True, response.json()
     except requests.exceptions.HTTPError as http_err : 
@@ -0,0 +1,360 @@
+import httpx
+
+from modules.crud_utility import (
+    DEFAULT_TIMEOUT,
+    ENDPOINT_TIMEOUTS,
+    OLSERA_BASE_URL,
+    get_client,
+)
+from modules.rate_limiter import TokenBucket
+
+
+def _httpx_timeout(timeout: tuple) -> httpx.Timeout:
+    connect, read = timeout
+    return httpx.Timeout(read, connect=connect)
+
+
+class AsyncOlseraClient:
+    """
+    Versi async dari OlseraClient, di atas httpx.AsyncClient.
+
+    Timeout per endpoint sama dengan client sync, dan secara default memakai limiter
+    milik client sync supaya request sync dan async berbagi satu budget rate limit.
+    Client terikat ke event loop yang membuatnya, jadi pakai sebagai async context
+    manager di dalam loop yang sama:
+
+        async with AsyncOlseraClient() as client:
+            await cek_kastamer(client, "0812...", access_token)
+    """
+
+    def __init__(
+        self,
+        base_url: str = OLSERA_BASE_URL,
+        max_connections: int = 10,
+        timeouts: dict = None,
+        default_timeout: tuple = DEFAULT_TIMEOUT,
+        limiter: TokenBucket = None,
+        max_429_retries: int = 2,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeouts = {**ENDPOINT_TIMEOUTS, **(timeouts or {})}
+        self.default_timeout = default_timeout
+        self.limiter = limiter or get_client().limiter
+        self.max_429_retries = max_429_retries
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+
+    async def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        kwargs.setdefault(
+            "timeout", _httpx_timeout(self.timeouts.get(path, self.default_timeout))
+        )
+        for attempt in range(self.max_429_retries + 1):
+            await self.limiter.acquire_async()
+            response = await self.client.request(method, path, **kwargs)
+            if response.status_code != 429:
+                await self.limiter.succeeded_async()
+                return response
+            try:
+                retry_after = float(response.headers.get("Retry-After"))
+            except (TypeError, ValueError):
+                retry_after = None
+            await self.limiter.throttled_async(retry_after)
+        return response
+
+    async def get(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", path, **kwargs)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+
+async def cek_kastamer(client: AsyncOlseraClient, nomor_telepon: str, access_token: str) -> tuple:
+    path = "/api/open-api/v1/en/customersupplier/customer"
+    params = {
+        "search_column[]": "phone",
+        "search_text[]": (
+            "+62" + nomor_telepon[1:]
+            if nomor_telepon.startswith("0")
+            else nomor_telepon
+        ),
+    }
+
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    try:
+        response = await client.get(path, params=params, headers=headers)
+        response.raise_for_status()
+        data = response.json()
+
+        return data["data"][0]["id"], data["data"][0]["name"] if data["data"] else None
+    except httpx.HTTPStatusError as http_err:
+        print(f"HTTP error occurred: {http_err} - Response: {response.text}")
+        return None
+    except Exception as err:
+        print(f"Other error occurred: {err}")
+        return {}
+
+
+async def create_order(
+    client: AsyncOlseraClient,
+    order_date: str,
+    access_token: str,
+    customer_id: str = None,
+    nomor_telepon: str = None,
+    nama_kastamer: str = None,
+    notes: str = "",
+) -> tuple:
+    path = "/api/open-api/v1/en/order/openorder"
+
+    if customer_id is not None:
+        params = {
+            "order_date": order_date,
+            "currency_id": "IDR",
+            "customer_id": customer_id,
+            "notes": notes,
+        }
+    else:
+        params = {
+            "order_date": order_date,
+            "currency_id": "IDR",
+            "customer_phone": nomor_telepon,
+            "customer_name": nama_kastamer,
+            "customer_type_id": "195972",
+            "notes": notes,
+        }
+
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json",
+    }
+
+    try:
+        response = await client.post(path, json=params, headers=headers)
+        response.raise_for_status()
+        json_response = response.json()
+        return json_response["data"]["id"], json_response["data"]["order_no"]
+    except httpx.HTTPStatusError as http_err:
+        print(
+            f"HTTP error occurred on product inputting: {http_err} - Response: {response.text}"
+        )
+    except Exception as err:
+        print(f"Other error occurred on product inputting: {err}")
+
+
+async def add_prod_to_order(
+    client: AsyncOlseraClient, order_id: str, product_id: str, quantity: int, access_token: str
+):
+    path = "/api/open-api/v1/en/order/openorder/additem"
+    params = {"order_id": order_id, "item_products": product_id, "item_qty": quantity}
+
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json",
+    }
+
+    try:
+        response = await client.post(path, json=params, headers=headers)
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPStatusError as http_err:
+        print(
+            f"HTTP error occurred on product inputting: {http_err} - Response: {response.text}"
+        )
+        return None
+    except Exception as err:
+        print(f"Other error occurred on product inputting: {err}")
+        return None
+
+
+async def add_combo_to_order(
+    client: AsyncOlseraClient,
+    order_id: str,
+    combo_id: str,
+    quantity: int,
+    combo_items: list[dict],
+    access_token: str,
+):
+    """Lihat crud_utility.add_combo_to_order untuk format combo_items."""
+    path = "/api/open-api/v1/en/order/openorder/additemcombo"
+
+    payload = {
+        "order_id": str(order_id),
+        "item_combo_id": str(combo_id),
+        "item_combo_qty": str(quantity),
+    }
+    for i, item in enumerate(combo_items):
+        payload[f"item_combo_items[{i}][id]"] = str(item["id"])
+        payload[f"item_combo_items[{i}][product_id]"] = str(item["product_id"])
+        if item.get("product_variant_id"):
+            payload[f"item_combo_items[{i}][product_variant_id]"] = str(item["product_variant_id"])
+
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    try:
+        response = await client.post(path, data=payload, headers=headers)
+        response.raise_for_status()
+        return True, response.json()
+    except httpx.HTTPStatusError as http_err:
+        print(f"HTTP error occurred on combo inputting: {http_err} - Response: {response.text}")
+        return False, None
+    except Exception as err:
+        print(f"Other error occurred on combo inputting: {err}")
+        return False, None
+
+
+async def fetch_product_item_details(client: AsyncOlseraClient, item_id: str, access_token: str):
+    path = "/api/open-api/v1/en/product/detail"
+    params = {"id": item_id}
+
+    headers = {"Authorization": f"Bearer {access_token}"}
+    try:
+        response = await client.get(path, params=params, headers=headers)
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPStatusError as http_err:
+        print(f"HTTP error occurred: {http_err} - Response: {response.text}")
+        return response.json()
+
+
+async def fetch_order_details(client: AsyncOlseraClient, order_id: str, access_token: str):
+    path = "/api/open-api/v1/en/order/openorder/detail"
+    params = {"id": order_id}
+
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    try:
+        response = await client.get(path, params=params, headers=headers)
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPStatusError as http_err:
+        print(f"HTTP error occurred: {http_err} - Response: {response.text}")
+    except Exception as err:
+        print(f"Other error occurred: {err}")
+
+
+async def update_order_detail(
+    client: AsyncOlseraClient,
+    order_id: str,
+    id: str,
+    disc: int,
+    note: str,
+    price: str,
+    qty: int,
+    access_token: str,
+):
+    path = "/api/open-api/v1/en/order/openorder/updatedetail"
+    params = {
+        "order_id": order_id,
+        "id": id,
+        "discount": disc,
+        "note": note,
+        "price": price,
+        "qty": qty,
+    }
+
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json",
+    }
+
+    try:
+        response = await client.post(path, json=params, headers=headers)
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPStatusError as http_err:
+        print(
+            f"HTTP error occurred on order detail update: {http_err} - Response: {response.text}"
+        )
+    except Exception as err:
+        print(f"Other error occurred on order detail update: {err}")
+
+
+async def list_payment_modes(client: AsyncOlseraClient, order_id: str, access_token: str) -> list:
+    path = "/api/open-api/v1/en/order/openorder/editpayment"
+    params = {"order_id": order_id}
+
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    try:
+        response = await client.get(path, params=params, headers=headers)
+        response.raise_for_status()
+        return response.json()["data"]["payment_modes"]
+    except httpx.HTTPStatusError as http_err:
+        print(f"HTTP error occurred: {http_err} - Response: {response.text}")
+    except Exception as err:
+        print(f"Other error occurred: {err}")
+        return None
+
+
+async def update_payment(
+    client: AsyncOlseraClient,
+    order_id: str,
+    payment_amount: str,
+    payment_date: str,
+    payment_mode_id: str,
+    access_token: str,
+    payment_payee: str = "",
+    payment_seq: str = "0",
+    payment_currency_id: str = "IDR",
+):
+    path = "/api/open-api/v1/en/order/openorder/updatepayment"
+    params = {
+        "order_id": order_id,
+        "payment_amount": payment_amount,
+        "payment_date": payment_date,
+        "payment_mode_id": payment_mode_id,
+        "payment_payee": payment_payee,
+        "payment_seq": payment_seq,
+        "payment_currency_id": payment_currency_id,
+    }
+
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json",
+    }
+
+    try:
+        response = await client.post(path, json=params, headers=headers)
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPStatusError as http_err:
+        print(
+            f"HTTP error occurred on order detail update: {http_err} - Response: {response.text}"
+        )
+    except Exception as err:
+        print(f"Other error occurred on order detail update: {err}")
+
+
+async def update_status(client: AsyncOlseraClient, order_id: str, status: str, access_token: str):
+    path = "/api/open-api/v1/en/order/openorder/updatestatus"
+    params = {"order_id": order_id, "status": status}
+
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json",
+    }
+
+    try:
+        response = await client.post(path, json=params, headers=headers)
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPStatusError as http_err:
+        print(
+            f"HTTP error occurred on order status update: {http_err} - Response: {response.text}"
+        )
+    except Exception as err:
+        print(f"Other error occurred on order status update: {err}")
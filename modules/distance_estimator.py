@@ -0,0 +1,162 @@
+import math
+import threading
+from statistics import median
+
+from modules.geo_cache import geohash
+
+# Batas band ongkir di distance_cost_rule (km), plus batas jarak maksimal order (45)
+PRICE_EDGES_KM = (9.5, 13.9, 14, 18.9, 23.9, 28.9, 33.9, 38.9, 43.9, 45, 48.9)
+# Untuk I/EX, estimasi_tiba membaca tabel per km (ceil), jadi setiap km bulat juga batas
+ETA_EDGE_TYPES = ("I", "EX")
+ETA_MAX_KM = 20
+
+
+def haversine_km(a, b) -> float:
+    lat1, lng1, lat2, lng2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(h))
+
+
+def bearing_deg(a, b) -> float:
+    lat1, lng1, lat2, lng2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    x = math.sin(lng2 - lng1) * math.cos(lat2)
+    y = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(lng2 - lng1)
+    return (math.degrees(math.atan2(x, y)) + 360) % 360
+
+
+def band_edges(jenis_pengiriman: str = None) -> list:
+    edges = list(PRICE_EDGES_KM)
+    if (jenis_pengiriman or "").upper() in ETA_EDGE_TYPES:
+        edges += range(1, ETA_MAX_KM + 1)
+    return edges
+
+
+class DetourEstimator:
+    """
+    Perkiraan jarak tempuh dari toko tanpa Distance Matrix: jarak garis lurus
+    (haversine) dikali faktor belok jalan, yang dikalibrasi per sektor arah dari
+    hasil Distance Matrix sebelumnya (rasio jarak jalan / garis lurus).
+
+    Setiap sektor menyimpan satu sampel per sel geohash tujuan (sampel terbaru
+    menimpa), jadi pelanggan yang sering order tidak mendominasi faktornya. Margin
+    estimasi diambil dari sebaran faktor di sektor itu (kuantil margin_quantile).
+    Sektor dengan sampel kurang dari min_samples memakai default_factor dan tidak
+    pernah dianggap yakin; estimasinya hanya dipakai sebagai cadangan kalau
+    Distance Matrix gagal.
+    """
+
+    def __init__(
+        self,
+        origin,
+        sectors: int = 8,
+        default_factor: float = 1.35,
+        default_speed_kmh: float = 25.0,
+        min_samples: int = 5,
+        margin_quantile: float = 0.95,
+        min_margin_km: float = 0.3,
+        min_relative_margin: float = 0.05,
+    ):
+        self.origin = tuple(origin)
+        self.sectors = sectors
+        self.default_factor = default_factor
+        self.default_speed_kmh = default_speed_kmh
+        self.min_samples = min_samples
+        self.margin_quantile = margin_quantile
+        self.min_margin_km = min_margin_km
+        self.min_relative_margin = min_relative_margin
+        self._samples = [{} for _ in range(sectors)]
+        self._stats = [None] * sectors
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_geo_cache(cls, geo_cache, origin, **kwargs):
+        """Kalibrasi awal dari entri jarak di GeoCache (hasil Distance Matrix yang tersimpan)."""
+        estimator = cls(origin, **kwargs)
+        if geo_cache is None:
+            return estimator
+        for _, entry in geo_cache.caches["distance"].items():
+            destination = entry.get("destination")
+            result = entry.get("result") or {}
+            if destination and result.get("distance_meters"):
+                estimator.observe(
+                    destination, result["distance_meters"] / 1000, result.get("duration_seconds")
+                )
+        return estimator
+
+    def _sector(self, destination) -> int:
+        return int(bearing_deg(self.origin, destination) // (360 / self.sectors)) % self.sectors
+
+    def observe(self, destination, road_km: float, duration_seconds: float = None):
+        straight_km = haversine_km(self.origin, destination)
+        # Titik yang terlalu dekat ke toko membuat rasionya tidak stabil
+        if straight_km < 0.5 or not road_km:
+            return
+        sector = self._sector(destination)
+        with self._lock:
+            self._samples[sector][geohash(destination[0], destination[1], 7)] = (
+                road_km / straight_km,
+                road_km / (duration_seconds / 3600) if duration_seconds else None,
+            )
+            self._stats[sector] = None
+
+    def _sector_stats(self, sector: int):
+        with self._lock:
+            stats = self._stats[sector]
+            if stats is not None:
+                return stats
+            samples = list(self._samples[sector].values())
+            factors = [factor for factor, _ in samples]
+            speeds = [speed for _, speed in samples if speed]
+            if len(factors) < self.min_samples:
+                stats = (self.default_factor, None, self.default_speed_kmh, len(factors))
+            else:
+                factor = median(factors)
+                deviations = sorted(abs(f / factor - 1) for f in factors)
+                index = min(len(deviations) - 1, int(self.margin_quantile * len(deviations)))
+                stats = (
+                    factor,
+                    max(deviations[index], self.min_relative_margin),
+                    median(speeds) if speeds else self.default_speed_kmh,
+                    len(factors),
+                )
+            self._stats[sector] = stats
+            return stats
+
+    def estimate(self, destination):
+        """
+        Returns:
+        - dict {distance_km, margin_km, duration_seconds, samples, calibrated}, atau
+          None kalau koordinat tujuan tidak ada
+        """
+        if not destination or destination[0] is None or destination[1] is None:
+            return None
+        factor, relative_margin, speed_kmh, samples = self._sector_stats(self._sector(destination))
+        distance_km = haversine_km(self.origin, destination) * factor
+        calibrated = relative_margin is not None
+        return {
+            "distance_km": distance_km,
+            "margin_km": max(distance_km * relative_margin, self.min_margin_km) if calibrated else None,
+            "duration_seconds": int(distance_km / speed_kmh * 3600),
+            "samples": samples,
+            "calibrated": calibrated,
+        }
+
+    def confident(self, estimate: dict, jenis_pengiriman: str = None) -> bool:
+        """True kalau seluruh rentang estimasi +- margin jatuh di satu band ongkir (dan ETA untuk I/EX)."""
+        if not estimate or not estimate["calibrated"]:
+            return False
+        low = estimate["distance_km"] - estimate["margin_km"]
+        high = estimate["distance_km"] + estimate["margin_km"]
+        return not any(low <= edge <= high for edge in band_edges(jenis_pengiriman))
+
+    @staticmethod
+    def as_travel_distance(estimate: dict) -> dict:
+        """Format sama dengan get_travel_distance, ditandai estimated=True."""
+        meters = int(estimate["distance_km"] * 1000)
+        return {
+            "distance_text": f"{estimate['distance_km']:.1f} km",
+            "distance_meters": meters,
+            "duration_text": f"{max(1, estimate['duration_seconds'] // 60)} mins",
+            "duration_seconds": estimate["duration_seconds"],
+            "estimated": True,
+        }
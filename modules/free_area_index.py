@@ -0,0 +1,154 @@
+import json
+import logging
+import math
+import re
+
+logger = logging.getLogger(__name__)
+
+# Dipakai kalau file area tidak ada, supaya subsidi ongkir tetap jalan
+DEFAULT_FREE_AREAS = [
+    "Gedongan",
+    "Gedangan",
+    "Gentan",
+    "Kadilangu",
+    "Kudu",
+    "Kwarasan",
+    "Langenharjo",
+    "Madegondo",
+    "Gonilan",
+    "Gumpang",
+    "Pabelan",
+    "Blulukan",
+    "Karangasem",
+    "Baturan",
+    "Gajahan",
+    "Paulan",
+]
+
+
+def _normalize(name: str) -> str:
+    return " ".join(str(name).lower().split())
+
+
+def _point_in_ring(lng: float, lat: float, ring: list) -> bool:
+    inside = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        xi, yi = ring[i][0], ring[i][1]
+        xj, yj = ring[j][0], ring[j][1]
+        if (yi > lat) != (yj > lat) and lng < (xj - xi) * (lat - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+def _point_in_polygon(lng: float, lat: float, polygon: list) -> bool:
+    """polygon = [ring luar, lubang...] dengan koordinat GeoJSON [lng, lat]."""
+    if not _point_in_ring(lng, lat, polygon[0]):
+        return False
+    return not any(_point_in_ring(lng, lat, hole) for hole in polygon[1:])
+
+
+class FreeAreaIndex:
+    """
+    Daftar area subsidi ongkir, dimuat sekali dari GeoJSON (FeatureCollection dengan
+    properties.name per kelurahan).
+
+    Area yang punya geometry (Polygon/MultiPolygon) dicek dengan point-in-polygon
+    terhadap koordinat pelanggan. Polygon dimasukkan ke grid berukuran cell_deg
+    derajat menurut bounding box-nya, jadi satu lookup hanya mengecek polygon di sel
+    titik itu. Area tanpa geometry (atau semua area, kalau koordinat pelanggan tidak
+    ada) dicocokkan lewat nama: kelurahan hasil geocode, lalu nama utuh (batas kata)
+    di teks alamat dengan satu regex gabungan.
+    """
+
+    def __init__(self, areas: list, cell_deg: float = 0.01):
+        self.cell_deg = cell_deg
+        self.names = []
+        self._grid = {}
+        self._by_name = {}
+        self._polygon_names = set()
+        for area in areas:
+            name = area["name"]
+            self.names.append(name)
+            self._by_name[_normalize(name)] = name
+            polygons = area.get("polygons")
+            if polygons:
+                self._add_polygons(name, polygons)
+                self._polygon_names.add(name)
+
+        # Nama yang lebih panjang dicoba dulu supaya tidak kalah oleh nama yang lebih pendek
+        alternatives = sorted(self._by_name, key=len, reverse=True)
+        self._name_pattern = (
+            re.compile(r"\b(" + "|".join(re.escape(n) for n in alternatives) + r")\b")
+            if alternatives
+            else None
+        )
+
+    @classmethod
+    def from_geojson(cls, path: str, **kwargs):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                collection = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Gagal memuat area gratis ongkir %s, pakai daftar bawaan: %s", path, e)
+            return cls.from_names(DEFAULT_FREE_AREAS, **kwargs)
+
+        areas = []
+        for feature in collection.get("features", []):
+            name = (feature.get("properties") or {}).get("name")
+            if not name:
+                continue
+            geometry = feature.get("geometry") or {}
+            if geometry.get("type") == "Polygon":
+                polygons = [geometry["coordinates"]]
+            elif geometry.get("type") == "MultiPolygon":
+                polygons = geometry["coordinates"]
+            else:
+                polygons = None
+            areas.append({"name": name, "polygons": polygons})
+        return cls(areas, **kwargs)
+
+    @classmethod
+    def from_names(cls, names: list, **kwargs):
+        return cls([{"name": name} for name in names], **kwargs)
+
+    def _cell(self, lng: float, lat: float):
+        return math.floor(lng / self.cell_deg), math.floor(lat / self.cell_deg)
+
+    def _add_polygons(self, name: str, polygons: list):
+        for polygon in polygons:
+            lngs = [point[0] for point in polygon[0]]
+            lats = [point[1] for point in polygon[0]]
+            min_x, min_y = self._cell(min(lngs), min(lats))
+            max_x, max_y = self._cell(max(lngs), max(lats))
+            for x in range(min_x, max_x + 1):
+                for y in range(min_y, max_y + 1):
+                    self._grid.setdefault((x, y), []).append((name, polygon))
+
+    def lookup(self, latlng=None, kelurahan: str = None, address: str = None):
+        """
+        Returns:
+        - (True, nama area) kalau pelanggan di area subsidi, atau (False, None)
+        """
+        has_point = bool(latlng) and latlng[0] is not None and latlng[1] is not None
+        if has_point:
+            lat, lng = float(latlng[0]), float(latlng[1])
+            for name, polygon in self._grid.get(self._cell(lng, lat), ()):
+                if _point_in_polygon(lng, lat, polygon):
+                    return True, name
+
+        def by_name(name):
+            # Area ber-polygon sudah dijawab oleh koordinat di atas
+            return name is not None and not (has_point and name in self._polygon_names)
+
+        if kelurahan:
+            name = self._by_name.get(_normalize(kelurahan))
+            if by_name(name):
+                return True, name
+        if address and self._name_pattern is not None:
+            for match in self._name_pattern.finditer(_normalize(address)):
+                name = self._by_name[match.group(1)]
+                if by_name(name):
+                    return True, name
+        return False, None
@@ -0,0 +1,143 @@
+import threading
+from collections import Counter
+from datetime import datetime
+
+from modules.persistent_cache import PersistentCache
+
+
+_GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash(lat: float, lng: float, precision: int = 7) -> str:
+    """Geohash standar; presisi 7 = sel ~150 x 150 m, presisi 8 = ~38 x 19 m."""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    code, bits, bit_count, even = [], 0, 0, True
+    while len(code) < precision:
+        value, bounds = (lng, lng_range) if even else (lat, lat_range)
+        mid = (bounds[0] + bounds[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            bounds[0] = mid
+        else:
+            bounds[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            code.append(_GEOHASH_BASE32[bits])
+            bits, bit_count = 0, 0
+    return "".join(code)
+
+
+def time_bucket(dt: datetime) -> str:
+    """Kelompok jam untuk durasi perjalanan, mengikuti jam operasional toko."""
+    if 11 <= dt.hour < 15:
+        return "siang"
+    if 15 <= dt.hour < 20:
+        return "sore"
+    if dt.hour >= 20 or dt.hour < 4:
+        return "malam"
+    return "pagi"
+
+
+def normalize_address(address: str) -> str:
+    """Alamat teks yang beda huruf besar/spasi/tanda baca di ujung dianggap sama."""
+    return " ".join(str(address).lower().replace(",", " , ").split()).strip(" ,.")
+
+
+def normalize_shortlink(shortlink: str) -> str:
+    # Link share dari app Maps sering ditambah ?g_st=... yang tidak mengubah tujuan
+    link = str(shortlink).strip()
+    if "maps.app.goo.gl" in link:
+        link = link.split("?")[0]
+    return link.rstrip("/")
+
+
+class GeoCache:
+    """
+    Cache hasil Google Maps di SQLite (lewat PersistentCache), supaya alamat pelanggan
+    yang sering order tidak perlu di-resolve ulang lewat jaringan.
+
+    Jenis entri (masing-masing satu namespace):
+    - shortlink: shortlink -> URL akhir setelah redirect
+    - place: URL akhir -> (formatted_address, (lat, lng), kelurahan, kecamatan, kota, provinsi)
+    - address: alamat teks yang dinormalisasi -> (lat, lng)
+    - distance: (asal, geohash tujuan, mode, kelompok jam) -> hasil get_travel_distance
+
+    Tujuan jarak dibulatkan ke sel geohash distance_precision, jadi pelanggan yang
+    titiknya berdekatan memakai hasil Distance Matrix yang sama (selisihnya paling
+    jauh seukuran sel). Entri jarak punya ttl sendiri (distance_ttl) karena durasi
+    perjalanan lebih cepat berubah daripada alamat.
+
+    Setiap jenis dibatasi max_entries (LRU) dan ttl detik. Hit/miss dicatat per
+    jenis dan bisa dilihat lewat report(), termasuk perkiraan waktu API yang dihemat
+    cache jarak.
+    """
+
+    KINDS = ("shortlink", "place", "address", "distance")
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float = 30 * 24 * 3600,
+        max_entries: int = 20000,
+        distance_ttl: float = 7 * 24 * 3600,
+        distance_precision: int = 7,
+    ):
+        self.caches = {
+            kind: PersistentCache(
+                path,
+                namespace=f"maps_{kind}",
+                max_entries=max_entries,
+                ttl=distance_ttl if kind == "distance" else ttl,
+            )
+            for kind in self.KINDS
+        }
+        self.distance_precision = distance_precision
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    def get(self, kind: str, key: str):
+        value = self.caches[kind].get(key)
+        with self._lock:
+            self.stats[f"{kind}_{'hit' if value is not None else 'miss'}"] += 1
+        return value
+
+    def set(self, kind: str, key: str, value):
+        self.caches[kind].set(key, value)
+
+    def distance_key(self, origin, destination, mode: str, when: datetime = None) -> str:
+        return "{}:{}:{}:{}".format(
+            geohash(origin[0], origin[1], self.distance_precision),
+            geohash(destination[0], destination[1], self.distance_precision),
+            mode,
+            time_bucket(when or datetime.now()),
+        )
+
+    def get_distance(self, key: str):
+        entry = self.get("distance", key)
+        if entry is None:
+            return None
+        with self._lock:
+            self.stats["distance_saved_seconds"] += entry.get("api_seconds", 0.0)
+        return entry["result"]
+
+    def set_distance(self, key: str, result: dict, api_seconds: float, destination=None):
+        # Koordinat tujuan ikut disimpan untuk kalibrasi DetourEstimator
+        entry = {"result": result, "api_seconds": api_seconds, "destination": destination}
+        self.set("distance", key, entry)
+
+    def report(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        report = {}
+        for kind in self.KINDS:
+            hits, misses = stats.get(f"{kind}_hit", 0), stats.get(f"{kind}_miss", 0)
+            total = hits + misses
+            report[kind] = {
+                "hit": hits,
+                "miss": misses,
+                "hit_rate": round(hits / total, 3) if total else 0.0,
+            }
+        report["distance"]["saved_seconds"] = round(stats.get("distance_saved_seconds", 0.0), 3)
+        return report
@@ -0,0 +1,184 @@
+import json
+import logging
+from abc import ABC, abstractmethod
+import random
+import re
+import threading
+import time
+from collections import Counter
+
+import google.generativeai as genai
+
+from modules.model_pool import GeminiModelPool
+from modules.reconfirm_parser import build_notes_text, parse_reconfirm
+from modules.stage_timer import count
+
+logger = logging.getLogger(__name__)
+
+NOT_FOUND_ID = -99999
+
+# Output terstruktur Gemini: jawaban langsung JSON/enum, tanpa fence ```json
+JSON_OUTPUT = genai.GenerationConfig(response_mime_type="application/json")
+
+
+def enum_output(candidates: list) -> genai.GenerationConfig:
+    """Jawaban dibatasi ke salah satu id kandidat, atau NOT_FOUND_ID."""
+    ids = list(dict.fromkeys(str(c["id"]) for c in candidates))
+    return genai.GenerationConfig(
+        response_mime_type="text/x.enum",
+        response_schema={"type": "string", "enum": ids + [str(NOT_FOUND_ID)]},
+    )
+
+
+def id_map_output(n_queries: int) -> genai.GenerationConfig:
+    """Jawaban batch berupa objek {query_id: id} dengan semua query_id wajib ada."""
+    keys = [str(i) for i in range(n_queries)]
+    return genai.GenerationConfig(
+        response_mime_type="application/json",
+        response_schema={
+            "type": "object",
+            "properties": {key: {"type": "integer"} for key in keys},
+            "required": keys,
+        },
+    )
+
+
+def clean_llm_json_output(text: str):
+    # Dengan JSON_OUTPUT jawaban Gemini sudah JSON murni
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+
+    # Hilangkan ```json ... ```
+    cleaned = re.sub(
+        r"^```json\s*|\s*```$", "", text.strip(), flags=re.IGNORECASE | re.MULTILINE
+    )
+
+    # Parsing ke dict
+    try:
+        return json.loads(cleaned)
+    except json.JSONDecodeError as e:
+        print("[ERROR] Gagal parse JSON:", e)
+        return None
+
+
+class LLMBackend(ABC):
+    """
+    Antarmuka LLM yang dipakai AgentBabe. Setiap method menerima prompt sistem
+    dari task_instructions dan mengembalikan hasil yang sudah di-parse, jadi
+    AgentBabe tidak bergantung ke SDK tertentu. Backend yang belum mengimplementasi
+    semua method gagal saat dibuat, bukan di tengah order.
+    """
+
+    @abstractmethod
+    def select_id(self, query: str, candidates: list, task_instruction: str):
+        """Returns id kandidat terpilih, NOT_FOUND_ID, atau None kalau gagal."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def select_ids(self, payload: list, system_instruction: str):
+        """
+        payload sesuai batch_selection_prompt: [{query_id, query, aturan, kandidat}].
+
+        Returns:
+        - dict {query_id: id}, atau None kalau gagal
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def reconfirm(self, message: str, system_instruction: str):
+        """Returns dict hasil parse pesan reconfirm, atau None kalau gagal."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def notes(self, message: str, system_instruction: str) -> str:
+        raise NotImplementedError
+
+
+class GeminiBackend(LLMBackend):
+    """Backend produksi di atas google.generativeai, dengan model dari GeminiModelPool."""
+
+    def __init__(self, models: GeminiModelPool):
+        self.models = models
+
+    def select_id(self, query: str, candidates: list, task_instruction: str):
+        LLM = self.models.get(task_instruction)
+        idx = LLM.generate_content(
+            f"Query: {query}, List: {candidates}",
+            generation_config=enum_output(candidates),
+        )
+
+        try:
+            return int(idx.text)
+        except ValueError:
+            print("[ERROR] Gagal mendapatkan indeks dari Gemini:", idx.text)
+            return None
+
+    def select_ids(self, payload: list, system_instruction: str):
+        LLM = self.models.get(system_instruction)
+        answer = LLM.generate_content(
+            json.dumps(payload, ensure_ascii=False, default=str),
+            generation_config=id_map_output(len(payload)),
+        )
+        return clean_llm_json_output(answer.text)
+
+    def reconfirm(self, message: str, system_instruction: str):
+        model = self.models.get(system_instruction)
+        gemini_ans = model.generate_content(message, generation_config=JSON_OUTPUT)
+        return clean_llm_json_output(gemini_ans.text)
+
+    def notes(self, message: str, system_instruction: str) -> str:
+        notes = self.models.get(system_instruction).generate_content(message)
+        return getattr(notes, "text", "") or ""
+
+
+class LocalBackend(LLMBackend):
+    """
+    Pengganti LLM yang deterministik dan tanpa jaringan, untuk load test dan
+    benchmark handle_order tanpa memakai kuota Gemini.
+
+    Pemilihan id mengambil kandidat BM25 teratas, reconfirm memakai
+    reconfirm_parser (apa pun confidence-nya), dan notes disusun dari hasil parse.
+    Setiap panggilan ditahan latency detik (+ jitter acak dengan seed tetap) untuk
+    meniru waktu tunggu LLM. Jumlah panggilan per jenis dicatat di self.calls, dan
+    juga di StageTimer yang aktif supaya bisa dihitung per order.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = Counter()
+
+    def _wait(self, kind: str):
+        with self._lock:
+            self.calls[kind] += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+        count(kind)
+        if delay > 0:
+            time.sleep(delay)
+
+    def select_id(self, query: str, candidates: list, task_instruction: str):
+        self._wait("select_id")
+        return candidates[0]["id"] if candidates else NOT_FOUND_ID
+
+    def select_ids(self, payload: list, system_instruction: str):
+        self._wait("select_ids")
+        return {
+            q["query_id"]: q["kandidat"][0]["id"] if q["kandidat"] else NOT_FOUND_ID
+            for q in payload
+        }
+
+    def reconfirm(self, message: str, system_instruction: str):
+        self._wait("reconfirm")
+        parsed, _, issues = parse_reconfirm(message)
+        if parsed is None:
+            return {"fallback": f"Format pesan tidak sesuai: {', '.join(issues)}"}
+        return parsed
+
+    def notes(self, message: str, system_instruction: str) -> str:
+        self._wait("notes")
+        parsed, _, _ = parse_reconfirm(message)
+        return build_notes_text(parsed) if parsed else ""
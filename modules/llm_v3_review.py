@@ -1,13 +1,17 @@
-from rank_bm25 import BM25Okapi
-from nltk.tokenize import word_tokenize
 import nltk
-import google.generativeai as genai
 import re
 import json
 import pandas as pd
 import os
 import requests
 import ast
+import asyncio
+import atexit
+import contextvars
+import copy
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from modules.crud_utility import (
     add_prod_to_order,
     update_payment,
@@ -31,14 +35,25 @@ from modules.maps_utility import (
     get_fastest_route_details,
     address_to_latlng,
     distance_cost_rule,
-    is_free_delivery,
     estimasi_tiba,
 )
 from datetime import datetime, timedelta
 import logging
 from typing import Optional, Tuple, Dict, Any
-import time
-from collections import defaultdict
+from collections import Counter, defaultdict
+from cachetools import TTLCache
+from modules.catalog_index import BM25Index, normalize_name, route_combo_query
+from modules.catalog_store import CatalogStore
+from modules.persistent_cache import PersistentCache
+from modules.geo_cache import GeoCache, normalize_shortlink
+from modules.distance_estimator import DetourEstimator
+from modules.free_area_index import FreeAreaIndex
+from modules.model_pool import GeminiModelPool
+from modules.llm_backend import GeminiBackend, LLMBackend, clean_llm_json_output
+from modules.reconfirm_parser import build_notes_text, extract_address_link, parse_reconfirm
+from modules.crud_utility_async import AsyncOlseraClient
+from modules.stage_timer import stage, timed
+import modules.crud_utility_async as acrud
 
 nltk.download("punkt")
 nltk.download("punkt_tab")
@@ -86,6 +101,9 @@ with open("./modules/prompts/prize_selection_prompt.txt", "r") as file:
 with open("./modules/prompts/notes_prompt.txt", "r") as file:
     notes_prompt = file.read()
 
+with open("./modules/prompts/batch_selection_prompt.txt", "r") as file:
+    batch_selection_prompt = file.read()
+
 task_instructions = {
     "reconfirm_translator_prompt": reconfirm_translator_prompt,
     "item_selection_prompt": item_selection_prompt,
@@ -98,6 +116,7 @@ task_instructions = {
     "delivery_selection_prompt": delivery_selection_prompt,
     "hadiah_selection_prompt": hadiah_selection_prompt,
     "notes_prompt": notes_prompt,
+    "batch_selection_prompt": batch_selection_prompt,
 }
 
 def detect_keywords(text):
@@ -112,158 +131,425 @@ class AgentBabe:
         df_combo_dir: str = "./product_combos_v2.csv",
         top_k_retrieve: int = 5,
         gmap_api_key: Optional[str] = None,
+        max_concurrency: int = 4,
+        batch_selection: bool = True,
+        selection_cache_path: Optional[str] = "./storage/app/selection_cache.sqlite3",
+        selection_cache_ttl: float = 3 * 24 * 3600,
+        reconfirm_cache_size: int = 256,
+        reconfirm_cache_ttl: float = 15 * 60,
+        fast_parse_threshold: Optional[float] = 0.8,
+        context_cache_prompts: tuple = ("reconfirm_translator_prompt",),
+        context_cache_ttl: float = 3600,
+        llm_backend: Optional[LLMBackend] = None,
+        geo_cache_path: Optional[str] = "./storage/app/geo_cache.sqlite3",
+        geo_cache_ttl: float = 30 * 24 * 3600,
+        geo_cache_report_every: int = 50,
+        offline_distance: bool = True,
+        free_area_path: str = "./free_delivery_areas.geojson",
+        order_log_dir: Optional[str] = "log",
     ):
         self.instructions = instructions
         self.df_product_dir = df_product_dir
         self.df_combo_dir = df_combo_dir
         self.top_k_retrieve = top_k_retrieve
         self.gmap_api_key = gmap_api_key
+        # Batas langkah yang berjalan bersamaan per order (thread pool baris pesanan
+        # di handle_order, semaphore di handle_order_async)
+        self.max_concurrency = max_concurrency
+        # Pilih id semua baris pesanan dengan satu panggilan Gemini
+        self.batch_selection = batch_selection
+        self.selection_stats = Counter()
+        self._selection_lock = threading.Lock()
+        # Memo hasil pilihan LLM: query yang sama tidak perlu ditanyakan ulang
+        self.selection_cache = (
+            PersistentCache(
+                selection_cache_path,
+                namespace="selection",
+                max_entries=5000,
+                ttl=selection_cache_ttl,
+            )
+            if selection_cache_path
+            else None
+        )
+        # Cache redirect shortlink dan geocode, untuk pelanggan yang kirim alamat sama
+        self.geo_cache = GeoCache(geo_cache_path, ttl=geo_cache_ttl) if geo_cache_path else None
+        # Cache hasil parse pesan reconfirm, untuk pesan yang dikirim ulang
+        self.reconfirm_cache = TTLCache(maxsize=reconfirm_cache_size, ttl=reconfirm_cache_ttl)
+        self.reconfirm_cache_stats = Counter()
+        self._reconfirm_lock = threading.Lock()
+        # Pesan reconfirm yang rapi di-parse dengan aturan (reconfirm_parser) kalau
+        # confidence-nya minimal segini; None = selalu pakai Gemini
+        self.fast_parse_threshold = fast_parse_threshold
+        # Folder order.log yang dibaca void_order.py; None = order tidak dicatat
+        self.order_log_dir = order_log_dir
+        # Notes dibuat di background bersamaan dengan reconfirm_translator, karena
+        # notes_prompt cukup membaca pesan aslinya
+        self._notes_executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="notes"
+        )
+        # Link Maps di pesan mentah di-resolve bersamaan dengan reconfirm_translator
+        self._address_executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="address"
+        )
         self.model_name = {
             "flash": "gemini-2.5-flash",
             "pro": "gemini-2.5-pro",
         }
+        # Default Gemini. GenerativeModel dibuat sekali per system prompt lalu dipakai
+        # ulang; prompt di context_cache_prompts disimpan di server (context caching).
+        # LocalBackend bisa dipakai untuk load test tanpa jaringan.
+        if llm_backend is None:
+            models = GeminiModelPool(
+                self.model_name,
+                cached_instructions=[instructions[key] for key in context_cache_prompts],
+                cache_ttl=context_cache_ttl,
+            )
+            models.warm(instructions.values())
+            llm_backend = GeminiBackend(models)
+        self.llm = llm_backend
         self.longlat_toko = (-7.560745951139057, 110.8493297202405)
-        self.free_areas = [
-            "Gedongan",
-            "Gedangan",
-            "Gentan",
-            "Kadilangu",
-            "Kudu",
-            "Kwarasan",
-            "Langenharjo",
-            "Madegondo",
-            "Gonilan",
-            "Gumpang",
-            "Pabelan",
-            "Blulukan",
-            "Karangasem",
-            "Baturan",
-            "Gajahan",
-            "Paulan",
-        ]
+        # Estimasi jarak offline, dikalibrasi dari hasil Distance Matrix di geo_cache
+        self.distance_estimator = (
+            DetourEstimator.from_geo_cache(self.geo_cache, self.longlat_toko)
+            if offline_distance
+            else None
+        )
+        self.distance_stats = Counter()
+        self._distance_lock = threading.Lock()
+        # Statistik cache Maps dicatat ke log tiap N alamat dan saat proses berhenti
+        self.geo_cache_report_every = geo_cache_report_every
+        self._address_lookups = 0
+        atexit.register(self._log_geo_cache_report)
+        # Area subsidi ongkir (GeoJSON per kelurahan, polygon opsional)
+        self.free_area_index = FreeAreaIndex.from_geojson(free_area_path)
+        self.free_areas = self.free_area_index.names
+        self.catalog = CatalogStore(df_product_dir, df_combo_dir)
     
     def clean_llm_json_output(self, text: str) -> dict:
-        # Hilangkan ```json ... ```
-        cleaned = re.sub(
-            r"^```json\s*|\s*```$", "", text.strip(), flags=re.IGNORECASE | re.MULTILINE
-        )
+        return clean_llm_json_output(text)
 
-        # Parsing ke dict
-        try:
-            return json.loads(cleaned)
-        except json.JSONDecodeError as e:
-            print("[ERROR] Gagal parse JSON:", e)
-            return None
-    
     def select_id_by_agent(
         self,
         query: str,
-        df: pd.DataFrame,
+        index,
         task_instruction: str,
         id_col: str = "id",
         evaluation_col: str = "name",
     ):
-        tokenized_corpus = [word_tokenize(prod.lower()) for prod in df[evaluation_col]]
-        bm25 = BM25Okapi(tokenized_corpus)
-        tokenized_query = word_tokenize(query.lower())
-        sim_score = bm25.get_scores(tokenized_query)
-        df["bm25_score"] = sim_score
-
-        sim_score_table = df.sort_values(by="bm25_score", ascending=False)[
-            : self.top_k_retrieve
+        # DataFrame masih diterima untuk pemanggil lama, tapi index-nya dibangun ad-hoc
+        if isinstance(index, pd.DataFrame):
+            index = BM25Index(index, id_col=id_col, evaluation_col=evaluation_col)
+
+        sim_score_table = index.top_k(query, self.top_k_retrieve)
+        return self.llm.select_id(query, sim_score_table, task_instruction)
+    
+    def select_ids_by_agent_batch(self, queries: list) -> list:
+        """
+        Pilih id untuk beberapa query sekaligus dalam satu panggilan Gemini.
+
+        queries berisi (query, index, task_instruction). Semua query beserta kandidat
+        top-k masing-masing dikirim dalam satu request, dan jawabannya berupa JSON
+        {query_id: id}. Query yang jawabannya tidak bisa di-parse dipilih ulang satu
+        per satu lewat select_id_by_agent.
+
+        Returns:
+        - list id sesuai urutan queries (None kalau gagal dipilih)
+        """
+        if len(queries) <= 1 or not self.batch_selection:
+            return self._select_ids_per_query(queries)
+
+        # Aturan pemilihan tiap kategori (item, paket, merch, ...) cukup ditulis sekali.
+        # Diurutkan supaya kombinasi kategori yang sama selalu jadi prompt (dan model
+        # di GeminiModelPool) yang sama, apa pun urutan baris pesanannya
+        rules = sorted({task_instruction for _, _, task_instruction in queries})
+
+        payload = [
+            {
+                "query_id": str(i),
+                "query": query,
+                "aturan": rules.index(task_instruction) + 1,
+                "kandidat": index.top_k(query, self.top_k_retrieve),
+            }
+            for i, (query, index, task_instruction) in enumerate(queries)
         ]
-        sim_score_table = sim_score_table[[id_col, evaluation_col]].to_dict(
-            orient="records"
+        system_instruction = self.instructions["batch_selection_prompt"] + "".join(
+            f"\n\nATURAN {n}:\n{rule}" for n, rule in enumerate(rules, start=1)
         )
 
-        LLM = genai.GenerativeModel(
-            model_name=self.model_name["flash"],
-            system_instruction=task_instruction,
+        ids = [None] * len(queries)
+        try:
+            parsed = self.llm.select_ids(payload, system_instruction)
+        except Exception as e:
+            logger.error("Gagal memilih id secara batch: %s", e)
+            parsed = None
+
+        retry = []
+        for i in range(len(queries)):
+            try:
+                ids[i] = int(parsed[str(i)])
+            except (TypeError, KeyError, ValueError):
+                retry.append(i)
+
+        if retry:
+            print(f"[WARNING] Jawaban batch tidak valid untuk {len(retry)} query, dipilih ulang satu per satu.")
+            for i, idx in zip(retry, self._select_ids_per_query([queries[i] for i in retry])):
+                ids[i] = idx
+        return ids
+
+    def _select_ids_per_query(self, queries: list) -> list:
+        if len(queries) <= 1:
+            return [self.select_id_by_agent(*q) for q in queries]
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, self.select_id_by_agent, *q)
+                for q in queries
+            ]
+            return [future.result() for future in futures]
+
+    def _selection_plan(self, catalog, tipe: str, nama_produk: str, use_llm: bool = True) -> dict:
+        """
+        Tentukan cara memilih id untuk satu baris pesanan. Dengan use_llm=False
+        (produk tetap seperti ongkir dan merch) id hanya dicari lewat match katalog.
+
+        Returns:
+        - {"index", "task_instruction"} kalau id perlu dipilih LLM, {"id", "via"} kalau
+          id sudah pasti tanpa LLM, atau {"error"} kalau tidak ada kandidat
+        """
+        if tipe == "item":
+            index = catalog.indexes["item"]
+            task_instruction = self.instructions["item_selection_prompt"]
+        else:
+            # Sederhanakan pencarian paket dengan subset index
+            subset, prompt_key = route_combo_query(nama_produk)
+            index = catalog.indexes[subset]
+            task_instruction = self.instructions[prompt_key]
+            if len(index) == 0:
+                logger.error("Tidak ada paket matching untuk: %s", nama_produk)
+                # Dict seperti error paket lain; pemanggil membaca response["success"],
+                # jadi string (versi lama) membuat handle_order TypeError
+                return {
+                    "error": {
+                        "success" : False,
+                        "msg" : f"Gagal menemukan paket: {nama_produk}",
+                    }
+                }
+            if len(index) == 1:
+                return {"id": index.ids[0], "via": "single"}
+
+        idx, via = index.fast_match(nama_produk)
+        if idx is not None:
+            return {"id": idx, "via": via}
+        if not use_llm:
+            logger.error("Produk tetap tidak ada di katalog: %s", nama_produk)
+            return {
+                "error": {
+                    "success" : False,
+                    "msg" : f"Gagal menemukan {nama_produk} di katalog. Cek apakah produk ini masih ada di backoffice Olsera.",
+                }
+            }
+        return {"index": index, "task_instruction": task_instruction}
+
+    def _select_line_ids(self, catalog, lines: list, use_llm: bool = True) -> list:
+        """
+        Pilih id untuk semua baris pesanan (tipe, nama produk, qty). Baris yang cocok
+        pasti dengan katalog langsung dapat id, sisanya dipilih dengan satu panggilan
+        batch. Dengan use_llm=False tidak ada panggilan LLM sama sekali.
+
+        Returns:
+        - list (id, dict error atau None) sesuai urutan lines
+        """
+        print("Mencari id berdasarkan SLM...")
+        plans = [self._selection_plan(catalog, tipe, nama, use_llm) for tipe, nama, _ in lines]
+        pending = [i for i, plan in enumerate(plans) if "index" in plan]
+
+        if self.selection_cache is not None:
+            cached = []
+            for i in pending:
+                key = self._selection_key(lines[i][1], plans[i]["task_instruction"])
+                plans[i]["cache_key"] = key
+                entry = self.selection_cache.get(key)
+                if entry and self._selection_exists(catalog, entry["tipe"], entry["id"]):
+                    plans[i]["id"] = entry["id"]
+                    plans[i]["via"] = "memo"
+                    cached.append(i)
+            pending = [i for i in pending if i not in cached]
+
+        ids = self.select_ids_by_agent_batch(
+            [(lines[i][1], plans[i]["index"], plans[i]["task_instruction"]) for i in pending]
         )
-        idx = LLM.generate_content(f"Query: {query}, List: {sim_score_table}")
+        for i, idx in zip(pending, ids):
+            plans[i]["id"] = idx
+            plans[i]["via"] = "llm"
+            if (
+                self.selection_cache is not None
+                and idx not in (None, -99999)
+                and self._selection_exists(catalog, lines[i][0], idx)
+            ):
+                self.selection_cache.set(
+                    plans[i]["cache_key"],
+                    {"id": idx, "tipe": lines[i][0]},
+                )
 
-        try:
-            idx = int(idx.text)
-            return idx
-        except ValueError:
-            print("[ERROR] Gagal mendapatkan indeks dari Gemini:", idx.text)
+        with self._selection_lock:
+            self.selection_stats.update(plan["via"] for plan in plans if "via" in plan)
+        logger.info("Statistik pemilihan id: %s", self.selection_report())
+        return [(plan.get("id"), plan.get("error")) for plan in plans]
+
+    def _selection_key(self, nama_produk: str, task_instruction: str) -> str:
+        # Versi katalog sengaja tidak ikut di key karena berubah setiap ada perubahan
+        # stok. Memo yang id-nya sudah tidak ada di katalog dibuang lewat _selection_exists
+        prompt_hash = hashlib.sha1(task_instruction.encode("utf-8")).hexdigest()[:12]
+        return f"{prompt_hash}:{normalize_name(nama_produk)}"
+
+    def _selection_exists(self, catalog, tipe: str, idx) -> bool:
+        return idx in (catalog.products if tipe == "item" else catalog.combos)
+
+    def selection_report(self) -> dict:
+        """
+        Ringkasan kumulatif cara id dipilih: exact, bm25, single (subset paket
+        cuma satu), memo (hasil LLM sebelumnya), dan llm. bypass_rate adalah porsi baris yang tidak perlu LLM.
+        """
+        with self._selection_lock:
+            stats = dict(self.selection_stats)
+        total = sum(stats.values())
+        bypassed = total - stats.get("llm", 0)
+        return {**stats, "total": total, "bypass_rate": round(bypassed / total, 3) if total else 0.0}
+
+    def _reconfirm_key(self, message: str) -> str:
+        # Spasi/baris kosong tambahan saat pesan dikirim ulang tidak dianggap beda
+        lines = (" ".join(line.split()) for line in message.strip().splitlines())
+        normalized = "\n".join(line for line in lines if line)
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    def _fast_parse(self, message: str, parse: tuple = None):
+        """
+        Hasil parse_reconfirm kalau cukup yakin, selain itu None. parse adalah hasil
+        parse_reconfirm(message) yang sudah ada, supaya pesan tidak di-parse ulang.
+        """
+        if self.fast_parse_threshold is None:
             return None
-    
-    def reconfirm_translator(self, message):
-        model = genai.GenerativeModel(
-            model_name=self.model_name["flash"],
-            system_instruction=self.instructions["reconfirm_translator_prompt"],
-        )
+        parsed, confidence, issues = parse if parse is not None else parse_reconfirm(message)
+        if parsed is None or confidence < self.fast_parse_threshold:
+            logger.info("Reconfirm diserahkan ke Gemini (confidence %.2f): %s", confidence, issues)
+            return None
+        return parsed
+
+    def reconfirm_translator(self, message, parse: tuple = None):
+        """
+        Parse pesan RECONFIRM JAJAN jadi JSON pesanan. Pesan yang formatnya rapi
+        di-parse dengan aturan tanpa Gemini (parse: hasil parse_reconfirm yang sudah
+        ada, lihat _fast_parse). Hasil parse Gemini disimpan sebentar di
+        self.reconfirm_cache, jadi pesan yang dikirim ulang tidak perlu di-parse
+        Gemini lagi. Yang dikembalikan selalu salinan, karena handle_order mengubah
+        isi JSON-nya.
+        """
+        parsed = self._fast_parse(message, parse)
+        if parsed is not None:
+            with self._reconfirm_lock:
+                self.reconfirm_cache_stats["rules"] += 1
+            # Hasil parse yang sama juga dibaca notes dan prefetch alamat
+            return copy.deepcopy(parsed)
+
+        key = self._reconfirm_key(message)
+        with self._reconfirm_lock:
+            cached = self.reconfirm_cache.get(key)
+            self.reconfirm_cache_stats["hit" if cached is not None else "miss"] += 1
+        if cached is not None:
+            logger.info("Reconfirm diambil dari cache: %s", self.reconfirm_cache_report())
+            return copy.deepcopy(cached)
 
-        gemini_ans = model.generate_content(message)
         try:
-            sanitized_response = self.clean_llm_json_output(gemini_ans.text)
+            sanitized_response = self.llm.reconfirm(
+                message, self.instructions["reconfirm_translator_prompt"]
+            )
         except Exception as e:
-            logger.error("Gagal membersihkan output JSON dari Gemini: %s", e)
+            logger.error("Gagal membersihkan output JSON dari LLM: %s", e)
+            sanitized_response = None
+
+        if not isinstance(sanitized_response, dict):
             return {
                 "fallback": "Ada kesalahan dalam mem-parsing output dari AI. Silakan coba lagi dan pastikan formatnya sesuai."
             }
 
+        if not sanitized_response.get("fallback"):
+            with self._reconfirm_lock:
+                self.reconfirm_cache[key] = copy.deepcopy(sanitized_response)
         return sanitized_response
 
-    def _process_item(
-        self,
-        order_id: str,
-        nama_produk: str,
-        qty: int,
-        cart: list,
-        access_token: str,
-    ):
-        ############### 1. Baca database produk satuan ###############
-        product_df = pd.read_csv(self.df_product_dir)
-        df = product_df[product_df["pos_hidden"] == 0]
+    def geo_cache_report(self) -> dict:
+        """
+        Hit/miss GeoCache per jenis (shortlink, place, address, distance) beserta waktu
+        API yang dihemat, ditambah sumber jarak tempuh (api, estimated, fallback).
+        """
+        report = self.geo_cache.report() if self.geo_cache is not None else {}
+        with self._distance_lock:
+            report["distance_source"] = dict(self.distance_stats)
+        return report
+
+    def _log_geo_cache_report(self):
+        logger.info("Statistik cache Maps: %s", self.geo_cache_report())
+
+    def reconfirm_cache_report(self) -> dict:
+        with self._reconfirm_lock:
+            hits = self.reconfirm_cache_stats["hit"]
+            misses = self.reconfirm_cache_stats["miss"]
+            rules = self.reconfirm_cache_stats["rules"]
+            size = len(self.reconfirm_cache)
+        total = hits + misses
+        return {
+            "rules": rules,
+            "hit": hits,
+            "miss": misses,
+            "size": size,
+            "hit_rate": round(hits / total, 3) if total else 0.0,
+        }
 
-        ############### 2. Cari ID menggunakan SLM ###############
-        print("Mencari id berdasarkan SLM...")
-        idx = self.select_id_by_agent(
-            nama_produk,
-            df,
-            self.instructions["item_selection_prompt"],
-            id_col="id",
-            evaluation_col="name",
-        )
+    def _resolve_item_id(self, catalog, nama_produk: str, idx):
+        """
+        Validasi id produk satuan yang dipilih untuk nama_produk.
+
+        Returns:
+        - (id produk, None) kalau valid, atau (id/None, dict error) kalau gagal
+        """
         print("ID yang ditemukan:", idx)
         if idx is None or idx == -99999:    
             print("Gagal menemukan produk item:", nama_produk)
             logger.error("Gagal menemukan produk item: %s", nama_produk)
-            update_status(order_id, "X", access_token=access_token)
-            return {
+            return None, {
                 "success" : False,
                 "msg" : f"Gagal menemukan produk item {nama_produk}, tolong masukkan dengan format <Nama produk> (<QTY> Paket/Item), dan hindari penggunaan singkatan (AI tidak tahu konteks dalam singkatan itu). Sebisa mungkin, sertakan juga brand-nya apa agar menghindari kesalahpahaman AI, misal AM bisa dianggap dari Mix Max Anggur Merah, QRO Anggur Merah, atau Kawa Kawa Anggur Merah, tapi kalau ini tidak dianggap masalah, silakan diabaikan. Jika error ini masih berlangsung, cek backoffice Olsera. Struk di-voidkan",
             }
 
-        ############### 3. Ambil data berdasarkan ID yang dipilih ###############
-        df_sel = df[df["id"] == idx].reset_index(drop=True)
-
-        if df_sel.empty:
+        ############### Pastikan ID ada di katalog ###############
+        if idx not in catalog.products:
             logger.error("Data produk dengan id %s tidak ditemukan dalam df.", idx)
             print("ERROR ID 0 NIH, df_sel nya empty.")
             print("ID yang di retrieve agent: ", idx)
             print("Nama produk yang berusaha di retrieve agent: ", nama_produk)
-            return { 
+            return idx, { 
                 "success" : False,
                 "msg": f"Produk dengan id {idx} tidak ditemukan. Mungkin terjadi perubahan pada database atau item sudah tidak tersedia.",
             }
-        
-        product_id, product_name, item_left_to_pick = idx, nama_produk, qty
 
-        try:
-            item_details = fetch_product_item_details(
-                product_id, access_token=access_token
-            )
-            time.sleep(1)
+        return idx, None
+
+    def _item_cart_lines(self, product_id, nama_produk: str, qty: int, item_details: dict):
+        """
+        Ubah detail produk dari Olsera jadi baris keranjang. Untuk produk bervarian,
+        qty dibagi ke varian yang stoknya masih ada.
+
+        Returns:
+        - (list baris keranjang, None) atau ([], dict error)
+        """
+        product_name, item_left_to_pick = nama_produk, qty
 
+        try:
             if item_details.get("error", None):
                 if item_details["error"]["status_code"] == 429:
                     logger.error(
                         "Rate limit exceeded for item_details ID %s", product_id
                     )
-                    return { 
+                    return [], { 
                         "success" : False,
                         "msg" : f"Produk {product_name} tidak dapat diambil karena mengalami limit dari API Olsera. Coba lagi nanti.",
                     }
@@ -271,7 +557,7 @@ class AgentBabe:
                     logger.error(
                         "Item not found for item_details ID %s", product_id
                     )
-                    return {
+                    return [], {
                         "success" : False,
                         "msg" : f"Produk {product_name} tidak ditemukan di Olsera. Silakan cek kembali nama produk atau pastikan produk tersebut masih tersedia.",
                     }
@@ -281,7 +567,7 @@ class AgentBabe:
                         product_id,
                         item_details["error"],
                     )
-                    return {
+                    return [], {
                         "success" : False,
                         "msg" : f"Gagal ambil data produk {product_name}. Terjadi error yang tidak diketahui. Errornya: {item_details['error']['message']}",
                     }
@@ -290,410 +576,218 @@ class AgentBabe:
             product_name = data.get("name", product_name)
             if data is None:
                 logger.error("Data item_details kosong untuk ID %s", product_id)
-                return {
+                return [], {
                     "success" : False,
                     "msg" : f"Gagal ambil data produk {product_name}. Terjadi error yang tidak diketahui. Data yang diterima kosong.",
                 }
         except Exception as e:
             logger.error("Gagal fetch item_details ID %s: %s", product_id, e)
-            return {
+            return [], {
                 "success" : False,
                 "msg" : f"Gagal ambil data produk {product_name}. Terjadi error yang tidak diketahui. Errornya: {e}",
             }
 
         if not data.get("variant"):
-            idx = f"{product_id}"
             harga = float(data.get("sell_price_pos", 0))
-
-            cart.append(
+            return [
                 {
                     "type": "product",
                     "prod_id": product_id,
-                    "prodvar_id": idx,
+                    "prodvar_id": f"{product_id}",
                     "name": product_name,
                     "qty": item_left_to_pick,
                     "price": harga,
                     "disc": 0,
                 }
+            ], None
+
+        lines = []
+        for var in data.get("variant", []):
+            var_stock = int(float(var.get("stock_qty", 0)))
+            var_hold_qty = int(float(var.get("hold_qty", 0)))
+            print(
+                f"VAR_STOCK {var.get('name'):<45} {product_id}|{var['id']} {var_stock:<15} {var_hold_qty:<15}"
             )
-            return { 
-                "success": True,
-                "msg": f"Item {nama_produk} berhasil ditambahkan ke order dengan ID {order_id}.",
-            }
-        
-        else:
-            for var in data.get("variant", []):
-                var_stock = int(float(var.get("stock_qty", 0)))
-                var_hold_qty = int(float(var.get("hold_qty", 0)))
+            if (
+                var_stock <= 0
+                or var.get("name").startswith("X")
+                or var_stock - var_hold_qty <= 0
+            ):
                 print(
-                    f"VAR_STOCK {var.get('name'):<45} {product_id}|{var['id']} {var_stock:<15} {var_hold_qty:<15}"
+                    "Stok varian tidak cukup atau sudah di-hold, lanjut ke varian berikutnya."
                 )
-                if (
-                    var_stock <= 0
-                    or var.get("name").startswith("X")
-                    or var_stock - var_hold_qty <= 0
-                ):
-                    print(
-                        "Stok varian tidak cukup atau sudah di-hold, lanjut ke varian berikutnya."
-                    )
-                    continue
+                continue
 
-                pick_qty = min(item_left_to_pick, var_stock)
-                cart.append(
-                    {
-                        "type": "product",
-                        "prod_id": product_id,
-                        "prodvar_id": f"{product_id}|{var['id']}",
-                        "name": product_name,
-                        "qty": pick_qty,
-                        "price": var.get("sell_price_pos", 0),
-                        "disc": 0,
-                    }
-                )
+            pick_qty = min(item_left_to_pick, var_stock)
+            lines.append(
+                {
+                    "type": "product",
+                    "prod_id": product_id,
+                    "prodvar_id": f"{product_id}|{var['id']}",
+                    "name": product_name,
+                    "qty": pick_qty,
+                    "price": var.get("sell_price_pos", 0),
+                    "disc": 0,
+                }
+            )
 
-                item_left_to_pick -= pick_qty
-                if item_left_to_pick <= 0:
-                    break
+            item_left_to_pick -= pick_qty
+            if item_left_to_pick <= 0:
+                break
 
-            if item_left_to_pick > 0:
-                logger.error(
-                    "Stok tidak cukup untuk produk %s, masih ada %d yang perlu diambil",
-                    product_id,
-                    item_left_to_pick,
-                )
-                return {
-                    "success" : False,
-                    "msg" : f"Maaf, stok tidak cukup untuk {product_name}. Silakan coba lagi dengan jumlah yang lebih sedikit.",
-                }
-            
-            try:
-                print(f"ITEM  {nama_produk:<45} {product_id:<10} {qty:<15} {cart[-1]['disc']:<10}")
-            except Exception as e:
-                return {
-                    "success" : False,
-                    "msg" : f"Terjadi Kesalahan dalam menghandle item: {e}",
-                }
-            
-            return { 
-                "success": True,
-                "msg": f"Item {nama_produk} berhasil ditambahkan ke order dengan ID {order_id}.",
+        if item_left_to_pick > 0:
+            logger.error(
+                "Stok tidak cukup untuk produk %s, masih ada %d yang perlu diambil",
+                product_id,
+                item_left_to_pick,
+            )
+            return [], {
+                "success" : False,
+                "msg" : f"Maaf, stok tidak cukup untuk {product_name}. Silakan coba lagi dengan jumlah yang lebih sedikit.",
             }
-    
-    def _process_combo(
+        
+        try:
+            print(f"ITEM  {nama_produk:<45} {product_id:<10} {qty:<15} {lines[-1]['disc']:<10}")
+        except Exception as e:
+            return [], {
+                "success" : False,
+                "msg" : f"Terjadi Kesalahan dalam menghandle item: {e}",
+            }
+
+        return lines, None
+
+    def _process_item(
         self,
         order_id: str,
-        nama_combo: str,
+        nama_produk: str,
         qty: int,
         cart: list,
         access_token: str,
+        use_llm: bool = True,
     ):
-        ############### 1. Baca database produk combo ###############
-        combo_df = pd.read_csv(self.df_combo_dir)
-        df = combo_df[combo_df["pos_hidden"] == 0]
-        task_instruction = self.instructions["combo_selection_prompt"]
-        lower = nama_combo.strip().lower()
-
-        ############### 2. Sederhanakan pencarian dengan filtering ###############
-        if lower.startswith(("merch", "mer")):
-            mask = df["name"].str.lower().str.contains("merch|merh")
-            df = df[mask]
-            task_instruction = self.instructions["merch_selection_prompt"]
-        elif lower.startswith(("babe garansiin", "garansi", "garan")):
-            df = df[df["name"] == "Babe Garansi-in !!!"]
-            task_instruction = self.instructions["garansi_selection_prompt"]
-        elif "kupon" in lower:
-            df = df[df["name"].str.lower().str.contains("kupon")]
-            task_instruction = self.instructions["coupon_selection_prompt"]
-        elif "voucher" in lower:
-            df = df[df["name"].str.lower().str.contains("voucher")]
-            task_instruction = self.instructions["voucher_selection_prompt"]
-        elif lower.startswith(("komplimen", "komp")):
-            df = df[df["name"].str.lower().str.startswith(("komplimen", "komp"))]
-            task_instruction = self.instructions["compliment_selection_prompt"]
-        elif "delivery" in lower:
-            df = df[df["name"].str.lower().str.contains("delivery")]
-            task_instruction = self.instructions["delivery_selection_prompt"]
-        elif lower.startswith("hadiah"):
-            df = df[df["name"].str.lower().str.startswith("hadiah")]
-            task_instruction = self.instructions["prize_selection_prompt"]
-
-        ############### 3. Cari ID menggunakan SLM ###############
-
-        if df.empty:
-            logger.error("Tidak ada paket matching untuk: %s", nama_combo)
-            return f"Gagal menemukan paket: {nama_combo}"
-        # if len(df) == 1:
-        #     combo_id = df["id"].iloc[0]
-        # else:
-        #     combo_id = self.select_id_by_agent(
-        #         nama_combo, df, task_instruction, id_col="id", evaluation_col="name"
-        #     )
+        ############### 1. Ambil snapshot katalog produk satuan ###############
+        catalog = self.catalog.current()
 
-        combo_id = df["id"].iloc[0] if len(df) == 1 else self.select_id_by_agent(
-            nama_combo,df,task_instruction,id_col="id",evaluation_col="name"
-        )
-        
+        ############### 2. Cari ID menggunakan SLM ###############
+        [(idx, _)] = self._select_line_ids(catalog, [("item", nama_produk, qty)], use_llm)
+        product_id, error = self._resolve_item_id(catalog, nama_produk, idx)
+        if error:
+            if product_id is None:
+                update_status(order_id, "X", access_token=access_token)
+            return error
+
+        ############### 3. Ambil detail produk dan masukkan ke keranjang ###############
+        try:
+            item_details = fetch_product_item_details(
+                product_id, access_token=access_token
+            )
+        except Exception as e:
+            logger.error("Gagal fetch item_details ID %s: %s", product_id, e)
+            return {
+                "success" : False,
+                "msg" : f"Gagal ambil data produk {nama_produk}. Terjadi error yang tidak diketahui. Errornya: {e}",
+            }
+
+        lines, error = self._item_cart_lines(product_id, nama_produk, qty, item_details)
+        if error:
+            return error
+
+        cart.extend(lines)
+        return { 
+            "success": True,
+            "msg": f"Item {nama_produk} berhasil ditambahkan ke order dengan ID {order_id}.",
+        }
+    
+    def _resolve_combo(self, catalog, nama_combo: str, combo_id):
+        """
+        Validasi id paket yang dipilih untuk nama_combo.
+
+        Returns:
+        - (id paket, data paket, None) kalau valid, atau (id/None, None, dict error)
+        """
         if combo_id is None:
             logger.error("select_id_by_agent gagal untuk paket: %s", combo_id)
-            return {
+            return None, None, {
                 "success" : False,
                 "msg" : f"Gagal menemukan paket: {combo_id}, mohon coba lagi.",
             }
         
         if combo_id == -99999:
             logger.error("Tidak ada paket yang sesuai dengan nama: %s", nama_combo)
-            update_status(order_id, "X", access_token=access_token)
-            return {
+            return combo_id, None, {
                 "success" : False,
                 "msg" : f"AI gagal menemukan paket yang sesuai: {nama_combo}, ini disebabkan karena AI tidak yakin dengan kecocokan antara nama yang dimasukkan dengan hasil pencarian yang ditemukan (untuk menghindari pengambilan asal). Untuk itu, mohon masukkan dengan format <Nama produk> (<QTY> Paket/Item), dan hindari penggunaan singkatan (AI tidak tahu konteks dalam singkatan itu). Sebisa mungkin, sertakan juga brand-nya apa agar menghindari kesalahpahaman AI, misal AM bisa dianggap dari Mix Max Anggur Merah, QRO Anggur Merah, atau Kawa Kawa Anggur Merah, tapi kalau ini tidak dianggap masalah, silakan diabaikan. CONTOH: 2 Atlas Lychee + 2 Beer (1 Paket). Jika error ini masih berlangsung, cek backoffice Olsera. Struk di-voidkan."
             }
 
+        combo = catalog.combos.get(combo_id)
+        if combo is None:
+            logger.error("Data paket dengan id %s tidak ditemukan dalam katalog.", combo_id)
+            return combo_id, None, {
+                "success" : False,
+                "msg" : f"Paket dengan id {combo_id} tidak ditemukan. Mungkin terjadi perubahan pada database atau paket sudah tidak tersedia.",
+            }
 
+        return combo_id, combo, None
 
-        ############### 4. Masukkan ke keranjang ###############
-        price = int(float(combo_df[combo_df["id"] == combo_id]["sell_price_pos"].values))
-        items_raw = combo_df.loc[combo_df["id"] == combo_id, "items"].iloc[0]
-        if isinstance(items_raw, str):
-            try:
-                items = ast.literal_eval(items_raw) if isinstance(items_raw, str) else items_raw
-            except json.JSONDecodeError:
-                print(f"[ERROR] Gagal parse items: {e}")
-                items = []
-        else:
-            items = items_raw
-        cart.append(
-            {
-                "type": "combo_new",
-                "prod_id": combo_id,
-                "prodvar_id": "UNIQUE",
-                "name": nama_combo,
-                "qty": qty,
-                "price": price,
-                "disc": 0,
-                "items" : items,
-            }
-        )
+    def _combo_cart_line(self, combo_id, combo: dict, nama_combo: str, qty: int):
+        """
+        Returns:
+        - (baris keranjang paket, None) atau (None, dict error)
+        """
+        line = {
+            "type": "combo_new",
+            "prod_id": combo_id,
+            "prodvar_id": "UNIQUE",
+            "name": nama_combo,
+            "qty": qty,
+            "price": int(float(combo["sell_price_pos"])),
+            "disc": 0,
+            "items" : combo["items"],
+        }
 
         try:
-            print(f"PAKET  {nama_combo:<45} {combo_id:<10} {qty:<15} {cart[-1]['disc']:<10}")
+            print(f"PAKET  {nama_combo:<45} {combo_id:<10} {qty:<15} {line['disc']:<10}")
         except Exception as e:
             print(msg:=f"Terjadi Kesalahan dalam menghandle paket:{e}")
-            # return False,msg
-            return {
+            return None, {
                 "success" : False,
                 "msg" : msg,
             }
 
-        return { 
-            "success": True,
-            "msg": f"Paket {nama_combo} berhasil ditambahkan ke order dengan ID {order_id}.",
-        }
+        return line, None
 
-    def _process_combo_old(
+    def _process_combo(
         self,
         order_id: str,
         nama_combo: str,
-        qty_pesan: int,
+        qty: int,
         cart: list,
-        access_token: str,     
+        access_token: str,
+        use_llm: bool = True,
     ):
-        ############### 1. Baca database produk combo ###############
-        combo_df = pd.read_csv(self.df_combo_dir)
-        df = combo_df[combo_df["pos_hidden"] == 0]
-        task_instruction = self.instructions["combo_selection_prompt"]
-        lower = nama_combo.strip().lower()
-
-        ############### 2. Sederhanakan pencarian dengan filtering ###############
-        if lower.startswith(("merch", "mer")):
-            mask = df["name"].str.lower().str.contains("merch|merh")
-            df = df[mask]
-            task_instruction = self.instructions["merch_selection_prompt"]
-        elif lower.startswith(("babe garansiin", "garansi", "garan")):
-            df = df[df["name"] == "Babe Garansi-in !!!"]
-            task_instruction = self.instructions["guarantee_selection_prompt"]
-        elif "kupon" in lower:
-            df = df[df["name"].str.lower().str.contains("kupon")]
-            task_instruction = self.instructions["coupon_selection_prompt"]
-        elif "voucher" in lower:
-            df = df[df["name"].str.lower().str.contains("voucher")]
-            task_instruction = self.instructions["voucher_selection_prompt"]
-        elif lower.startswith(("komplimen", "komp")):
-            df = df[df["name"].str.lower().str.startswith(("komplimen", "komp"))]
-            task_instruction = self.instructions["compliment_selection_prompt"]
-        elif "delivery" in lower:
-            df = df[df["name"].str.lower().str.contains("delivery")]
-            task_instruction = self.instructions["delivery_selection_prompt"]
-        elif lower.startswith("hadiah"):
-            df = df[df["name"].str.lower().str.startswith("hadiah")]
-            task_instruction = self.instructions["prize_selection_prompt"]
-
-        ############### 3. Cari ID menggunakan SLM ############### 
-
-        if df.empty:
-            logger.error("Tidak ada paket matching untuk: %s", nama_combo)
-            return f"Gagal menemukan paket: {nama_combo}"
-        if len(df) == 1:
-            combo_id = df["id"].iloc[0]
-        else:
-            combo_id = self.select_id_by_agent(
-                nama_combo, df, task_instruction, id_col="id", evaluation_col="name"
-            )
-        
-        if combo_id is None:
-            logger.error("select_id_by_agent gagal untuk paket: %s", combo_id)
-            return f"Gagal menemukan paket: {combo_id}"
-        
-        if combo_id == -99999:
-            logger.error("Tidak ada paket yang sesuai dengan nama: %s", nama_combo)
-            update_status(order_id, "X", access_token=access_token)
-            return f"AI gagal menemukan paket yang sesuai: {nama_combo}, ini disebabkan karena AI tidak yakin dengan kecocokan antara nama yang dimasukkan dengan hasil pencarian yang ditemukan (untuk menghindari pengambilan asal). Untuk itu, mohon masukkan dengan format <Nama produk> (<QTY> Paket/Item), dan hindari penggunaan singkatan (AI tidak tahu konteks dalam singkatan itu). Sebisa mungkin, sertakan juga brand-nya apa agar menghindari kesalahpahaman AI, misal AM bisa dianggap dari Mix Max Anggur Merah, QRO Anggur Merah, atau Kawa Kawa Anggur Merah, tapi kalau ini tidak dianggap masalah, silakan diabaikan. CONTOH: 2 Atlas Lychee + 2 Beer (1 Paket). Jika error ini masih berlangsung, cek backoffice Olsera. Struk di-voidkan."
-        
-        ############### 4. Ambil detail combo dari API Olsera ###############
-        try:
-            combo_details = fetch_product_combo_details(combo_id, access_token)
-            combo_items = combo_details["data"]["items"]["data"]
-        except Exception as e:
-            logger.error("Gagal fetch combo details untuk %s: %s", combo_id, e)
-            return "Gagal ambil detail paket."
-        try:
-            print(f"PAKET  {combo_details['data']['name']:<45} {combo_details['data']['id']:<10} {qty_pesan:<15}")
-        except Exception as e:
-            pass
-
-        ############### 5. Masukkan ke keranjang ###############
-        # Hitung total harga normal untuk diskon
-        total_harga_normal = 0.0
-
-        count_item = 0
-        # Tambah tiap item
-        for item in combo_items:
-            # 1. Deklarasi product ID, variant ID, dan qty_total
-            product_id = item.get("product_id")
-            var_id = item.get("product_variant_id")
-            item_left_to_pick = item.get("qty", 0) * qty_pesan
-
-            # 2. Fetch detail item untuk cek stok per varian dan harga
-            try:
-                item_details = fetch_product_item_details(
-                    product_id, access_token=access_token
-                )
-                time.sleep(1)
-                if item_details.get("error", None):
-                    if item_details["error"]["status_code"] == 429:
-                        logger.error(
-                            "Rate limit exceeded for item_details ID %s", product_id
-                        )
-                        return f"Agent mengalami limit dari API Olsera"
-                    elif item_details["error"]["status_code"] == 404:
-                        logger.error(
-                            "Item not found for item_details ID %s", product_id
-                        )
-                        return f"Produk {item.get('product_name')} tidak ditemukan di Olsera. Silakan cek kembali nama produk atau pastikan produk tersebut masih tersedia."
-                    else:
-                        logger.error(
-                            "Error fetching item_details ID %s: %s",
-                            product_id,
-                            item_details["error"],
-                        )
-                        return f"Gagal ambil data produk {item.get('product_name')}. Terjadi error yang tidak diketahui. Errornya: {item_details['error']['message']}"
-
-                data = item_details.get("data", None)
-                if data is None:
-                    logger.error("Data item_details kosong untuk ID %s", product_id)
-                    return f"Gagal ambil data produk {item.get('product_name')} dari paket {combo_details['data']['name']}. Berdasarkan API Olsera, produk ini tidak ditemukan. Anda bisa mencobanya sekali lagi, kalau ini tetap terjadi, mohon cek Olsera Backoffice untuk memastikan produk ini masih ada."
-            except Exception as e:
-                logger.error("Gagal fetch item_details ID %s: %s", product_id, e)
-                return f"Gagal ambil data produk {item.get('product_name')}. Terjadi error yang tidak diketahui. Errornya: {e}"
-
-            # Cek variant dan harga
-            if not data.get("variant"):
-                idx = f"{product_id}"
-                harga = float(data.get("sell_price_pos", 0))
-
-                cart.append(
-                    {
-                        "type": "combo_old",
-                        "prod_id": product_id,
-                        "prodvar_id": idx,
-                        "name": item.get("product_name"),
-                        "qty": item_left_to_pick,
-                        "price": harga,
-                        "disc": 0,
-                    }
-                )
-                total_harga_normal += harga * item_left_to_pick
-
-                count_item += 1
-
-            else:
-                for var in data.get("variant", []):
-                    var_stock = int(float(var.get("stock_qty", 0)))
-                    var_hold_qty = int(float(var.get("hold_qty", 0)))
-                    print(
-                        f"VAR_STOCK {var.get('name'):<45} {product_id}|{var['id']} {var_stock:<15} {var_hold_qty:<15}"
-                    )
-                    if (
-                        var_stock <= 0
-                        or var.get("name").startswith("X")
-                        or var_stock - var_hold_qty <= 0
-                    ):
-                        print(
-                            "Stok varian tidak cukup atau sudah di-hold, lanjut ke varian berikutnya."
-                        )
-                        continue
-
-                    pick_qty = min(item_left_to_pick, var_stock)
-                    cart.append(
-                        {
-                            "prod_id": product_id,
-                            "prodvar_id": f"{product_id}|{var['id']}",
-                            "name": item.get("product_name"),
-                            "qty": pick_qty,
-                            "price": var.get("sell_price_pos", 0),
-                            "disc": 0,
-                        }
-                    )
-                    print(
-                        f"PAKET {item['product_name']:<45} {product_id}|{var['id']} {pick_qty:<15}"
-                    )
-                    count_item += 1
-
-                    item_left_to_pick -= pick_qty
-                    total_harga_normal += float(var.get("sell_price_pos", 0)) * pick_qty
-                    if item_left_to_pick <= 0:
-                        break
-
-                if item_left_to_pick > 0:
-                    logger.error(
-                        "Stok tidak cukup untuk produk %s, masih ada %d yang perlu diambil",
-                        product_id,
-                        item_left_to_pick,
-                    )
-                    return f"Maaf, stok tidak cukup untuk {item.get('product_name')}. Silakan coba lagi dengan jumlah yang lebih sedikit."
-            
-        ############## PATCH: Diskon untuk paket lewat Cart ##############
-        bundle_entry = cart[-count_item:]  # Ambil entry terakhir yang merupakan paket
-        harga_paket = float(combo_details["data"]["sell_price_pos"]) * qty_pesan
-
-        # print("DEBUG: bundle_entry:", bundle_entry)
-        if int(total_harga_normal) == int(harga_paket):
-            pass
-        else:
-            for item in bundle_entry:
-                price = float(item["price"])
-                # print(total_harga_normal)
-                item["disc"] = (
-                    price
-                    * (total_harga_normal - harga_paket)
-                    / total_harga_normal
-                    * float(item["qty"])
-                    if total_harga_normal > 0
-                    else price
-                )
-                # print(f"Diskon untuk {item['name']:<45} {item['prodvar_id']} {item['qty']:<15} {item['disc']:.2f}")
-                logger.debug("Paket-item %s diskon: %s", item["name"], item["disc"])
-
-        return True
+        ############### 1. Ambil snapshot katalog produk combo ###############
+        catalog = self.catalog.current()
+
+        ############### 2. Cari paket ###############
+        [(combo_id, error)] = self._select_line_ids(catalog, [("paket", nama_combo, qty)], use_llm)
+        if error:
+            return error
+        combo_id, combo, error = self._resolve_combo(catalog, nama_combo, combo_id)
+        if error:
+            if combo_id == -99999:
+                update_status(order_id, "X", access_token=access_token)
+            return error
+
+        ############### 3. Masukkan ke keranjang ###############
+        line, error = self._combo_cart_line(combo_id, combo, nama_combo, qty)
+        if error:
+            return error
+
+        cart.append(line)
+        return { 
+            "success": True,
+            "msg": f"Paket {nama_combo} berhasil ditambahkan ke order dengan ID {order_id}.",
+        }
 
     def move_cart_to_order(self, cart: list, order_id: str, access_token: str,type_combos:bool = False):
         """
@@ -793,26 +887,84 @@ class AgentBabe:
 
         return True, "Semua item berhasil ditambahkan ke order."
 
-    def handle_order(
-        self, query: str, access_token_dir: str, sudah_bayar: bool = False
-    ):
-        with open(access_token_dir, "r") as file:
-            token_data = json.load(file)
-
-        access_token = token_data.get("access_token", "")
-        if not access_token:
-            logger.error("Access token terkena limit %s", access_token_dir)
-            return "Access token terkena limit."
+    def _resolve_line(self, catalog, tipe: str, nama_produk: str, qty: int, selected_id, access_token: str, cancelled: threading.Event):
+        """
+        Resolve satu baris pesanan yang id-nya sudah dipilih jadi baris keranjang.
 
-        print("Query diterima: %s", query)
-        reconfirm_json = self.reconfirm_translator(query)
-        logger.debug("Hasil reconfirm: %s", reconfirm_json)
-        print("Hasil reconfirm:", reconfirm_json)
+        Returns:
+        - (list baris keranjang, None) atau ([], dict error)
+        """
+        if tipe == "item":
+            product_id, error = self._resolve_item_id(catalog, nama_produk, selected_id)
+            if error or cancelled.is_set():
+                return [], error
+            try:
+                item_details = fetch_product_item_details(
+                    product_id, access_token=access_token
+                )
+            except Exception as e:
+                logger.error("Gagal fetch item_details ID %s: %s", product_id, e)
+                return [], {
+                    "success" : False,
+                    "msg" : f"Gagal ambil data produk {nama_produk}. Terjadi error yang tidak diketahui. Errornya: {e}",
+                }
+            return self._item_cart_lines(product_id, nama_produk, qty, item_details)
 
-        if reconfirm_json.get("fallback"):
-            print(f"Error, format pesan tidak sesuai:", reconfirm_json["fallback"])
-            return reconfirm_json["fallback"]
+        combo_id, combo, error = self._resolve_combo(catalog, nama_produk, selected_id)
+        if error:
+            return [], error
+        line, error = self._combo_cart_line(combo_id, combo, nama_produk, qty)
+        return [line] if line else [], error
 
+    def _resolve_lines(self, catalog, lines: list, access_token: str):
+        """
+        Resolve semua baris pesanan. Id semua baris dipilih dengan satu panggilan
+        batch, lalu detail produk di-fetch paralel di thread pool sebesar
+        self.max_concurrency. Hasil digabung sesuai urutan baris; begitu ada baris yang
+        gagal, baris yang belum jalan dibatalkan dan baris yang sedang jalan berhenti
+        sebelum fetch detail.
+
+        Returns:
+        - (baris keranjang produk, baris keranjang paket, None),
+          atau ([], [], (tipe, dict error)) kalau ada yang gagal
+        """
+        selections = self._select_line_ids(catalog, lines)
+        for (tipe, _, _), (_, error) in zip(lines, selections):
+            if error:
+                return [], [], (tipe, error)
+
+        cancelled = threading.Event()
+        results = [None] * len(lines)
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        try:
+            futures = {
+                executor.submit(
+                    self._resolve_line, catalog, tipe, nama_produk, qty, selected_id, access_token, cancelled
+                ): i
+                for i, ((tipe, nama_produk, qty), (selected_id, _)) in enumerate(zip(lines, selections))
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                cart_lines, error = future.result()
+                if error:
+                    cancelled.set()
+                    return [], [], (lines[i][0], error)
+                results[i] = cart_lines
+        finally:
+            # Tidak menunggu baris yang masih jalan kalau sudah ada yang gagal
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        product_lines = [l for (tipe, _, _), ls in zip(lines, results) if tipe == "item" for l in ls]
+        combo_lines = [l for (tipe, _, _), ls in zip(lines, results) if tipe == "paket" for l in ls]
+        return product_lines, combo_lines, None
+
+    def _handle_void_request(self, reconfirm_json: dict, access_token: str):
+        """
+        Tangani permintaan pembatalan order atau kosongkan keranjang.
+
+        Returns:
+        - str pesan balasan, atau None kalau pesan ini bukan permintaan pembatalan
+        """
         if reconfirm_json.get("pembatalan"):
             print("[DEBUG] Pembatalan order dengan ID:", reconfirm_json["pembatalan"])
 
@@ -877,70 +1029,418 @@ class AgentBabe:
 
                 for order_id in ret:
                     void_order(order_id, access_token)
-                    time.sleep(1) # Cegah rate limit
 
                 return f"Semua order yang masih open di tanggal {yesterday} sampai {today} sudah aku batalin be."
 
-        # Ubah alamat
+        return None
+
+    def _locate_shortlink(self, link: str):
+        result = resolve_maps_shortlink(link, api_key=self.gmap_api_key, cache=self.geo_cache)
+        print("DEBUG resolve_maps_shortlink result:", result)
+        alamat_cust, longlat_cust, kelurahan, kecamatan, kota, provinsi = result
+        return alamat_cust, longlat_cust, kelurahan, kecamatan
+
+    def _prefetch_address(self, message: str, parse: tuple = None):
+        """
+        Resolve link Maps langsung dari pesan mentah (redirect, geocode, lalu jarak),
+        supaya berjalan bersamaan dengan reconfirm_translator. Hasilnya dipakai
+        _resolve_address kalau link-nya sama dengan hasil parse. parse adalah hasil
+        parse_reconfirm(message) kalau sudah ada.
+
+        Returns:
+        - dict {link, jenis_pengiriman, located, distance_and_time}, atau None kalau
+          tidak ada link atau gagal (nanti di-resolve ulang di _resolve_address)
+        """
+        link = extract_address_link(message)
+        if not link:
+            return None
+        parsed, _, _ = parse if parse is not None else parse_reconfirm(message)
+        jenis_pengiriman = parsed["jenis_pengiriman"] if parsed else None
         try:
-            if reconfirm_json["address"][:4] == "http":
-                result = resolve_maps_shortlink(
-                reconfirm_json["address"], api_key=self.gmap_api_key
-                )
-                print("DEBUG resolve_maps_shortlink result:", result)
-                alamat_cust, longlat_cust, kelurahan, kecamatan, kota, provinsi = (
-                    resolve_maps_shortlink(
-                        reconfirm_json["address"], api_key=self.gmap_api_key
-                    )
+            with stage("address_prefetch"):
+                located = self._locate_shortlink(link)
+                distance_and_time = self._travel_distance(located[1], jenis_pengiriman)
+        except Exception as e:
+            logger.warning("Prefetch alamat gagal untuk %s: %s", link, e)
+            return None
+        return {
+            "link": link,
+            "jenis_pengiriman": jenis_pengiriman,
+            "located": located,
+            "distance_and_time": distance_and_time,
+        }
+
+    def _resolve_address(self, reconfirm_json: dict, prefetched: dict = None):
+        """
+        Resolve alamat pelanggan (link Google Maps atau teks alamat) dan hitung jarak
+        tempuh dari toko. reconfirm_json["distance"] diisi jarak dalam km, serta
+        "latlng" dan "kelurahan" untuk cek area subsidi ongkir.
+        prefetched adalah hasil _prefetch_address untuk pesan yang sama.
+
+        Returns:
+        - (alamat_cust, kelurahan, kecamatan, distance_and_time)
+        """
+        if reconfirm_json["address"][:4] == "http":
+            distance_and_time = None
+            if prefetched is not None and normalize_shortlink(
+                prefetched["link"]
+            ) == normalize_shortlink(reconfirm_json["address"]):
+                located = prefetched["located"]
+                # Estimasi offline hanya berlaku untuk jenis pengiriman yang dipakai saat prefetch
+                if not (
+                    prefetched["distance_and_time"].get("estimated")
+                    and prefetched["jenis_pengiriman"] != reconfirm_json.get("jenis_pengiriman")
+                ):
+                    distance_and_time = prefetched["distance_and_time"]
+            else:
+                located = self._locate_shortlink(reconfirm_json["address"])
+            alamat_cust, longlat_cust, kelurahan, kecamatan = located
+            if distance_and_time is None:
+                distance_and_time = self._travel_distance(
+                    longlat_cust, reconfirm_json.get("jenis_pengiriman")
                 )
-                distance_and_time = get_travel_distance(
-                    self.longlat_toko, longlat_cust, api_key=self.gmap_api_key
+            # distance_and_time = get_fastest_route_details(self.longlat_toko, longlat_cust, api_key=self.gmap_api_key)
+            distance = distance_and_time["distance_meters"] / 1000
+            reconfirm_json["distance"] = distance
+        else:
+            alamat_cust = reconfirm_json["address"]
+            kelurahan, kecamatan, kota, provinsi = (
+                None,
+                None,
+                None,
+            )  # Temporarily set to None
+            longlat_cust = address_to_latlng(
+                reconfirm_json["address"], api_key=self.gmap_api_key, cache=self.geo_cache
+            )
+            distance_and_time = self._travel_distance(
+                longlat_cust, reconfirm_json.get("jenis_pengiriman")
+            )
+            # distance_and_time = get_fastest_route_details(self.longlat_toko, longlat_cust, api_key=self.gmap_api_key)
+            distance = distance_and_time["distance_meters"] / 1000
+            reconfirm_json["distance"] = distance
+
+        reconfirm_json["latlng"] = longlat_cust
+        reconfirm_json["kelurahan"] = kelurahan
+
+        with self._distance_lock:
+            self._address_lookups += 1
+            log_report = self._address_lookups % self.geo_cache_report_every == 0
+        if log_report:
+            self._log_geo_cache_report()
+        return alamat_cust, kelurahan, kecamatan, distance_and_time
+
+    def _travel_distance(self, longlat_cust, jenis_pengiriman: str = None) -> dict:
+        """
+        Jarak tempuh toko -> pelanggan. Kalau estimasi offline yakin berada di dalam
+        satu band ongkir (dan band ETA untuk I/EX), Distance Matrix tidak dipanggil.
+        Kalau Distance Matrix gagal, estimasi dipakai supaya order tetap jalan.
+        Jenis pengiriman yang belum diketahui diperlakukan seperti I (band paling rapat).
+        """
+        estimator = self.distance_estimator
+        estimate = estimator.estimate(longlat_cust) if estimator is not None else None
+        if estimator is not None and estimator.confident(estimate, jenis_pengiriman or "I"):
+            with self._distance_lock:
+                self.distance_stats["estimated"] += 1
+            return estimator.as_travel_distance(estimate)
+
+        distance_and_time = get_travel_distance(
+            self.longlat_toko, longlat_cust, api_key=self.gmap_api_key, cache=self.geo_cache
+        )
+        if distance_and_time is None:
+            if estimate is None:
+                raise ValueError("Distance Matrix gagal menghitung jarak")
+            logger.warning(
+                "Distance Matrix gagal, pakai estimasi offline %.1f km", estimate["distance_km"]
+            )
+            with self._distance_lock:
+                self.distance_stats["fallback"] += 1
+            return estimator.as_travel_distance(estimate)
+
+        with self._distance_lock:
+            self.distance_stats["api"] += 1
+        if estimator is not None:
+            estimator.observe(
+                longlat_cust,
+                distance_and_time["distance_meters"] / 1000,
+                distance_and_time["duration_seconds"],
+            )
+        return distance_and_time
+
+    def _generate_notes(self, query: str, parse: tuple = None) -> str:
+        with stage("notes"):
+            return self._generate_notes_text(query, parse)
+
+    def _generate_notes_text(self, query: str, parse: tuple = None) -> str:
+        parsed = self._fast_parse(query, parse)
+        if parsed is not None:
+            return build_notes_text(parsed)
+        try:
+            notes_text = self.llm.notes(query, self.instructions["notes_prompt"])
+            logger.debug("Notes dihasilkan: %s", notes_text)
+        except Exception as e:
+            logger.error("Gagal generate notes: %s", e)
+            notes_text = ""
+        return notes_text
+
+    def _log_order(self, order_no: str, order_id: str):
+        log_dir = self.order_log_dir
+        if log_dir is None:
+            return
+        log_file = os.path.join(log_dir,"order.log")
+        os.makedirs(log_dir,exist_ok=True)
+        now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        with open(log_file,"a",encoding="utf-8") as f : 
+            f.write(f"{order_no}|{order_id}|{now_str}\n")
+
+    def _ongkir_products(self, alamat_cust: str, reconfirm_json: dict) -> list:
+        """Baris produk ongkir yang perlu ditambahkan ke pesanan, sesuai jarak dan area."""
+        distance = reconfirm_json["distance"]
+        subsidi_ongkir = self.free_area_index.lookup(
+            latlng=reconfirm_json.get("latlng"),
+            kelurahan=reconfirm_json.get("kelurahan"),
+            address=alamat_cust,
+        )
+        ongkir = distance_cost_rule(distance, subsidi_ongkir[0])
+
+        if ongkir != "Gratis Ongkir" and ongkir != "Subsidi Ongkir 10K":
+            return [
+                {
+                    "tipe": "Item",
+                    "produk": distance_cost_rule(distance),
+                    "quantity": 1,
+                }
+            ]
+
+        elif ongkir == "Subsidi Ongkir 10K":
+            return [
+                {
+                    "tipe": "Item",
+                    "produk": "Subsidi Ongkir 10K",
+                    "quantity": 1,
+                }
+            ]
+
+        return []
+
+    def _order_lines(self, ordered_products: list, reconfirm_json: dict) -> list:
+        """Saring baris pesanan yang valid jadi list (tipe, nama produk, qty)."""
+        lines = []
+        for product in ordered_products:
+            # print(f"\n[DEBUG] Memproses produk: {product['produk']} | Tipe: {product['tipe']}")
+            tipe = product.get("tipe", "").lower()
+            print("DEBUG TIPE : ",tipe)
+            nama_produk = product.get("produk", "")
+            qty = product.get("quantity", 0)
+
+            if not nama_produk or qty <= 0:
+                logger.warning(
+                    "Produk diabaikan karena nama/qty tidak valid: %s", product
                 )
-                # distance_and_time = get_fastest_route_details(self.longlat_toko, longlat_cust, api_key=self.gmap_api_key)
-                distance = distance_and_time["distance_meters"] / 1000
-                reconfirm_json["distance"] = distance
-            else:
-                alamat_cust = reconfirm_json["address"]
-                kelurahan, kecamatan, kota, provinsi = (
-                    None,
-                    None,
-                    None,
-                )  # Temporarily set to None
-                longlat_cust = address_to_latlng(
-                    reconfirm_json["address"], api_key=self.gmap_api_key
+                continue
+
+            if tipe not in ("item", "paket"):
+                print(
+                    f"[ERROR Pada Orderan {reconfirm_json.get('cust_name')}({reconfirm_json.get('phone_num')})] Jenis tidak dikenali. Pastikan untuk memasukkan produk dengan kurung () yang menjelaskan jenis produk, apakah item atau paket. Misal: Hennesey 650 mL (item). Anda memasukkan: {product['tipe']}"
                 )
-                distance_and_time = get_travel_distance(
-                    self.longlat_toko, longlat_cust, api_key=self.gmap_api_key
+                continue
+
+            lines.append((tipe, nama_produk, qty))
+        return lines
+
+    def _cart_total(self, cart_temp_product: list, cart_temp_combo: list) -> float:
+        # total_amount = int(float(order_details['data']['total_amount']))
+        cart_product_df = pd.DataFrame(cart_temp_product)
+        total_amount = (
+            (
+                cart_product_df["price"].astype(float) * cart_product_df["qty"].astype(int)
+                - cart_product_df["disc"].astype(float)
+            ).sum()
+            if not cart_product_df.empty
+            else 0
+        )
+
+        cart_combo_df = pd.DataFrame(cart_temp_combo)
+        if not cart_combo_df.empty:
+            total_amount += (
+                (cart_combo_df["price"].astype(float) * cart_combo_df["qty"].astype(int)).sum()
+            )
+        return total_amount
+
+    def _payment_mode_id(self, payment_modes: list, jenis: str):
+        # payment_dict: mapping nama pembayaran ke indeks
+        idx = payment_dict.get(jenis)
+        if idx is None or idx >= len(payment_modes):
+            logger.warning("Metode pembayaran '%s' tidak dikenal", jenis)
+            return None
+        return payment_modes[idx]["id"]
+
+    def _build_invoice(
+        self,
+        query: str,
+        reconfirm_json: dict,
+        order_details: dict,
+        struk_url: str,
+        kelurahan: str,
+        kecamatan: str,
+        distance_and_time: dict,
+    ) -> str:
+        with stage("invoice"):
+            return self._build_invoice_text(
+                query,
+                reconfirm_json,
+                order_details,
+                struk_url,
+                kelurahan,
+                kecamatan,
+                distance_and_time,
+            )
+
+    def _build_invoice_text(
+        self,
+        query: str,
+        reconfirm_json: dict,
+        order_details: dict,
+        struk_url: str,
+        kelurahan: str,
+        kecamatan: str,
+        distance_and_time: dict,
+    ) -> str:
+        # Catatan pending atau lunas
+        pending_line = "*[PENDING ORDER]*\n" if "pending" in query.lower() else ""
+        update_line = "*[UPDATE STRUK]*\n" if "update-struk" in detect_keywords(query) else ""
+        req_update_line = "*[REQUEST UPDATE STRUK]*\n" if "req-update" in detect_keywords(query) else ""
+
+        # Buat estimasi tiba
+        try:
+            max_luncur_str = estimasi_tiba(
+                reconfirm_json["distance"],
+                reconfirm_json["jenis_pengiriman"],
+                datetime.now(),
+            )
+            max_luncur_dt = datetime.combine(datetime.today(), datetime.strptime(max_luncur_str, "%H:%M").time())
+            if reconfirm_json["jenis_pengiriman"] != "FD":
+                max_luncur_dt += timedelta(minutes=int(float(reconfirm_json["tambahan_waktu"]) + 3))
+
+            max_luncur = max_luncur_dt.strftime("%H:%M")
+        except Exception as e:
+            max_luncur_menit = int(distance_and_time["duration_seconds"] / 60) + 20
+            max_luncur = (
+                datetime.now() + timedelta(minutes=max_luncur_menit)
+            ).strftime("%H:%M")
+
+        max_luncur_line = (
+            f"MAKSIMAL DILUNCURKAN DARI GUDANG: {max_luncur}"
+            if reconfirm_json["jenis_pengiriman"] == "FD"
+            else f"ESTIMASI SAMPAI: {max_luncur}"
+        )
+
+        total_ftotal = order_details["data"].get("ftotal_amount", "")
+
+        status_lines = [pending_line.strip(), update_line.strip(), req_update_line.strip()]
+        status_lines = [line for line in status_lines if line]
+        distance_val = (
+            int(reconfirm_json["distance"])
+            if reconfirm_json["distance"] > 14
+            else round(reconfirm_json["distance"], 1)
+        )
+        lokasi = f"{kelurahan}, {kecamatan.replace('Kecamatan ', '').replace('Kec. ', '').replace('kecamatan', '').replace('kec.', '')}"
+
+
+        invoice_lines = [
+            *status_lines,
+            "",
+            f"Nama: {reconfirm_json.get('cust_name', '')}",
+            f"Nomor Telepon: {reconfirm_json.get('phone_num', '')}",
+            f"Alamat: {reconfirm_json.get('address', '')}",
+            "",
+            "",
+            max_luncur_line.strip(),
+            f"Jarak: {distance_val} km (*{lokasi}*)",
+            "",
+            "",
+            "Makasih yaa Cah udah Jajan di Babe!",
+            f"Total Jajan: {total_ftotal} (*{reconfirm_json.get('payment_type', '').upper()}*)",
+            f"Cek Jajanmu di sini: {struk_url or 'Gagal mencetak struk. Tolong ulangi.'}",
+            f"Jam Order: *{datetime.now().strftime('%H:%M')}*",
+            "",
+            "",
+            f"Jenis Pengiriman: {reconfirm_json.get('jenis_pengiriman', '')}",
+            f"*NOTES: {reconfirm_json.get('notes') or 'Tidak ada catatan tambahan.'}*",
+        ]
+
+        invoice = "\n".join([line for line in invoice_lines if line is not None])
+        print("Mengembalikan invoice: ")
+        print(invoice)
+        return invoice
+
+    def _load_access_token(self, access_token_dir: str) -> str:
+        with open(access_token_dir, "r") as file:
+            token_data = json.load(file)
+        return token_data.get("access_token", "")
+
+    def handle_order(
+        self, query: str, access_token_dir: str, sudah_bayar: bool = False
+    ):
+        access_token = self._load_access_token(access_token_dir)
+        if not access_token:
+            logger.error("Access token terkena limit %s", access_token_dir)
+            return "Access token terkena limit."
+
+        print("Query diterima: %s", query)
+        # Pesan di-parse sekali, hasilnya dipakai notes, prefetch alamat, dan reconfirm
+        parse = parse_reconfirm(query)
+        notes_future = self._notes_executor.submit(
+            contextvars.copy_context().run, self._generate_notes, query, parse
+        )
+        address_future = self._address_executor.submit(
+            contextvars.copy_context().run, self._prefetch_address, query, parse
+        )
+
+        def cancel_pending():
+            notes_future.cancel()
+            address_future.cancel()
+
+        with stage("reconfirm"):
+            reconfirm_json = self.reconfirm_translator(query, parse)
+        logger.debug("Hasil reconfirm: %s", reconfirm_json)
+        print("Hasil reconfirm:", reconfirm_json)
+
+        if reconfirm_json.get("fallback"):
+            cancel_pending()
+            print(f"Error, format pesan tidak sesuai:", reconfirm_json["fallback"])
+            return reconfirm_json["fallback"]
+
+        void_msg = self._handle_void_request(reconfirm_json, access_token)
+        if void_msg is not None:
+            cancel_pending()
+            return void_msg
+
+        # Ubah alamat
+        try:
+            with stage("address"):
+                alamat_cust, kelurahan, kecamatan, distance_and_time = self._resolve_address(
+                    reconfirm_json, address_future.result()
                 )
-                # distance_and_time = get_fastest_route_details(self.longlat_toko, longlat_cust, api_key=self.gmap_api_key)
-                distance = distance_and_time["distance_meters"] / 1000
-                reconfirm_json["distance"] = distance
 
             if reconfirm_json["distance"] > 45:
+                cancel_pending()
                 logger.error("Jarak terlalu jauh: %s km", reconfirm_json["distance"])
                 return "Maaf, jarak pengiriman terlalu jauh. Silakan hubungi telemarketer untuk bantuan lebih lanjut."
         except Exception as e:
+            cancel_pending()
             logger.error("Gagal resolve alamat: %s", reconfirm_json["address"])
             print("Error : ",e)
             return f"[ERROR Pada Orderan {reconfirm_json.get('cust_name')}({reconfirm_json.get('phone_num')})] Maaf be, aku gagal buka alamatnya 😅. Pastiin format alamatnya dalam bentuk link gini yaa: https://maps.app.goo.gl/XXX. Detail error: {e}"
 
-        # Buat notes
-        try:
-            gemini_model = genai.GenerativeModel(
-                model_name=self.model_name["flash"],
-                system_instruction=task_instructions["notes_prompt"],
-            )
-            notes = gemini_model.generate_content(query)
-            notes_text = getattr(notes, "text", "") or ""
-            logger.debug("Notes dihasilkan: %s", notes_text)
-        except Exception as e:
-            logger.error("Gagal generate notes: %s", e)
-            notes_text = ""
+        # Notes sudah dibuat paralel dengan reconfirm
+        notes_text = notes_future.result()
 
         try:
-            kastamer = cek_kastamer(
-                nomor_telepon=reconfirm_json["phone_num"], access_token=access_token
-            )
+            with stage("customer"):
+                kastamer = cek_kastamer(
+                    nomor_telepon=reconfirm_json["phone_num"], access_token=access_token
+                )
 
             cust_telp = reconfirm_json["phone_num"]
 
@@ -960,52 +1460,27 @@ class AgentBabe:
         try:
             print("Membuat order baru...")
             print(cust_id, cust_name, cust_telp)
-            order_id, order_no = create_order(
-                order_date=today_str,
-                customer_id=cust_id,
-                nama_kastamer=cust_name,
-                nomor_telepon=cust_telp,
-                notes=notes_text,
-                access_token=access_token,
-            )
+            with stage("order_create"):
+                order_id, order_no = create_order(
+                    order_date=today_str,
+                    customer_id=cust_id,
+                    nama_kastamer=cust_name,
+                    nomor_telepon=cust_telp,
+                    notes=notes_text,
+                    access_token=access_token,
+                )
             logger.debug("Order dibuat: ID=%s, No=%s", order_id, order_no)
             print(f"Order ID: {order_id}, Order No: {order_no}")
-            log_dir = "log"
-            log_file = os.path.join(log_dir,"order.log")
-            os.makedirs(log_dir,exist_ok=True)
-            now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-            with open(log_file,"a",encoding="utf-8") as f : 
-                f.write(f"{order_no}|{order_id}|{now_str}\n")
+            self._log_order(order_no, order_id)
         except Exception as e:
             logger.error("Gagal membuat order: %s", e)
             # return f"Terjadi kesalahan, gagal membuat order baru. Mohon coba lagi. Error: {e}"
             return f"[ERROR Pada Orderan {reconfirm_json.get('cust_name')}({reconfirm_json.get('phone_num')})] Keknya masalah jaringan be, aku gagal membuat order baru. Coba lagi abis ini yaa, kalau masih error coba tanyakan ke developer. Errornya: {e}"
 
-        subsidi_ongkir = is_free_delivery(alamat_cust, self.free_areas)
-        ongkir = distance_cost_rule(reconfirm_json["distance"], subsidi_ongkir[0])
-
         # Add Ongkir
-        if ongkir != "Gratis Ongkir" and ongkir != "Subsidi Ongkir 10K":
-            reconfirm_json["ordered_products"].append(
-                {
-                    "tipe": "Item",
-                    "produk": distance_cost_rule(reconfirm_json["distance"]),
-                    "quantity": 1,
-                }
-            )
-
-        elif ongkir == "Subsidi Ongkir 10K":
-            reconfirm_json["ordered_products"].append(
-                {
-                    "tipe": "Item",
-                    "produk": "Subsidi Ongkir 10K",
-                    "quantity": 1,
-                }
-            )
-
-        else:
-            pass
+        reconfirm_json["ordered_products"].extend(
+            self._ongkir_products(alamat_cust, reconfirm_json)
+        )
 
         # print(reconfirm_json)
         print("PESANAN RECONFIRM")
@@ -1018,99 +1493,52 @@ class AgentBabe:
 
         ############## SIAPKAN KERANJANG SEMENTARA #####################
         cart_temp = []
-        cart_temp_product = []
-        cart_temp_combo = []
 
         # Add products to order
         ordered_products = reconfirm_json.get("ordered_products", [])
         print("DEBUG Ordered Products:", ordered_products)
-        for product in ordered_products:
-            # print(f"\n[DEBUG] Memproses produk: {product['produk']} | Tipe: {product['tipe']}")
-            tipe = product.get("tipe", "").lower()
-            print("DEBUG TIPE : ",tipe)
-            nama_produk = product.get("produk", "")
-            qty = product.get("quantity", 0)
-
-            if not nama_produk or qty <= 0:
-                logger.warning(
-                    "Produk diabaikan karena nama/qty tidak valid: %s", product
-                )
-                continue
-
+        with stage("lines"):
+            cart_temp_product, cart_temp_combo, failed = self._resolve_lines(
+                self.catalog.current(),
+                self._order_lines(ordered_products, reconfirm_json),
+                access_token,
+            )
+        if failed:
+            # Jika error di dalam, void entire order dan return
+            tipe, response = failed
+            update_status(order_id, "X", access_token)
+            print("Response error:", response["msg"])
             if tipe == "item":
-                print("Mulai memproses item...")
-                response = self._process_item(
-                    order_id, nama_produk, qty, cart_temp_product, access_token
-                )
-                time.sleep(1)  # Delay untuk menghindari rate limit API Olsera
-
-                if not response["success"]:
-                    # Jika error di dalam, void entire order dan return
-                    update_status(order_id, "X", access_token)
-                    print("Response error:", response["msg"])
-                    return f"[ERROR Pada Orderan {reconfirm_json.get('cust_name')}({reconfirm_json.get('phone_num')})] Ada kesalahan saat menambahkan item, struk di-void. Error: {response['msg']}"
-
-            elif tipe == "paket":
-                response = self._process_combo(
-                    order_id, nama_produk, qty, cart_temp_combo, access_token
-                )
-                time.sleep(1)
-                if not response["success"] :
-                    # Jika mengembalikan string pesan error, batalkan order
-                    update_status(order_id, "X", access_token)
-                    print("Response error:", response["msg"])
-                    return response["msg"]
-
-            else:
-                print(
-                    f"[ERROR Pada Orderan {reconfirm_json.get('cust_name')}({reconfirm_json.get('phone_num')})] Jenis tidak dikenali. Pastikan untuk memasukkan produk dengan kurung () yang menjelaskan jenis produk, apakah item atau paket. Misal: Hennesey 650 mL (item). Anda memasukkan: {product['tipe']}"
-                )
-                continue
+                return f"[ERROR Pada Orderan {reconfirm_json.get('cust_name')}({reconfirm_json.get('phone_num')})] Ada kesalahan saat menambahkan item, struk di-void. Error: {response['msg']}"
+            return response["msg"]
 
         # Auto add merch
-        # total_amount = int(float(order_details['data']['total_amount']))
         # print("Keranjang Sementara:", json.dumps(cart_temp, indent=4))
         # print(f"Cart sementara : {cart_temp}")
-        cart_product_df = pd.DataFrame(cart_temp_product)
-        total_amount = (
-            (
-                cart_product_df["price"].astype(float) * cart_product_df["qty"].astype(int)
-                - cart_product_df["disc"].astype(float)
-            ).sum()
-            if not cart_product_df.empty
-            else 0
-        )
-        # (df_new['price'].astype(float) * df_new['qty'].astype(int) - df_new['disc'].astype(float)).sum()
+        total_amount = self._cart_total(cart_temp_product, cart_temp_combo)
         # print("Harga Total: ", total_amount)
 
-        cart_combo_df = pd.DataFrame(cart_temp_combo)
-        if not cart_combo_df.empty:
-            total_amount += (
-                (cart_combo_df["price"].astype(float) * cart_combo_df["qty"].astype(int)).sum()
-            )
-
-        if total_amount < 100000:
-            self._process_item(order_id, "Cup Babe", 1, cart_temp, access_token)
-            time.sleep(1)  # Delay untuk menghindari rate limit API Olsera
+        # Nama merch tetap, jadi cukup dicocokkan ke katalog tanpa LLM
+        with stage("merch"):
+            if total_amount < 100000:
+                self._process_item(order_id, "Cup Babe", 1, cart_temp, access_token, use_llm=False)
 
-        else:
-            self._process_item(order_id, "Cup Babe", 2, cart_temp, access_token)
-            time.sleep(1)  # Delay untuk menghindari rate limit API Olsera
+            else:
+                self._process_item(order_id, "Cup Babe", 2, cart_temp, access_token, use_llm=False)
 
-        if total_amount > 150000 and total_amount < 250000:
-            self._process_combo(order_id, "Merch Babe 1", 1, cart_temp, access_token)
-            time.sleep(1)  # Delay untuk menghindari rate limit API Olsera
+            if total_amount > 150000 and total_amount < 250000:
+                self._process_combo(order_id, "Merch Babe 1", 1, cart_temp, access_token, use_llm=False)
 
-        elif total_amount >= 250000:
-            self._process_combo(order_id, "Merch Babe 2", 1, cart_temp, access_token)
-            time.sleep(1)  # Delay untuk menghindari rate limit API Olsera
+            elif total_amount >= 250000:
+                self._process_combo(order_id, "Merch Babe 2", 1, cart_temp, access_token, use_llm=False)
 
-        else:
-            pass
+            else:
+                pass
 
         # agg_cart = self.aggregate_cart_by_prodvar(cart_temp)
         print("Memproses data product ke keranjang...")
-        cart_stat, msg = self.move_cart_to_order(cart_temp_product, order_id, access_token)
+        with stage("cart_move"):
+            cart_stat, msg = self.move_cart_to_order(cart_temp_product, order_id, access_token)
         if not cart_stat:
             logger.error("Gagal memindahkan cart ke order: %s", msg)
             update_status(order_id, "X", access_token)
@@ -1118,7 +1546,8 @@ class AgentBabe:
         
 
         print("Memproses data paket ke keranjang...")
-        cart_stat, msg = self.move_cart_to_order(cart_temp_combo, order_id, access_token,type_combos=True)
+        with stage("cart_move"):
+            cart_stat, msg = self.move_cart_to_order(cart_temp_combo, order_id, access_token,type_combos=True)
         if not cart_stat:
             logger.error("Gagal memindahkan cart combo ke order: %s", msg)
             update_status(order_id, "X", access_token)
@@ -1126,13 +1555,14 @@ class AgentBabe:
 
         # Tambahkan diskon --- DIMATIKAN SEMENTARA UNTUK DEBUGGING
         try:
-            disc_resp = self.add_discount(
-                order_id,
-                mode=reconfirm_json["mode_diskon"],
-                access_token=access_token,
-                discount=reconfirm_json["disc"],
-                notes="",
-            )
+            with stage("discount"):
+                disc_resp = self.add_discount(
+                    order_id,
+                    mode=reconfirm_json["mode_diskon"],
+                    access_token=access_token,
+                    discount=reconfirm_json["disc"],
+                    notes="",
+                )
             if not disc_resp["success"]:
                 logger.error("Gagal menambahkan diskon: %s", disc_resp["msg"])
                 update_status(order_id, "X", access_token)
@@ -1144,7 +1574,8 @@ class AgentBabe:
             return f"[ERROR Pada Orderan {reconfirm_json.get('cust_name')}({reconfirm_json.get('phone_num')})] Maaf be, biasanya aku perlu ngecek dulu nominal diskon yang babe masukin (walaupun gak ada diskon sama sekali), tapi keknya ada yang error deh. Coba kirim ulang aja yaa, kalau masih error coba tanyakan ke developer. Errornya: {e}"
         # Retrieve order details after adding products --- DIMATIKAN SEMENTARA UNTUK DEBUGGING
         try:
-            order_details = fetch_order_details(order_id, access_token)
+            with stage("order_detail"):
+                order_details = fetch_order_details(order_id, access_token)
 
         except Exception as e:
             logger.error(
@@ -1159,31 +1590,28 @@ class AgentBabe:
         status = reconfirm_json.get("status", "").lower()
         if sudah_bayar or status == "lunas":
             try:
-                # Ambil ID metode pembayaran
-                payment_modes = list_payment_modes(order_id, access_token)
-                # payment_dict: mapping nama pembayaran ke indeks
-                jenis = reconfirm_json.get("payment_type", "")
-                idx = payment_dict.get(jenis)
-                if idx is None or idx >= len(payment_modes):
-                    logger.warning("Metode pembayaran '%s' tidak dikenal", jenis)
-                    # lanjutkan tanpa bayar atau return error?
-                else:
-                    payment_id = payment_modes[idx]["id"]
-                    total_amount = int(float(order_details["data"]["total_amount"]))
-                    update_payment(
-                        order_id=order_id,
-                        payment_amount=str(total_amount),
-                        payment_date=today_str,
-                        payment_mode_id=str(payment_id),
-                        access_token=access_token,
-                        payment_payee="Kevin Tes API Agent AI",
-                        payment_seq="0",
-                        payment_currency_id="IDR",
-                    )
-                    update_status(order_id, "Z", access_token)
-                    logger.debug(
-                        "Order %s ditandai lunas dan status diupdate.", order_id
+                with stage("payment"):
+                    # Ambil ID metode pembayaran
+                    payment_modes = list_payment_modes(order_id, access_token)
+                    payment_id = self._payment_mode_id(
+                        payment_modes, reconfirm_json.get("payment_type", "")
                     )
+                    if payment_id is not None:
+                        total_amount = int(float(order_details["data"]["total_amount"]))
+                        update_payment(
+                            order_id=order_id,
+                            payment_amount=str(total_amount),
+                            payment_date=today_str,
+                            payment_mode_id=str(payment_id),
+                            access_token=access_token,
+                            payment_payee="Kevin Tes API Agent AI",
+                            payment_seq="0",
+                            payment_currency_id="IDR",
+                        )
+                        update_status(order_id, "Z", access_token)
+                        logger.debug(
+                            "Order %s ditandai lunas dan status diupdate.", order_id
+                        )
             except Exception as e:
                 logger.error("[ERROR Pada Orderan {reconfirm_json.get('cust_name')}({reconfirm_json.get('phone_num')})] Gagal proses pembayaran: %s", e)
                 # Tidak membatalkan order karena produk sudah masuk; tergantung kebijakan.
@@ -1196,82 +1624,409 @@ class AgentBabe:
             logger.error("Gagal cetak struk: %s", e)
             struk_url = None
 
-        # Catatan pending atau lunas
-        pending_line = "*[PENDING ORDER]*\n" if "pending" in query.lower() else ""
-        update_line = "*[UPDATE STRUK]*\n" if "update-struk" in detect_keywords(query) else ""
-        req_update_line = "*[REQUEST UPDATE STRUK]*\n" if "req-update" in detect_keywords(query) else ""
+        return self._build_invoice(
+            query,
+            reconfirm_json,
+            order_details,
+            struk_url,
+            kelurahan,
+            kecamatan,
+            distance_and_time,
+        )
 
-        # Buat estimasi tiba
+    async def _resolve_lines_async(
+        self,
+        client: AsyncOlseraClient,
+        catalog,
+        lines: list,
+        access_token: str,
+        semaphore: asyncio.Semaphore,
+        use_llm: bool = True,
+    ):
+        """
+        Versi async dari _resolve_lines: id semua baris dipilih dengan satu panggilan
+        batch (atau tanpa LLM kalau use_llm=False), lalu detail produk di-fetch
+        bersamaan. Hasil digabung sesuai urutan baris; begitu ada baris yang gagal,
+        baris lain yang belum selesai dibatalkan.
+
+        Returns:
+        - (baris keranjang produk, baris keranjang paket, None),
+          atau ([], [], (tipe, dict error)) kalau ada yang gagal
+        """
+        async with semaphore:
+            selections = await asyncio.to_thread(self._select_line_ids, catalog, lines, use_llm)
+        for (tipe, _, _), (_, error) in zip(lines, selections):
+            if error:
+                return [], [], (tipe, error)
+
+        async def resolve(i, tipe, nama_produk, qty):
+            selected_id = selections[i][0]
+            if tipe == "item":
+                product_id, error = self._resolve_item_id(catalog, nama_produk, selected_id)
+                if error:
+                    return i, tipe, [], error
+                try:
+                    async with semaphore:
+                        item_details = await acrud.fetch_product_item_details(
+                            client, product_id, access_token
+                        )
+                except Exception as e:
+                    logger.error("Gagal fetch item_details ID %s: %s", product_id, e)
+                    return i, tipe, [], {
+                        "success" : False,
+                        "msg" : f"Gagal ambil data produk {nama_produk}. Terjadi error yang tidak diketahui. Errornya: {e}",
+                    }
+                cart_lines, error = self._item_cart_lines(
+                    product_id, nama_produk, qty, item_details
+                )
+                return i, tipe, cart_lines, error
+
+            combo_id, combo, error = self._resolve_combo(catalog, nama_produk, selected_id)
+            if error:
+                return i, tipe, [], error
+            line, error = self._combo_cart_line(combo_id, combo, nama_produk, qty)
+            return i, tipe, [line] if line else [], error
+
+        tasks = [asyncio.create_task(resolve(i, *line)) for i, line in enumerate(lines)]
+        results = [None] * len(tasks)
         try:
-            max_luncur_str = estimasi_tiba(
-                reconfirm_json["distance"],
-                reconfirm_json["jenis_pengiriman"],
-                datetime.now(),
-            )
-            max_luncur_dt = datetime.combine(datetime.today(), datetime.strptime(max_luncur_str, "%H:%M").time())
-            if reconfirm_json["jenis_pengiriman"] != "FD":
-                max_luncur_dt += timedelta(minutes=int(float(reconfirm_json["tambahan_waktu"]) + 3))
+            for finished in asyncio.as_completed(tasks):
+                i, tipe, cart_lines, error = await finished
+                if error:
+                    return [], [], (tipe, error)
+                results[i] = (tipe, cart_lines)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        product_lines = [l for tipe, ls in results if tipe == "item" for l in ls]
+        combo_lines = [l for tipe, ls in results if tipe == "paket" for l in ls]
+        return product_lines, combo_lines, None
+
+    async def _move_cart_to_order_async(
+        self,
+        client: AsyncOlseraClient,
+        cart: list,
+        order_id: str,
+        access_token: str,
+        type_combos: bool = False,
+    ):
+        """Versi async dari move_cart_to_order, item tetap dimasukkan berurutan."""
+        if not cart:
+            logger.error("Cart kosong, tidak ada item untuk dipindahkan.")
+            return False, "Cart kosong, tidak ada item untuk dipindahkan."
 
-            max_luncur = max_luncur_dt.strftime("%H:%M")
-        except Exception as e:
-            max_luncur_menit = int(distance_and_time["duration_seconds"] / 60) + 20
-            max_luncur = (
-                datetime.now() + timedelta(minutes=max_luncur_menit)
-            ).strftime("%H:%M")
+        for item in cart:
+            try:
+                if type_combos:
+                    success, response = await acrud.add_combo_to_order(
+                        client,
+                        order_id=str(order_id),
+                        combo_id=str(item["prod_id"]),
+                        quantity=item["qty"],
+                        combo_items=item["items"],
+                        access_token=access_token,
+                    )
+                    if not success:
+                        return False, f"Gagal menambahkan paket {item['name']} ke order. Error: {response}"
+                else:
+                    print(f"Memasukkan {item['name']} ke dalam keranjang...")
+                    resp = await acrud.add_prod_to_order(
+                        client, order_id, item["prodvar_id"], item["qty"], access_token
+                    )
+                    if resp is None:
+                        continue
+            except Exception as e:
+                logger.error("Error saat menambahkan %s ke order: %s", item["name"], e)
+                return False, f"Gagal menambahkan {item['name']} ke order. Error: {e}"
 
-        max_luncur_line = (
-            f"MAKSIMAL DILUNCURKAN DARI GUDANG: {max_luncur}"
-            if reconfirm_json["jenis_pengiriman"] == "FD"
-            else f"ESTIMASI SAMPAI: {max_luncur}"
+        return True, "Semua item berhasil ditambahkan ke order."
+
+    async def handle_order_async(
+        self, query: str, access_token_dir: str, sudah_bayar: bool = False
+    ):
+        """
+        Versi async dari handle_order dengan hasil yang sama.
+
+        Notes dan resolve link Maps dari pesan mentah dibuat bersamaan dengan
+        reconfirm. Setelah reconfirm, langkah yang tidak saling bergantung dijalankan
+        bersamaan (dibatasi self.max_concurrency): sisa resolve alamat, cek
+        pelanggan, serta pencarian id dan fetch detail setiap baris pesanan. Order
+        dibuat begitu data pelanggan dan notes siap, jadi waktu sampai invoice
+        ditentukan jalur terpanjang, bukan jumlah semua langkah. Kalau ada baris
+        yang gagal, order di-void seperti di handle_order.
+
+        Dari kode sync: asyncio.run(agent.handle_order_async(query, token_dir)).
+        """
+        access_token = self._load_access_token(access_token_dir)
+        if not access_token:
+            logger.error("Access token terkena limit %s", access_token_dir)
+            return "Access token terkena limit."
+
+        print("Query diterima: %s", query)
+        # Pesan di-parse sekali, hasilnya dipakai notes, prefetch alamat, dan reconfirm
+        parse = parse_reconfirm(query)
+        notes_task = asyncio.create_task(asyncio.to_thread(self._generate_notes, query, parse))
+        address_prefetch = asyncio.create_task(
+            asyncio.to_thread(self._prefetch_address, query, parse)
         )
+        with stage("reconfirm"):
+            reconfirm_json = await asyncio.to_thread(self.reconfirm_translator, query, parse)
+        logger.debug("Hasil reconfirm: %s", reconfirm_json)
 
-        total_ftotal = order_details["data"].get("ftotal_amount", "")
+        if reconfirm_json.get("fallback"):
+            notes_task.cancel()
+            address_prefetch.cancel()
+            print(f"Error, format pesan tidak sesuai:", reconfirm_json["fallback"])
+            return reconfirm_json["fallback"]
 
-        status_lines = [pending_line.strip(), update_line.strip(), req_update_line.strip()]
-        status_lines = [line for line in status_lines if line]
-        distance_val = (
-            int(reconfirm_json["distance"])
-            if reconfirm_json["distance"] > 14
-            else round(reconfirm_json["distance"], 1)
+        void_msg = await asyncio.to_thread(
+            self._handle_void_request, reconfirm_json, access_token
         )
-        lokasi = f"{kelurahan}, {kecamatan.replace('Kecamatan ', '').replace('Kec. ', '').replace('kecamatan', '').replace('kec.', '')}"
+        if void_msg is not None:
+            notes_task.cancel()
+            address_prefetch.cancel()
+            return void_msg
 
+        error_prefix = f"[ERROR Pada Orderan {reconfirm_json.get('cust_name')}({reconfirm_json.get('phone_num')})]"
+        catalog = self.catalog.current()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
 
-        invoice_lines = [
-            *status_lines,
-            "",
-            f"Nama: {reconfirm_json.get('cust_name', '')}",
-            f"Nomor Telepon: {reconfirm_json.get('phone_num', '')}",
-            f"Alamat: {reconfirm_json.get('address', '')}",
-            "",
-            "",
-            max_luncur_line.strip(),
-            f"Jarak: {distance_val} km (*{lokasi}*)",
-            "",
-            "",
-            "Makasih yaa Cah udah Jajan di Babe!",
-            f"Total Jajan: {total_ftotal} (*{reconfirm_json.get('payment_type', '').upper()}*)",
-            f"Cek Jajanmu di sini: {struk_url or 'Gagal mencetak struk. Tolong ulangi.'}",
-            f"Jam Order: *{datetime.now().strftime('%H:%M')}*",
-            "",
-            "",
-            f"Jenis Pengiriman: {reconfirm_json.get('jenis_pengiriman', '')}",
-            f"*NOTES: {reconfirm_json.get('notes') or 'Tidak ada catatan tambahan.'}*",
-        ]
+        async def blocking(func, *args):
+            async with semaphore:
+                return await asyncio.to_thread(func, *args)
 
-        invoice = "\n".join([line for line in invoice_lines if line is not None])
-        print("Mengembalikan invoice: ")
-        print(invoice)
-        return invoice
+        async with AsyncOlseraClient() as client:
 
-    def add_discount(self, order_id, mode, access_token, discount=0, notes=""):
-        ord_dtl = fetch_order_details(order_id, access_token)
+            async def customer():
+                async with semaphore:
+                    kastamer = await acrud.cek_kastamer(
+                        client, reconfirm_json["phone_num"], access_token
+                    )
+                if kastamer is None:
+                    return None, reconfirm_json["cust_name"]
+                return kastamer[0], kastamer[1]
+
+            async def address():
+                prefetched = await address_prefetch
+                return await blocking(self._resolve_address, reconfirm_json, prefetched)
+
+            address_task = asyncio.create_task(timed("address", address()))
+            customer_task = asyncio.create_task(timed("customer", customer()))
+            lines_task = asyncio.create_task(
+                timed(
+                    "lines",
+                    self._resolve_lines_async(
+                        client,
+                        catalog,
+                        self._order_lines(reconfirm_json.get("ordered_products", []), reconfirm_json),
+                        access_token,
+                        semaphore,
+                    ),
+                )
+            )
+            pending = [address_task, notes_task, customer_task, lines_task]
+
+            def cancel_pending():
+                for task in pending:
+                    task.cancel()
+
+            # Ubah alamat
+            try:
+                alamat_cust, kelurahan, kecamatan, distance_and_time = await address_task
+            except Exception as e:
+                cancel_pending()
+                logger.error("Gagal resolve alamat: %s", reconfirm_json["address"])
+                return f"{error_prefix} Maaf be, aku gagal buka alamatnya 😅. Pastiin format alamatnya dalam bentuk link gini yaa: https://maps.app.goo.gl/XXX. Detail error: {e}"
+
+            if reconfirm_json["distance"] > 45:
+                cancel_pending()
+                logger.error("Jarak terlalu jauh: %s km", reconfirm_json["distance"])
+                return "Maaf, jarak pengiriman terlalu jauh. Silakan hubungi telemarketer untuk bantuan lebih lanjut."
+
+            # Ongkir baru bisa dicari setelah jarak diketahui. Namanya tetap, jadi
+            # dicocokkan ke katalog tanpa LLM dan pesanan tetap cukup satu panggilan
+            # pemilihan id (di lines_task)
+            ongkir_task = asyncio.create_task(
+                timed(
+                    "lines",
+                    self._resolve_lines_async(
+                        client,
+                        catalog,
+                        self._order_lines(
+                            self._ongkir_products(alamat_cust, reconfirm_json),
+                            reconfirm_json,
+                        ),
+                        access_token,
+                        semaphore,
+                        use_llm=False,
+                    ),
+                )
+            )
+            pending.append(ongkir_task)
+
+            try:
+                cust_id, cust_name = await customer_task
+            except Exception as e:
+                cancel_pending()
+                logger.error("Gagal cek atau buat customer: %s", e)
+                return f"{error_prefix} Maaf be, aku gagal memproses data pelanggannya. Ini detail errornya: {e}"
+            cust_telp = reconfirm_json["phone_num"]
+            notes_text = await notes_task
+
+            # Create order
+            today_str = datetime.now().strftime("%Y-%m-%d")
+            try:
+                with stage("order_create"):
+                    order_id, order_no = await acrud.create_order(
+                        client,
+                        order_date=today_str,
+                        customer_id=cust_id,
+                        nama_kastamer=cust_name,
+                        nomor_telepon=cust_telp,
+                        notes=notes_text,
+                        access_token=access_token,
+                    )
+                print(f"Order ID: {order_id}, Order No: {order_no}")
+                self._log_order(order_no, order_id)
+            except Exception as e:
+                cancel_pending()
+                logger.error("Gagal membuat order: %s", e)
+                return f"{error_prefix} Keknya masalah jaringan be, aku gagal membuat order baru. Coba lagi abis ini yaa, kalau masih error coba tanyakan ke developer. Errornya: {e}"
+
+            cart_temp_product, cart_temp_combo = [], []
+            for task in (lines_task, ongkir_task):
+                product_lines, combo_lines, failed = await task
+                if failed:
+                    cancel_pending()
+                    tipe, response = failed
+                    await acrud.update_status(client, order_id, "X", access_token)
+                    print("Response error:", response["msg"])
+                    if tipe == "item":
+                        return f"{error_prefix} Ada kesalahan saat menambahkan item, struk di-void. Error: {response['msg']}"
+                    return response["msg"]
+                cart_temp_product.extend(product_lines)
+                cart_temp_combo.extend(combo_lines)
+
+            # Auto add merch, sama seperti handle_order hasilnya tidak ikut dipindahkan ke order
+            total_amount = self._cart_total(cart_temp_product, cart_temp_combo)
+            merch_lines = [("item", "Cup Babe", 1 if total_amount < 100000 else 2)]
+            if total_amount > 150000 and total_amount < 250000:
+                merch_lines.append(("paket", "Merch Babe 1", 1))
+            elif total_amount >= 250000:
+                merch_lines.append(("paket", "Merch Babe 2", 1))
+            merch_task = asyncio.create_task(
+                timed(
+                    "merch",
+                    self._resolve_lines_async(
+                        client, catalog, merch_lines, access_token, semaphore, use_llm=False
+                    ),
+                )
+            )
+
+            print("Memproses data product ke keranjang...")
+            with stage("cart_move"):
+                cart_stat, msg = await self._move_cart_to_order_async(
+                    client, cart_temp_product, order_id, access_token
+                )
+                if cart_stat:
+                    print("Memproses data paket ke keranjang...")
+                    cart_stat, msg = await self._move_cart_to_order_async(
+                        client, cart_temp_combo, order_id, access_token, type_combos=True
+                    )
+            await asyncio.gather(merch_task, return_exceptions=True)
+            if not cart_stat:
+                logger.error("Gagal memindahkan cart ke order: %s", msg)
+                await acrud.update_status(client, order_id, "X", access_token)
+                return f"{error_prefix} Ada error, detailnya: {msg}"
+
+            # Tambahkan diskon
+            try:
+                with stage("discount"):
+                    disc_resp = await self.add_discount_async(
+                        client,
+                        order_id,
+                        mode=reconfirm_json["mode_diskon"],
+                        access_token=access_token,
+                        discount=reconfirm_json["disc"],
+                        notes="",
+                        semaphore=semaphore,
+                    )
+                if not disc_resp["success"]:
+                    logger.error("Gagal menambahkan diskon: %s", disc_resp["msg"])
+                    await acrud.update_status(client, order_id, "X", access_token)
+                    return f"{error_prefix} Terdapat kesalahan dalam pengecekan diskon: {disc_resp['msg']}"
+            except Exception as e:
+                logger.error("Gagal menambahkan diskon: %s", e)
+                await acrud.update_status(client, order_id, "X", access_token)
+                return f"{error_prefix} Maaf be, biasanya aku perlu ngecek dulu nominal diskon yang babe masukin (walaupun gak ada diskon sama sekali), tapi keknya ada yang error deh. Coba kirim ulang aja yaa, kalau masih error coba tanyakan ke developer. Errornya: {e}"
+
+            try:
+                with stage("order_detail"):
+                    order_details = await acrud.fetch_order_details(client, order_id, access_token)
+            except Exception as e:
+                logger.error(
+                    "Struk di voidkan karena kegagalan fetch detail order setelah tambah produk: %s",
+                    e,
+                )
+                await acrud.update_status(client, order_id, "X", access_token)
+                return f"{error_prefix} Maaf be, aku gagal mengambil detail order setelah memasukkan produk. Coba kirim ulang aja yaa, kalau masih error coba tanyakan ke developer. Errornya: {e}"
+
+            status = reconfirm_json.get("status", "").lower()
+            if sudah_bayar or status == "lunas":
+                try:
+                    with stage("payment"):
+                        payment_modes = await acrud.list_payment_modes(client, order_id, access_token)
+                        payment_id = self._payment_mode_id(
+                            payment_modes, reconfirm_json.get("payment_type", "")
+                        )
+                        if payment_id is not None:
+                            total_amount = int(float(order_details["data"]["total_amount"]))
+                            await acrud.update_payment(
+                                client,
+                                order_id=order_id,
+                                payment_amount=str(total_amount),
+                                payment_date=today_str,
+                                payment_mode_id=str(payment_id),
+                                access_token=access_token,
+                                payment_payee="Kevin Tes API Agent AI",
+                                payment_seq="0",
+                                payment_currency_id="IDR",
+                            )
+                            await acrud.update_status(client, order_id, "Z", access_token)
+                except Exception as e:
+                    logger.error("%s Gagal proses pembayaran: %s", error_prefix, e)
+
+        try:
+            struk_url = cetak_struk(order_no, cust_telp)
+        except Exception as e:
+            logger.error("Gagal cetak struk: %s", e)
+            struk_url = None
+
+        return self._build_invoice(
+            query,
+            reconfirm_json,
+            order_details,
+            struk_url,
+            kelurahan,
+            kecamatan,
+            distance_and_time,
+        )
+
+    def _discount_updates(self, ord_dtl: dict, mode: str, discount=0, notes=""):
+        """
+        Hitung diskon per item order, dibagi proporsional (mode "number") atau
+        persentase (mode "percentage").
+
+        Returns:
+        - (list (nama produk, kwargs update_order_detail), None), atau (None, dict error)
+        """
         id_order = ord_dtl["data"].get("id", 0)
         total_price = float(ord_dtl["data"].get("total_amount", 0))
         order_list = pd.DataFrame(ord_dtl["data"].get("orderitems", []))
         if order_list.empty:
             print("Tidak ada item dalam order, tidak bisa menambahkan diskon.")
-            return { 
+            return None, { 
                 "success" : False,
                 "msg" : "Tidak ada item dalam order ini, proses pengecekan diskon dilewatkan. Jika anda merasa sudah memasukkan item namun error ini muncul, kemungkinan besar item Anda gagal dimasukkan ke keranjang. Silakan coba lagi."
             }
@@ -1280,9 +2035,7 @@ class AgentBabe:
             drop=True
         )
 
-        success_count = 0
-        error_messages = []
-
+        updates = []
         for index, row in order_list.iterrows():
             item_id = row["id"]
             item_qty = row["qty"]
@@ -1316,26 +2069,23 @@ class AgentBabe:
             except Exception:
                 price_int = 0
 
-            try:
-                update_order_detail(
-                    order_id=str(id_order),
-                    id=str(item_id),
-                    disc=str(item_disc),
-                    price=str(price_int),
-                    qty=str(item_qty),
-                    note=notes,
-                    access_token=access_token,
+            updates.append(
+                (
+                    row["product_name"],
+                    dict(
+                        order_id=str(id_order),
+                        id=str(item_id),
+                        disc=str(item_disc),
+                        price=str(price_int),
+                        qty=str(item_qty),
+                        note=notes,
+                    ),
                 )
-                success_count += 1
-                # return True, f"Berhasil update diskon untuk item {row['product_name']} dengan diskon {item_disc}."
-
-            except Exception as e:
-                msg = f"Gagal update detail order untuk item {row['product_name']}: {e}"
-                print(msg)
-                error_messages.append(msg)
+            )
+        return updates, None
 
-        # Return di luar loop
-        if success_count == len(order_list):
+    def _discount_result(self, success_count: int, total: int, error_messages: list) -> dict:
+        if success_count == total:
             return {
                 "success": True,
                 "msg" : "Berhasil update diskon untuk semua item."
@@ -1350,3 +2100,61 @@ class AgentBabe:
                 "success": False,
                 "msg" : "Gagal update diskon untuk semua item."
             }
+
+    def add_discount(self, order_id, mode, access_token, discount=0, notes=""):
+        ord_dtl = fetch_order_details(order_id, access_token)
+        updates, error = self._discount_updates(ord_dtl, mode, discount, notes)
+        if error:
+            return error
+
+        success_count = 0
+        error_messages = []
+
+        for product_name, params in updates:
+            try:
+                update_order_detail(**params, access_token=access_token)
+                success_count += 1
+
+            except Exception as e:
+                msg = f"Gagal update detail order untuk item {product_name}: {e}"
+                print(msg)
+                error_messages.append(msg)
+
+        # Return di luar loop
+        return self._discount_result(success_count, len(updates), error_messages)
+
+    async def add_discount_async(
+        self,
+        client: AsyncOlseraClient,
+        order_id,
+        mode,
+        access_token,
+        discount=0,
+        notes="",
+        semaphore: asyncio.Semaphore = None,
+    ):
+        """Versi async dari add_discount, update diskon per item dikirim bersamaan."""
+        ord_dtl = await acrud.fetch_order_details(client, order_id, access_token)
+        updates, error = self._discount_updates(ord_dtl, mode, discount, notes)
+        if error:
+            return error
+
+        semaphore = semaphore or asyncio.Semaphore(self.max_concurrency)
+
+        async def update(params):
+            async with semaphore:
+                return await acrud.update_order_detail(client, **params, access_token=access_token)
+
+        results = await asyncio.gather(
+            *(update(params) for _, params in updates), return_exceptions=True
+        )
+        error_messages = []
+        for (product_name, _), result in zip(updates, results):
+            if isinstance(result, Exception):
+                msg = f"Gagal update detail order untuk item {product_name}: {result}"
+                print(msg)
+                error_messages.append(msg)
+
+        return self._discount_result(
+            len(updates) - len(error_messages), len(updates), error_messages
+        )
@@ -3,6 +3,7 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
+import os
 import time
 import requests
 import re
@@ -10,24 +11,36 @@ from datetime import datetime, timedelta
 import urllib.parse
 from math import ceil
 
+from modules.geo_cache import normalize_address, normalize_shortlink
+
+# Bisa diarahkan ke server tiruan (fake_olsera_server.py) untuk benchmark lokal
+GMAPS_BASE_URL = os.getenv("GMAPS_BASE_URL", "https://maps.googleapis.com")
+
 instan_siang =  [25, 25, 25, 30, 30, 35, 35, 40, 40, 45, 50, 55, 55, 55, 55, 55, 55, 65, 65, 75]
 express_siang = [20, 20, 20, 25, 25, 25, 30, 30, 30, 35, 45, 45, 45, 45, 50, 50, 50, 50, 50, 60]
 
 instan_malam =  [20, 20, 25, 30, 30, 30, 35, 35, 35, 45, 45, 45, 50, 50, 50, 55, 55, 60, 60, 70]
 express_malam = [15, 15, 15, 25, 25, 25, 25, 25, 25, 40, 40, 40, 40, 45, 50, 50, 50, 50, 50, 60]
 
-def address_to_latlng(address, api_key):
+def address_to_latlng(address, api_key, cache=None):
     """
     Mengubah alamat menjadi koordinat latitude dan longitude menggunakan Google Maps Geocoding API.
     
     Params:
     - address: str, alamat seperti "Jl. Sudirman, Jakarta"
     - api_key: str, API key Google Maps
+    - cache: GeoCache opsional, alamat yang pernah berhasil di-geocode tidak dipanggil ulang
 
     Returns:
     - (lat, lng): tuple of float, atau (None, None) jika gagal
     """
-    base_url = "https://maps.googleapis.com/maps/api/geocode/json"
+    key = normalize_address(address)
+    if cache is not None:
+        cached = cache.get("address", key)
+        if cached is not None:
+            return tuple(cached)
+
+    base_url = f"{GMAPS_BASE_URL}/maps/api/geocode/json"
     params = {
         "address": address,
         "key": api_key
@@ -43,6 +56,8 @@ def address_to_latlng(address, api_key):
     lat = location["lat"]
     lng = location["lng"]
 
+    if cache is not None:
+        cache.set("address", key, [lat, lng])
     return lat, lng
 
 
@@ -160,11 +175,27 @@ def address_to_latlng(address, api_key):
 #         elif "administrative_area_level_1" in types:
 #             provinsi = comp.get("long_name")
 
-def resolve_maps_shortlink(shortlink, api_key, timeout=10):
+def resolve_maps_shortlink(shortlink, api_key, timeout=10, cache=None):
+    """
+    cache: GeoCache opsional. Redirect shortlink dan hasil geocode URL akhirnya
+    disimpan terpisah, jadi link yang sama (atau shortlink lain ke tempat yang sama)
+    tidak perlu request ulang.
+    """
     try:
         # --- Step 1: Expand shortlink dengan follow redirect ---
-        resp = requests.get(shortlink, allow_redirects=True, timeout=timeout)
-        final_url = resp.url
+        link_key = normalize_shortlink(shortlink)
+        final_url = cache.get("shortlink", link_key) if cache is not None else None
+        if final_url is None:
+            resp = requests.get(shortlink, allow_redirects=True, timeout=timeout)
+            final_url = resp.url
+            if cache is not None:
+                cache.set("shortlink", link_key, final_url)
+
+        if cache is not None:
+            cached = cache.get("place", final_url)
+            if cached is not None:
+                formatted_address, latlng, *area = cached
+                return (formatted_address, tuple(latlng), *area)
 
         # --- Step 2: Extract place name dari URL ---
         place_match = re.search(r'/maps/place/([^/]+)', final_url)
@@ -184,10 +215,10 @@ def resolve_maps_shortlink(shortlink, api_key, timeout=10):
 
         # --- Step 4: Geocoding API ---
         if lat is not None and lng is not None:
-            endpoint = f"https://maps.googleapis.com/maps/api/geocode/json?latlng={lat},{lng}&key={api_key}"
+            endpoint = f"{GMAPS_BASE_URL}/maps/api/geocode/json?latlng={lat},{lng}&key={api_key}"
         elif place_name:
             addr = urllib.parse.quote_plus(place_name)
-            endpoint = f"https://maps.googleapis.com/maps/api/geocode/json?address={addr}&key={api_key}"
+            endpoint = f"{GMAPS_BASE_URL}/maps/api/geocode/json?address={addr}&key={api_key}"
         else:
             return None, None, None, None, None, None, None
 
@@ -211,6 +242,12 @@ def resolve_maps_shortlink(shortlink, api_key, timeout=10):
             if "administrative_area_level_1" in types:
                 provinsi = comp.get("long_name")
 
+        if cache is not None:
+            cache.set(
+                "place",
+                final_url,
+                [formatted_address, [lat, lng], kelurahan, kecamatan, kota, provinsi],
+            )
         return formatted_address, (lat, lng), kelurahan, kecamatan, kota, provinsi
 
     except Exception as e:
@@ -260,10 +297,10 @@ def _resolve_maps_shortlink(shortlink, api_key, timeout=10):
 
     # --- Step 4: Geocoding API ---
     if lat is not None and lng is not None:
-        endpoint = f"https://maps.googleapis.com/maps/api/geocode/json?latlng={lat},{lng}&key={api_key}"
+        endpoint = f"{GMAPS_BASE_URL}/maps/api/geocode/json?latlng={lat},{lng}&key={api_key}"
     elif place_name:
         addr = urllib.parse.quote_plus(place_name)
-        endpoint = f"https://maps.googleapis.com/maps/api/geocode/json?address={addr}&key={api_key}"
+        endpoint = f"{GMAPS_BASE_URL}/maps/api/geocode/json?address={addr}&key={api_key}"
     else:
         return None, None, None, None, None, None, None
 
@@ -289,13 +326,22 @@ def _resolve_maps_shortlink(shortlink, api_key, timeout=10):
 
     return formatted_address, (lat, lng), kelurahan, kecamatan, kota, provinsi
 
-def get_travel_distance(origin, destination, api_key, mode="driving"):
+def get_travel_distance(origin, destination, api_key, mode="driving", cache=None):
     """
     origin: tuple (lat1, lng1)
     destination: tuple (lat2, lng2)
     mode: driving, walking, bicycling, transit
+    cache: GeoCache opsional, tujuan dibulatkan ke sel geohash per kelompok jam
     """
-    base_url = "https://maps.googleapis.com/maps/api/distancematrix/json"
+    key = None
+    if cache is not None:
+        key = cache.distance_key(origin, destination, mode)
+        cached = cache.get_distance(key)
+        if cached is not None:
+            return cached
+
+    started = time.perf_counter()
+    base_url = f"{GMAPS_BASE_URL}/maps/api/distancematrix/json"
 
     params = {
         "origins": f"{origin[0]},{origin[1]}",
@@ -319,12 +365,15 @@ def get_travel_distance(origin, destination, api_key, mode="driving"):
     duration_text = row["duration"]["text"]
     duration_seconds = row["duration"]["value"]
 
-    return {
+    result = {
         "distance_text": distance_text,
         "distance_meters": distance_meters,
         "duration_text": duration_text,
         "duration_seconds": duration_seconds
     }
+    if cache is not None:
+        cache.set_distance(key, result, time.perf_counter() - started, destination=list(destination))
+    return result
 
 def get_fastest_route_details(origin, destination, api_key, mode="driving"):
     """
@@ -350,7 +399,7 @@ def get_fastest_route_details(origin, destination, api_key, mode="driving"):
               }
     """
     # Gunakan endpoint Directions API
-    base_url = "https://maps.googleapis.com/maps/api/directions/json"
+    base_url = f"{GMAPS_BASE_URL}/maps/api/directions/json"
 
     params = {
         "origin": f"{origin[0]},{origin[1]}",
@@ -0,0 +1,129 @@
+import datetime
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import google.generativeai as genai
+from google.generativeai import caching
+
+logger = logging.getLogger(__name__)
+
+
+class GeminiModelPool:
+    """
+    Kumpulan GenerativeModel yang dipakai ulang, satu per (model, system_instruction).
+
+    Membuat GenerativeModel baru di setiap panggilan berarti menyusun ulang objek
+    prompt dan client-nya tiap kali; di sini model dibuat sekali lalu dipakai oleh
+    semua thread.
+
+    System instruction yang ada di cached_instructions disimpan di server lewat
+    context caching Gemini, jadi prompt panjang seperti reconfirm_translator_prompt
+    tidak ikut dikirim sebagai input token di setiap request. Cache dibuat saat
+    pertama dipakai dan diperbarui sebelum ttl-nya habis. Kalau pembuatan cache
+    gagal (misal prompt terlalu pendek untuk minimum token caching, atau model tidak
+    mendukung), model biasa yang dipakai.
+
+    Pembuatan model (termasuk request context cache ke server) berjalan di luar lock
+    pool: request lain untuk key yang sama menunggu Future pembuatnya, atau memakai
+    model lama kalau yang sedang dibuat hanya pembaruan cache. Pool dibatasi
+    max_models key; yang paling lama tidak dipakai dibuang (LRU).
+    """
+
+    def __init__(
+        self,
+        model_names: dict,
+        cached_instructions: list = (),
+        cache_ttl: float = 3600,
+        max_models: int = 64,
+    ):
+        self.model_names = model_names
+        self.cached_instructions = set(cached_instructions)
+        self.cache_ttl = cache_ttl
+        self.max_models = max_models
+        # key -> (model, waktu kedaluwarsa context cache atau None)
+        self._models = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def warm(self, instructions, model: str = "flash"):
+        """Bangun model untuk setiap system instruction di awal (tanpa context cache)."""
+        for instruction in instructions:
+            if instruction not in self.cached_instructions:
+                self.get(instruction, model)
+
+    def get(self, system_instruction: str, model: str = "flash"):
+        key = (model, system_instruction)
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                self._models.move_to_end(key)
+                handle, expiry = entry
+                if expiry is None or time.time() < expiry:
+                    return handle
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pending[key] = Future()
+                owner = True
+            else:
+                owner = False
+                if entry is not None:
+                    # Cache lama masih hidup di server sampai ttl penuh
+                    return entry[0]
+
+        if not owner:
+            return future.result()
+
+        try:
+            handle, expiry = self._build(key)
+        except BaseException as e:
+            with self._lock:
+                self._pending.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._models[key] = (handle, expiry)
+            self._models.move_to_end(key)
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+            self._pending.pop(key, None)
+        future.set_result(handle)
+        return handle
+
+    def _build(self, key):
+        """Returns (model, waktu kedaluwarsa context cache atau None)."""
+        model, system_instruction = key
+        if system_instruction in self.cached_instructions:
+            cached = self._from_context_cache(key)
+            if cached is not None:
+                return cached
+        handle = genai.GenerativeModel(
+            model_name=self.model_names[model],
+            system_instruction=system_instruction,
+        )
+        return handle, None
+
+    def _from_context_cache(self, key):
+        model, system_instruction = key
+        try:
+            cached = caching.CachedContent.create(
+                model=f"models/{self.model_names[model]}",
+                display_name=f"agent-babe-{model}-{abs(hash(system_instruction)) % 10**8}",
+                system_instruction=system_instruction,
+                ttl=datetime.timedelta(seconds=self.cache_ttl),
+            )
+        except Exception as e:
+            logger.warning("Context cache tidak bisa dibuat, pakai model biasa: %s", e)
+            with self._lock:
+                self.cached_instructions.discard(system_instruction)
+            return None
+
+        logger.info("Context cache dibuat: %s", cached.name)
+        # Diperbarui sedikit sebelum cache di server kedaluwarsa
+        return (
+            genai.GenerativeModel.from_cached_content(cached),
+            time.time() + self.cache_ttl * 0.9,
+        )
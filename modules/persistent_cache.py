@@ -0,0 +1,145 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class PersistentCache:
+    """
+    Cache key-value di SQLite yang tetap ada setelah proses restart dan bisa dibagi
+    antar proses (app.py, worker, script lain) lewat satu file.
+
+    Satu file bisa berisi beberapa cache yang dibedakan dengan namespace. Value
+    disimpan sebagai JSON. Entri yang umurnya lewat ttl detik dianggap tidak ada,
+    dan kalau jumlah entri melebihi max_entries, entri yang paling lama tidak dipakai
+    dihapus (LRU). Pembersihan dijalankan setiap prune_every kali set().
+    """
+
+    def __init__(
+        self,
+        path: str,
+        namespace: str = "default",
+        max_entries: int = 10000,
+        ttl: float = None,
+        prune_every: int = 100,
+    ):
+        self.path = path
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.prune_every = prune_every
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cache (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS cache_lru ON cache (namespace, last_used)"
+            )
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl is not None and now - created_at > self.ttl
+
+    def get(self, key: str):
+        """Returns value yang tersimpan, atau None kalau tidak ada/kedaluwarsa."""
+        now = time.time()
+        try:
+            with self._lock, self._conn:
+                row = self._conn.execute(
+                    "SELECT value, created_at FROM cache WHERE namespace = ? AND key = ?",
+                    (self.namespace, key),
+                ).fetchone()
+                if row is None:
+                    return None
+                if self._expired(row[1], now):
+                    self._conn.execute(
+                        "DELETE FROM cache WHERE namespace = ? AND key = ?",
+                        (self.namespace, key),
+                    )
+                    return None
+                self._conn.execute(
+                    "UPDATE cache SET last_used = ? WHERE namespace = ? AND key = ?",
+                    (now, self.namespace, key),
+                )
+            return json.loads(row[0])
+        except sqlite3.Error as e:
+            logger.error("Gagal membaca cache %s: %s", self.namespace, e)
+            return None
+
+    def set(self, key: str, value):
+        now = time.time()
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)",
+                    (self.namespace, key, json.dumps(value, default=str), now, now),
+                )
+                self._writes += 1
+                prune = self._writes % self.prune_every == 0
+            if prune:
+                self.prune()
+        except sqlite3.Error as e:
+            logger.error("Gagal menulis cache %s: %s", self.namespace, e)
+
+    def delete(self, *keys: str):
+        try:
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "DELETE FROM cache WHERE namespace = ? AND key = ?",
+                    [(self.namespace, key) for key in keys],
+                )
+        except sqlite3.Error as e:
+            logger.error("Gagal menghapus cache %s: %s", self.namespace, e)
+
+    def items(self) -> list:
+        """Semua (key, value) di namespace ini, termasuk yang mungkin sudah kedaluwarsa."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, value FROM cache WHERE namespace = ?", (self.namespace,)
+            ).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def prune(self):
+        """Hapus entri kedaluwarsa lalu entri LRU yang melebihi max_entries."""
+        try:
+            with self._lock, self._conn:
+                if self.ttl is not None:
+                    self._conn.execute(
+                        "DELETE FROM cache WHERE namespace = ? AND created_at < ?",
+                        (self.namespace, time.time() - self.ttl),
+                    )
+                self._conn.execute(
+                    """
+                    DELETE FROM cache WHERE namespace = ? AND key NOT IN (
+                        SELECT key FROM cache WHERE namespace = ?
+                        ORDER BY last_used DESC LIMIT ?
+                    )
+                    """,
+                    (self.namespace, self.namespace, self.max_entries),
+                )
+        except sqlite3.Error as e:
+            logger.error("Gagal membersihkan cache %s: %s", self.namespace, e)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM cache WHERE namespace = ?", (self.namespace,)
+            ).fetchone()[0]
@@ -0,0 +1,210 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows, limiter lintas proses tidak tersedia
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Token bucket untuk membatasi request ke API.
+
+    Request hanya ditunda kalau token di bucket sudah habis, jadi selama pemakaian
+    masih di bawah limit tidak ada delay sama sekali. Saat API membalas 429,
+    throttled() mengosongkan bucket, menahan request sampai Retry-After lewat, dan
+    menurunkan rate (multiplicative decrease). Setiap request yang sukses menaikkan
+    rate kembali sedikit demi sedikit sampai rate awal (additive increase).
+    """
+
+    # True kalau penyimpanan state melakukan I/O yang memblokir (FileTokenBucket);
+    # versi async method-method ini lalu dijalankan di thread, bukan di event loop
+    blocking = False
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float = None,
+        min_rate: float = None,
+        recovery_step: float = None,
+    ):
+        self.base_rate = rate
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.min_rate = min_rate or rate / 8
+        self.recovery_step = recovery_step or rate / 20
+
+        self._lock = threading.Lock()
+        self._state = {
+            "tokens": self.capacity,
+            "updated": time.time(),
+            "blocked_until": 0.0,
+            "rate": rate,
+        }
+
+    # Penyimpanan state, di-override FileTokenBucket supaya bisa dibagi lintas proses
+    def _load_state(self) -> dict:
+        return self._state
+
+    def _save_state(self, state: dict):
+        self._state = state
+
+    def _locked(self):
+        return self._lock
+
+    def _refill(self, state: dict, now: float):
+        elapsed = max(0.0, now - state["updated"])
+        state["tokens"] = min(self.capacity, state["tokens"] + elapsed * state["rate"])
+        state["updated"] = now
+
+    def _reserve(self, tokens: float) -> float:
+        """Ambil token kalau tersedia. Returns lama tunggu (detik), 0 kalau berhasil."""
+        with self._locked():
+            state = self._load_state()
+            now = time.time()
+            self._refill(state, now)
+
+            wait = state["blocked_until"] - now
+            if wait <= 0 and state["tokens"] >= tokens:
+                state["tokens"] -= tokens
+                self._save_state(state)
+                self.rate = state["rate"]
+                return 0.0
+
+            if wait <= 0:
+                wait = (tokens - state["tokens"]) / state["rate"]
+            self._save_state(state)
+            return wait
+
+    def acquire(self, tokens: float = 1.0):
+        """Ambil token, tidur hanya selama yang dibutuhkan kalau bucket kosong."""
+        while True:
+            wait = self._reserve(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def _run(self, func, *args):
+        if self.blocking:
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+
+    async def acquire_async(self, tokens: float = 1.0):
+        """Sama seperti acquire(), tapi menunggu dengan asyncio.sleep."""
+        while True:
+            wait = await self._run(self._reserve, tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    async def succeeded_async(self):
+        await self._run(self.succeeded)
+
+    async def throttled_async(self, retry_after: float = None):
+        await self._run(self.throttled, retry_after)
+
+    def succeeded(self):
+        with self._locked():
+            state = self._load_state()
+            if state["rate"] < self.base_rate:
+                state["rate"] = min(self.base_rate, state["rate"] + self.recovery_step)
+                self._save_state(state)
+            self.rate = state["rate"]
+
+    def throttled(self, retry_after: float = None):
+        """Dipanggil saat API membalas 429."""
+        with self._locked():
+            state = self._load_state()
+            now = time.time()
+            state["rate"] = max(self.min_rate, state["rate"] / 2)
+            state["tokens"] = 0.0
+            state["updated"] = now
+            state["blocked_until"] = max(
+                state["blocked_until"], now + (retry_after or 1.0 / state["rate"])
+            )
+            self._save_state(state)
+            self.rate = state["rate"]
+        logger.warning(
+            "Rate limit terkena, rate diturunkan ke %.2f req/s (tunggu %.1fs)",
+            self.rate,
+            retry_after or 1.0 / self.rate,
+        )
+
+
+class _FileLock:
+    def __init__(self, thread_lock: threading.Lock, path: str):
+        self.thread_lock = thread_lock
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        self._fd = open(self.path, "a+")
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._fd.close()
+        self.thread_lock.release()
+
+
+class FileTokenBucket(TokenBucket):
+    """
+    TokenBucket yang state-nya disimpan di file dan dikunci dengan flock, sehingga
+    app.py, worker_db.py, dan void_order.py berbagi satu budget request ke Olsera.
+    Kalau fcntl tidak tersedia, otomatis jadi limiter per proses.
+    """
+
+    def __init__(self, path: str, rate: float, **kwargs):
+        super().__init__(rate, **kwargs)
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        if fcntl is None:
+            logger.warning("fcntl tidak tersedia, rate limiter hanya berlaku per proses.")
+        else:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            # flock dan baca/tulis file tidak boleh menahan event loop
+            self.blocking = True
+
+    def _locked(self):
+        if fcntl is None:
+            return self._lock
+        return _FileLock(self._lock, self.lock_path)
+
+    def _load_state(self) -> dict:
+        if fcntl is None:
+            return self._state
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return dict(self._state)
+
+    def _save_state(self, state: dict):
+        if fcntl is None:
+            self._state = state
+            return
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+
+
+def limiter_from_env(prefix: str = "OLSERA") -> TokenBucket:
+    """
+    Buat limiter dari environment:
+    - <prefix>_RATE_PER_SEC (default 2), <prefix>_RATE_BURST (default 5)
+    - <prefix>_RATE_LIMIT_FILE, kalau diisi limiter dibagi lintas proses lewat file ini
+    """
+    rate = float(os.getenv(f"{prefix}_RATE_PER_SEC", "2"))
+    burst = float(os.getenv(f"{prefix}_RATE_BURST", "5"))
+    path = os.getenv(f"{prefix}_RATE_LIMIT_FILE")
+    if path:
+        return FileTokenBucket(path, rate, capacity=burst)
+    return TokenBucket(rate, capacity=burst)
@@ -0,0 +1,343 @@
+import re
+
+# Nama field di template RECONFIRM JAJAN (sudah dinormalisasi) -> key internal
+FIELD_ALIASES = {
+    "nama": "nama",
+    "nama pelanggan": "nama",
+    "nomor telepon": "telepon",
+    "nomor telp": "telepon",
+    "nomor hp": "telepon",
+    "no telepon": "telepon",
+    "no telp": "telepon",
+    "no hp": "telepon",
+    "no wa": "telepon",
+    "telepon": "telepon",
+    "telp": "telepon",
+    "hp": "telepon",
+    "wa": "telepon",
+    "produk": "produk",
+    "alamat": "alamat",
+    "payment": "payment",
+    "pembayaran": "payment",
+    "tukar voucher": "voucher",
+    "tuker voucher": "voucher",
+    "voucher": "voucher",
+    "notes": "notes",
+    "note": "notes",
+    "catatan": "notes",
+    "disc": "disc",
+    "diskon": "disc",
+    "pengiriman": "pengiriman",
+    "cc": "cc",
+}
+REQUIRED_FIELDS = ("nama", "telepon", "produk", "alamat", "payment")
+
+PAYMENT_TYPES = {"bca": "BCA", "bri": "BRI", "cash": "Cash", "qris": "QRIS", "hutang": "Hutang"}
+DELIVERY_TYPES = {"fd": "FD", "i": "I", "instant": "I", "ex": "EX", "express": "EX"}
+DELIVERY_PRODUCTS = {"I": "Instant Delivery", "EX": "Express Delivery!!"}
+GARANSI_PRODUCT = "Babe Garansi-in!!!"
+FREE_INSTANT_PRODUCT = "Tukar Voc Instant dari Babe!"
+
+# Tambahan waktu (menit) karena kondisi lapangan, sesuai prompt reconfirm
+DELAY_MINUTES = {"hujan": 5, "macet": 5, "etj": 15, "numpuk": 10}
+
+# Diskon bernama yang nilainya 100%
+FULL_DISCOUNTS = ("atensi", "giveaway", "komplimen", "kol", "media partner", "ngacara", "rnd")
+
+TRAILER_WORDS = {"fd", "i", "ex", "lunas", "pending", "update-struk", "req-update"}
+EMPTY_VALUES = {"", "-", "--", "tidak ada", "ga ada", "gak ada", "nggak ada", "none", "kosong"}
+
+# Bobot ketidakpastian: HARD langsung menjatuhkan confidence ke 0
+HARD, SOFT = 1.0, 0.2
+
+_PRODUCT_TAG = re.compile(
+    r"\(\s*(?:(\d+)\s*(?:x|pcs|buah|botol)?\s*)?(item|paket)\s*(?:(\d+)\s*)?\)\s*(\d+)?\s*$",
+    re.IGNORECASE,
+)
+_URL = re.compile(r"https?://\S+")
+_LEADING_QTY = re.compile(r"^(\d+)\s*(?:x|pcs|buah|botol|btl)?\s+", re.IGNORECASE)
+_LEADING_QTY_UNIT = re.compile(r"^(\d+)\s*(?:x|pcs|buah|botol|btl)\s+", re.IGNORECASE)
+
+
+def _normalize_key(key: str) -> str:
+    return " ".join(re.sub(r"[^a-z ]+", " ", key.lower()).split())
+
+
+def _is_empty(value: str) -> bool:
+    return value is None or value.strip().lower() in EMPTY_VALUES
+
+
+def normalize_phone(raw: str):
+    """Normalisasi nomor telepon ke format 08XXXXXX. Returns None kalau tidak valid."""
+    digits = re.sub(r"\D", "", raw or "")
+    if digits.startswith("62"):
+        digits = "0" + digits[2:]
+    elif digits.startswith("8"):
+        digits = "0" + digits
+    if not digits.startswith("08") or not 10 <= len(digits) <= 14:
+        return None
+    return digits
+
+
+def _split_fields(message: str):
+    """
+    Pisahkan pesan jadi field "Key: value". Baris tanpa key tepat setelah sebuah field
+    dianggap lanjutan field itu; baris kosong mengakhirinya.
+
+    Returns:
+    - (dict field, list baris sebelum header, list baris penutup)
+    """
+    fields, preamble, trailer = {}, [], []
+    current = None
+    seen_header = False
+    for raw_line in message.strip().splitlines():
+        line = raw_line.strip()
+        if not seen_header:
+            if "reconfirm" in line.lower():
+                seen_header = True
+                cc_prefix = line.lower().split("reconfirm")[0].strip()
+                if cc_prefix:
+                    fields.setdefault("cc_prefix", cc_prefix.upper())
+            elif line:
+                preamble.append(line)
+            continue
+
+        if not line:
+            current = None
+            continue
+
+        key, sep, value = line.partition(":")
+        field = FIELD_ALIASES.get(_normalize_key(key)) if sep else None
+        if field:
+            fields[field] = value.strip()
+            current = field
+        elif current:
+            fields[current] = f"{fields[current]}\n{line}"
+        else:
+            trailer.append(line)
+    return fields, preamble, trailer, seen_header
+
+
+def _parse_product(segment: str, issues: list):
+    match = _PRODUCT_TAG.search(segment)
+    if not match:
+        issues.append((HARD, f"produk tanpa (item)/(paket): {segment}"))
+        return None
+
+    qty_inside, tipe, qty_inside_after, qty_after = match.groups()
+    name = segment[: match.start()].strip(" -")
+    qty = qty_inside or qty_inside_after or qty_after
+    tipe = "Item" if tipe.lower() == "item" else "Paket"
+
+    if qty is None:
+        # "3 botol Anggur Merah (Item)". Untuk paket angka di depan bisa bagian nama,
+        # jadi hanya dianggap jumlah kalau ada satuannya ("2 buah ...")
+        leading = (_LEADING_QTY if tipe == "Item" else _LEADING_QTY_UNIT).match(name)
+        if leading:
+            qty = leading.group(1)
+            name = name[leading.end():].strip()
+    if not name:
+        issues.append((HARD, f"nama produk kosong: {segment}"))
+        return None
+    return {"tipe": tipe, "produk": name, "quantity": int(qty) if qty else 1}
+
+
+def _parse_disc(value: str, issues: list):
+    """Returns (mode_diskon, disc)."""
+    if _is_empty(value):
+        return "percentage", 0.0
+    lower = value.lower().strip()
+    if any(name in lower for name in FULL_DISCOUNTS):
+        if "komplimen" in lower and "diskon" not in lower and "disc" not in lower:
+            # "Komplimen" tanpa kata diskon bukan diskon 100%, biar LLM yang putuskan
+            issues.append((HARD, f"diskon ambigu: {value}"))
+            return "percentage", 0.0
+        return "percentage", 1.0
+
+    match = re.fullmatch(r"(\d+(?:[.,]\d+)?)\s*%", lower)
+    if match:
+        return "percentage", float(match.group(1).replace(",", ".")) / 100
+
+    match = re.fullmatch(r"(?:rp\.?\s*)?(\d+(?:[.,]\d{3})*)\s*(k|rb|ribu)?", lower)
+    if match:
+        amount = float(re.sub(r"[.,]", "", match.group(1)))
+        if match.group(2):
+            amount *= 1000
+        return "number", amount
+
+    issues.append((HARD, f"format diskon tidak dikenali: {value}"))
+    return "percentage", 0.0
+
+
+def _parse_notes(notes: str, issues: list):
+    """
+    Ambil item tambahan (es batu, cup, nitip/request jagoan) dan tambahan waktu dari notes.
+
+    Returns:
+    - (list produk tambahan, tambahan waktu dalam menit)
+    """
+    products, delay = [], 0
+    if _is_empty(notes):
+        return products, delay
+
+    for segment in re.split(r"[,;\n]", notes):
+        lower = segment.strip().lower()
+        if not lower:
+            continue
+        qty_match = re.search(r"\d+", lower)
+        qty = int(qty_match.group()) if qty_match else 1
+
+        if re.search(r"\b(nitip|titip)\b", lower):
+            products.append({"tipe": "Item", "produk": "Nitip ke Jagoane Babe", "quantity": 1})
+        elif re.search(r"\b(req|request)\b.*\bjagoan", lower):
+            products.append({"tipe": "Item", "produk": "Request Jagoane Babe", "quantity": 1})
+        elif "es batu" in lower:
+            products.append({"tipe": "Item", "produk": "Es Batu", "quantity": qty})
+        elif re.search(r"\bcup\b", lower):
+            products.append({"tipe": "Item", "produk": "Cup Babe", "quantity": qty})
+        elif re.search(r"\b(stiker|sticker)\b", lower):
+            pass
+        elif lower in DELAY_MINUTES or lower in ("outsource etj",):
+            delay += DELAY_MINUTES[lower.split()[-1]]
+        elif "rokok" in lower:
+            issues.append((HARD, f"permintaan rokok perlu dipetakan LLM: {segment.strip()}"))
+        elif any(word in lower for word in DELAY_MINUTES):
+            delay += sum(minutes for word, minutes in DELAY_MINUTES.items() if word in lower)
+            issues.append((SOFT, f"kondisi lapangan di notes: {segment.strip()}"))
+        elif qty_match:
+            # Catatan bebas yang ada angkanya bisa saja permintaan item tambahan
+            issues.append((SOFT, f"notes tidak dikenali: {segment.strip()}"))
+    return products, delay
+
+
+def parse_reconfirm(message: str):
+    """
+    Parser berbasis aturan untuk pesan RECONFIRM JAJAN yang formatnya rapi.
+
+    Mengisi skema JSON yang sama dengan reconfirm_translator_prompt: produk dengan
+    tag (N item)/(N paket), normalisasi nomor telepon, item delivery sesuai FD/I/EX
+    (garansi untuk FD), tukar voucher, diskon, dan tambahan waktu
+    hujan/macet/ETJ/numpuk. Setiap hal yang tidak pasti menurunkan confidence;
+    pesan pembatalan, format yang tidak rapi, atau field wajib yang hilang
+    confidence-nya 0 dan harus diserahkan ke LLM.
+
+    Returns:
+    - (dict hasil parse atau None, confidence 0..1, list alasan ketidakpastian)
+    """
+    issues = []
+    lower = message.lower()
+    if re.search(r"\b(batal\w*|void\w*|kosong\w*)\b", lower) and "reconfirm" not in lower:
+        return None, 0.0, ["permintaan pembatalan"]
+
+    fields, preamble, trailer, seen_header = _split_fields(message)
+    if not seen_header:
+        return None, 0.0, ["header RECONFIRM tidak ditemukan"]
+    missing = [f for f in REQUIRED_FIELDS if _is_empty(fields.get(f))]
+    if missing:
+        return None, 0.0, [f"field wajib kosong: {', '.join(missing)}"]
+    if preamble:
+        issues.append((SOFT, f"teks sebelum header: {' '.join(preamble)}"))
+
+    phone = normalize_phone(fields["telepon"])
+    if phone is None:
+        issues.append((HARD, f"nomor telepon tidak valid: {fields['telepon']}"))
+
+    products = []
+    for segment in re.split(r"[;\n]|,(?![^()]*\))", fields["produk"]):
+        if segment.strip():
+            product = _parse_product(segment.strip(), issues)
+            if product:
+                products.append(product)
+
+    payment = PAYMENT_TYPES.get(fields["payment"].strip().lower().split()[0], "Cash")
+    mode_diskon, disc = _parse_disc(fields.get("disc"), issues)
+
+    # Jenis pengiriman dari field Pengiriman, atau dari baris penutup ("EX, lunas")
+    trailer_words = [w for line in trailer for w in re.split(r"[\s,]+", line.lower()) if w]
+    pengiriman = fields.get("pengiriman")
+    if _is_empty(pengiriman):
+        hinted = [DELIVERY_TYPES[w] for w in trailer_words if w in DELIVERY_TYPES]
+        jenis_pengiriman = hinted[0] if hinted else "FD"
+    else:
+        jenis_pengiriman = DELIVERY_TYPES.get(pengiriman.strip().lower())
+        if jenis_pengiriman is None:
+            issues.append((HARD, f"jenis pengiriman tidak dikenali: {pengiriman}"))
+            jenis_pengiriman = "FD"
+    unknown_trailer = [w for w in trailer_words if w not in TRAILER_WORDS]
+    if unknown_trailer:
+        issues.append((SOFT, f"teks penutup tidak dikenali: {' '.join(unknown_trailer)}"))
+
+    notes = "" if _is_empty(fields.get("notes")) else fields["notes"].replace("\n", ", ")
+    note_products, tambahan_waktu = _parse_notes(notes, issues)
+    # Item "Nitip ke Jagoane Babe" cukup sekali; barang titipannya hanya ditulis di notes
+    has_nitip = any("nitip" in p["produk"].lower() for p in products)
+    products.extend(
+        p for p in note_products if not (has_nitip and p["produk"] == "Nitip ke Jagoane Babe")
+    )
+
+    # Tukar voucher: free instant mengganti item delivery, voucher lain jadi paket
+    voucher = None if _is_empty(fields.get("voucher")) else fields["voucher"].strip()
+    free_instant = voucher is not None and "instant" in voucher.lower()
+    if voucher and not free_instant:
+        products.append({"tipe": "Paket", "produk": f"Tukar Voucher {voucher}", "quantity": 1})
+    if voucher:
+        notes = ", ".join(filter(None, [notes, f"Tukar Voucher {voucher} (Item)"]))
+
+    has_garansi = any("garansi" in p["produk"].lower() for p in products)
+    if free_instant:
+        jenis_pengiriman = "I"
+        products.append({"tipe": "Paket", "produk": FREE_INSTANT_PRODUCT, "quantity": 1})
+    elif jenis_pengiriman == "FD":
+        if not has_garansi:
+            products.append({"tipe": "Paket", "produk": GARANSI_PRODUCT, "quantity": 1})
+    else:
+        products.append(
+            {"tipe": "Paket", "produk": DELIVERY_PRODUCTS[jenis_pengiriman], "quantity": 1}
+        )
+
+    cc = fields.get("cc") or fields.get("cc_prefix")
+    parsed = {
+        "cust_name": fields["nama"].strip(),
+        "phone_num": phone,
+        "mode_diskon": mode_diskon,
+        "disc": disc,
+        "ordered_products": products,
+        "address": fields["alamat"].strip(),
+        "payment_type": payment,
+        "notes": notes,
+        "jenis_pengiriman": jenis_pengiriman,
+        "status": "Lunas",
+        "cc": cc.strip() if not _is_empty(cc) else "Babe",
+        "tambahan_waktu": tambahan_waktu,
+    }
+    confidence = max(0.0, 1.0 - sum(weight for weight, _ in issues))
+    return parsed, round(confidence, 2), [reason for _, reason in issues]
+
+
+def extract_address_link(message: str):
+    """
+    Link di field Alamat pesan mentah, tanpa parse lengkap. Dipakai untuk mulai
+    resolve alamat sebelum pesan selesai di-parse. Returns None kalau tidak ada.
+    """
+    fields, _, _, _ = _split_fields(message)
+    match = _URL.search(fields.get("alamat") or "")
+    return match.group(0) if match else None
+
+
+def build_notes_text(parsed: dict) -> str:
+    """
+    Susun pesan terima kasih untuk pelanggan (pengganti notes_prompt) dari hasil
+    parse_reconfirm, dengan gaya yang sama seperti contoh di prompt.
+    """
+    added = {GARANSI_PRODUCT, FREE_INSTANT_PRODUCT, *DELIVERY_PRODUCTS.values()}
+    ordered = [
+        p for p in parsed["ordered_products"]
+        if p["produk"] not in added and not p["produk"].startswith("Tukar Voucher")
+    ]
+    promos = [p["produk"] for p in ordered if p["tipe"] == "Paket"]
+    products = promos or [p["produk"] for p in ordered]
+    return (
+        f"Makasih yaa {parsed['cust_name']} niii Jajan mu langsung ta proses duluu. "
+        f"Paket nyaa {', '.join(products) or '-'} yah. "
+        f"Buat notes, {parsed['notes'] or '-'}. - {parsed['cc']}"
+    )
@@ -0,0 +1,72 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+_current_timer = contextvars.ContextVar("stage_timer", default=None)
+
+
+class StageTimer:
+    """
+    Pencatat durasi tiap tahap handle_order, untuk benchmark.
+
+    Selama StageTimer aktif (dipakai sebagai context manager), setiap blok
+    stage(nama) di context yang sama dicatat ke self.timings dalam detik. asyncio
+    task dan asyncio.to_thread mewarisi context, jadi tahap di pipeline async ikut
+    tercatat. Tahap yang berjalan bersamaan dicatat masing-masing, jadi jumlah
+    semua tahap bisa lebih besar dari total waktu order. Nama tahap yang sama
+    dijumlahkan. Hitungan lewat count(nama), misal jumlah panggilan LLM per jenis,
+    dicatat ke self.counts dengan cara yang sama.
+
+        with StageTimer() as timer:
+            agent.handle_order(query, token_dir)
+        print(timer.timings, timer.counts)
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self.counts = {}
+        self._lock = threading.Lock()
+        self._token = None
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def add_count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def __enter__(self):
+        self._token = _current_timer.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        _current_timer.reset(self._token)
+
+
+@contextmanager
+def stage(name: str):
+    """Catat durasi blok ke StageTimer yang aktif; tanpa timer aktif tidak melakukan apa-apa."""
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - start)
+
+
+def count(name: str, n: int = 1):
+    """Tambah hitungan name di StageTimer yang aktif; tanpa timer aktif tidak melakukan apa-apa."""
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.add_count(name, n)
+
+
+async def timed(name: str, awaitable):
+    """Versi stage() untuk awaitable, misal coroutine yang dijadikan asyncio task."""
+    with stage(name):
+        return await awaitable
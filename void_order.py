@@ -1,10 +1,13 @@
 import requests
-import time
 import json
 
+from modules.crud_utility import get_client
 
-def update_status(order_id: str, status: str, access_token: str) -> None:
-    url = "https://api-open.olsera.co.id/api/open-api/v1/en/order/openorder/updatestatus"
+
+def update_status(order_id: str, status: str, access_token: str) -> bool:
+    # Rate limit (termasuk 429 + Retry-After) sudah ditangani OlseraClient.
+    # Return False kalau gagal (termasuk 429 yang masih tersisa setelah retry client)
+    path = "/api/open-api/v1/en/order/openorder/updatestatus"
     params = {"order_id": order_id, "status": status}
 
     headers = {
@@ -12,22 +15,16 @@ def update_status(order_id: str, status: str, access_token: str) -> None:
         "Content-Type": "application/json",
     }
 
-    while True:
-        try:
-            response = requests.post(url, json=params, headers=headers)
-            if response.status_code == 429:
-                print(f"[429] Rate limited on order_id={order_id}, waiting 20s...")
-                time.sleep(20)
-                continue
-            response.raise_for_status()
-            print(f"[SUCCESS] Voided order_id={order_id}")
-            return response.json()
-        except requests.exceptions.HTTPError as http_err:
-            print(f"[HTTP ERROR] order_id={order_id}: {http_err} - {response.text}")
-            break
-        except Exception as err:
-            print(f"[OTHER ERROR] order_id={order_id}: {err}")
-            break
+    try:
+        response = get_client().post(path, json=params, headers=headers)
+        response.raise_for_status()
+        print(f"[SUCCESS] Voided order_id={order_id}")
+        return True
+    except requests.exceptions.HTTPError as http_err:
+        print(f"[HTTP ERROR] order_id={order_id}: {http_err} - {response.text}")
+    except Exception as err:
+        print(f"[OTHER ERROR] order_id={order_id}: {err}")
+    return False
 
 
 def get_order_ids_from_log(log_path: str) -> list[str]:
@@ -41,10 +38,19 @@ def get_order_ids_from_log(log_path: str) -> list[str]:
     return order_ids
 
 
-def clear_log_file(log_path: str):
+def remove_ids_from_log(log_path: str, order_ids: set):
+    # Baris yang tidak di-void (gagal, atau baru masuk selama proses) tetap di log
+    with open(log_path, "r") as f:
+        lines = f.readlines()
+    remaining = []
+    for line in lines:
+        parts = line.strip().split("|")
+        if len(parts) >= 2 and parts[1] in order_ids:
+            continue
+        remaining.append(line)
     with open(log_path, "w") as f:
-        f.truncate(0)  # kosongkan isi file
-    print(f"[SUCCESS] Cleared log file: {log_path}")
+        f.writelines(remaining)
+    print(f"[SUCCESS] Removed {len(lines) - len(remaining)} voided lines from log file: {log_path}")
 
 
 def void_orders_from_log(log_path: str, outlet_id: int):
@@ -53,12 +59,17 @@ def void_orders_from_log(log_path: str, outlet_id: int):
     token = token_data.get("access_token",None)
     order_ids = get_order_ids_from_log(log_path)
 
+    voided = set()
     for order_id in order_ids:
-        update_status(order_id=order_id, status="X", access_token=token)
-        time.sleep(0.7)  # jaga-jaga supaya tidak 429
+        if update_status(order_id=order_id, status="X", access_token=token):
+            voided.add(order_id)
+
+    failed = set(order_ids) - voided
+    if failed:
+        print(f"[WARNING] {len(failed)} order gagal di-void, tetap di log untuk dicoba lagi: {sorted(failed)}")
 
-    # setelah selesai -> clear log
-    clear_log_file(log_path)
+    # setelah selesai -> hapus hanya order yang berhasil di-void
+    remove_ids_from_log(log_path, voided)
 
 
 if __name__ == "__main__":
@@ -7,7 +7,15 @@ import pandas as pd
 import os
 import json
 
-from modules.crud_utility import fetch_all_product_item,fetch_all_product_combos_v2
+from modules.crud_utility import (
+    fetch_all_product_item,
+    fetch_all_product_combos_v2,
+    get_product_item_df,
+    get_product_combo_df_v2,
+)
+from modules.catalog_sync import DeltaCatalogSync
+from modules.catalog_store import new_catalog_version, write_catalog_version
+from modules.catalog_columnar import CATALOG_DIR, write_columnar_catalog
 
 load_dotenv()
 
@@ -17,24 +25,84 @@ secret_key = os.getenv("SECRET_KEY")
 print(f"App ID: {app_id}")
 print(f"Secret: {secret_key}")
 
+# Paginasi katalog paralel, dibatasi supaya tidak kena 429 dari Olsera
+page_fetch_config = {
+    "max_workers": int(os.getenv("OLSERA_PAGE_WORKERS", "4")),
+    "max_requests_per_second": float(os.getenv("OLSERA_PAGE_RPS", "4")),
+}
+
+# Full sync tiap N run (default 12 x 5 menit = 1 jam), sisanya delta sync
+full_sync_every = int(os.getenv("CATALOG_FULL_SYNC_EVERY", "12"))
+combo_sync = DeltaCatalogSync(
+    "product_combos",
+    get_product_combo_df_v2,
+    lambda token: fetch_all_product_combos_v2(token, **page_fetch_config),
+    full_sync_every=full_sync_every,
+)
+item_sync = DeltaCatalogSync(
+    "product_items",
+    get_product_item_df,
+    lambda token: fetch_all_product_item(token, **page_fetch_config),
+    full_sync_every=full_sync_every,
+)
+# Perubahan yang sudah di-patch ke memori tapi belum ditulis jadi snapshot
+unpublished_changes = 0
+
+def save_csv_atomic(records, path):
+    # Tulis ke file sementara dulu supaya pembaca tidak pernah melihat CSV setengah jadi
+    tmp_path = f"{path}.tmp"
+    pd.DataFrame(records).to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+def save_json_atomic(records, path):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(records, f, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, path)
+
 def job():
+    global unpublished_changes
     print(f"[{datetime.now()}] Starting combo fetch job.")
     with open("./storage/app/token_cache.json", "r") as file:
         token_data = json.load(file)
 
     access_token = token_data.get("access_token", "")
 
-    combos = fetch_all_product_combos_v2(access_token)
-    pd.DataFrame(combos).to_csv("product_combos_v2.csv", index=False)
-    with open("product_combos_v2.json", "w", encoding="utf-8") as f:
-        json.dump(combos, f, ensure_ascii=False, indent=4)
-    print(f"[{datetime.now()}] Fetched {len(combos)} and saved product combos.")
+    combos, combos_changed, _ = combo_sync.sync(access_token)
+    unpublished_changes += combos_changed
+    items, items_changed, _ = item_sync.sync(access_token)
+    unpublished_changes += items_changed
+
+    if unpublished_changes == 0:
+        print(f"[{datetime.now()}] Catalog unchanged, keeping current snapshot.")
+        return
+
+    # Snapshot kolumnar (Arrow) untuk AgentBabe, items paket jadi tabel anak combo_items
+    version = new_catalog_version()
+    snapshot_dir = write_columnar_catalog(items, combos, CATALOG_DIR, version)
+
+    # File lama tetap ditulis dari katalog hasil merge: product_items.csv dibaca
+    # StrukMaker (convert_rawcart_to_ord.py), product_combos_v2.csv/json dibaca app.py,
+    # fallback mtime CatalogStore, dan fake_olsera_server.py
+    save_csv_atomic(items, "product_items.csv")
+    save_csv_atomic(combos, "product_combos_v2.csv")
+    save_json_atomic(combos, "product_combos_v2.json")
+
+    # Tandai versi baru, AgentBabe akan swap snapshot katalognya
+    write_catalog_version(
+        ".", version=version, snapshot_dir=snapshot_dir, items=len(items), combos=len(combos)
+    )
+    unpublished_changes = 0
+    print(f"[{datetime.now()}] Catalog version {version} published to {snapshot_dir}.")
 
-    items = fetch_all_product_item(access_token)
-    pd.DataFrame(items).to_csv("product_items.csv", index=False)
-    print(f"[{datetime.now()}] Fetched {len(items)} and saved product items.")
+def safe_job():
+    # Halaman yang gagal diambil membatalkan sinkronisasi, snapshot lama tetap dipakai
+    try:
+        job()
+    except Exception as e:
+        print(f"[{datetime.now()}] Catalog sync failed: {e}")
 
-schedule.every(5).minutes.do(job)
+schedule.every(5).minutes.do(safe_job)
 
 # Fungsi loop yang terus berjalan
 def run_scheduler():
@@ -45,5 +113,5 @@ def run_scheduler():
 # Jalankan worker-nya
 if __name__ == "__main__":
     print("Worker dimulai. Menunggu eksekusi setiap 5 menit.")
-    job()  # Run immediately on startup
+    safe_job()  # Run immediately on startup
     threading.Thread(target=run_scheduler).start()
\ No newline at end of file